@@ -256,19 +256,24 @@ async function startScan() {
     simulateProgress();
     
     try {
-        // Отправляем файл на бэкенд
-        console.log('📤 Отправка файла на сервер:', currentFile.name);
+        // Сначала спрашиваем вердикт по хешу: известный файл загружать не нужно
+        let result = await lookupByHash(currentHash, currentFile.name);
         
-        const response = await fetch(`${API_URL}/scan`, {
-            method: 'POST',
-            body: formData
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        if (!result) {
+            // Отправляем файл на бэкенд
+            console.log('📤 Отправка файла на сервер:', currentFile.name);
+            
+            const response = await fetch(`${API_URL}/scan`, {
+                method: 'POST',
+                body: formData
+            });
+            
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            
+            result = await response.json();
         }
-        
-        const result = await response.json();
         console.log('✅ Результат сканирования:', result);
         
         // Сохраняем результат
@@ -315,6 +320,24 @@ async function startScan() {
 }
 
 // ===== PROGRESS SIMULATION =====
+// ===== LOOKUP BEFORE UPLOAD =====
+// Вердикт по SHA-256 без загрузки файла; null - сервер файл не знает (или недоступен)
+async function lookupByHash(hash, filename) {
+    if (!hash) return null;
+    
+    try {
+        const response = await fetch(`${API_URL}/scan/by-hash/${hash}?filename=${encodeURIComponent(filename)}`);
+        if (!response.ok) return null;
+        
+        const result = await response.json();
+        console.log('⚡ Вердикт по хешу, без загрузки:', result);
+        return result;
+    } catch (error) {
+        console.warn('Проверка по хешу не удалась, загружаем файл:', error);
+        return null;
+    }
+}
+
 function simulateProgress() {
     const progressFill = document.querySelector('.progress-fill');
     const scanStatus = document.getElementById('scanStatus');
@@ -364,7 +387,7 @@ function updateResultsTable() {
         if (result.status === 'ERROR') {
             statusClass = 'status-threat';
             statusText = 'ОШИБКА';
-        } else if (result.virustotal?.detected || result.clamav?.detected) {
+        } else if (result.virustotal?.detected || result.clamav?.detected || result.status === 'THREAT_DETECTED') {
             statusClass = 'status-threat';
             statusText = 'УГРОЗА';
         } else if (result.status === 'suspicious') {
@@ -378,7 +401,11 @@ function updateResultsTable() {
         const vtText = result.virustotal?.error ? 'Ошибка' : `${vtDetections}/${vtTotal}`;
         
         // ClamAV результаты
-        const clamavResult = result.clamav?.detected ? 'Обнаружен' : (result.clamav?.error || 'Чистый');
+        let clamavResult = result.clamav?.detected ? 'Обнаружен' : (result.clamav?.error || 'Чистый');
+        // Архив: вердикты членов приходят в result.archive
+        if (result.archive?.threats) {
+            clamavResult = `Угроз в архиве: ${result.archive.threats} из ${result.archive.member_count}`;
+        }
         
         // Время
         const time = new Date(result.timestamp).toLocaleTimeString();
@@ -0,0 +1,336 @@
+# archives.py - РЕКУРСИВНАЯ РАСПАКОВКА АРХИВОВ ПОТОКОМ, С ЛИМИТАМИ ОТ ZIP-БОМБ
+#
+# Каждый член архива проходит обычный конвейер сканера (хеш, сигнатуры, clamd, кэш вердиктов),
+# движки по членам работают параллельно в пуле потоков. Копию члена для второго прохода
+# (pipeline.Spool) сканер делает, только если она нужна clamd или это вложенный архив.
+# Распаковку запускает AntivirusScanner.evaluate - одинаково для всех путей сканирования,
+# вердикт архива попадает в кэш только вместе с вердиктами членов.
+# Лимиты - на всю распаковку сразу, через переменные окружения:
+#   ARCHIVE_MAX_DEPTH, ARCHIVE_MAX_MEMBERS, ARCHIVE_MAX_BYTES, ARCHIVE_MAX_RATIO
+# 7z - только если установлен py7zr (pip install py7zr)
+import bz2
+import gzip
+import lzma
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pipeline import CHUNK_SIZE
+
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+ARCHIVE_MAX_DEPTH = int(os.getenv('ARCHIVE_MAX_DEPTH', 5))  # tar.gz - это два уровня
+ARCHIVE_MAX_MEMBERS = int(os.getenv('ARCHIVE_MAX_MEMBERS', 1000))
+ARCHIVE_MAX_BYTES = int(os.getenv('ARCHIVE_MAX_BYTES', 256 * 1024 * 1024))  # распакованных, всего
+ARCHIVE_MAX_RATIO = int(os.getenv('ARCHIVE_MAX_RATIO', 100))  # во сколько раз член больше сжатого
+# Маленькие члены сжимаются как угодно (файл из нулей): степень сжатия считаем от этого размера
+RATIO_MIN_SIZE = 64 * 1024
+
+ZIP_TYPES = frozenset({'zip', 'jar', 'apk', 'ooxml', 'odf'})
+COMPRESSED_TYPES = {
+    'gzip': lambda stream: gzip.GzipFile(fileobj=stream, mode='rb'),
+    'bzip2': lambda stream: bz2.BZ2File(stream, mode='rb'),
+    'xz': lambda stream: lzma.LZMAFile(stream, mode='rb')
+}
+# file.tar.gz -> file.tar, file.tgz -> file.tar
+COMPRESSED_SUFFIXES = {'.gz': '', '.tgz': '.tar', '.bz2': '', '.tbz2': '.tar', '.xz': '', '.txz': '.tar'}
+# Битый или нестандартный архив - ошибка этого контейнера, а не всего скана
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, RuntimeError,
+                  NotImplementedError, lzma.LZMAError, zlib.error, ValueError)
+if py7zr is not None:
+    ARCHIVE_ERRORS += (py7zr.Bad7zFile,)
+
+
+class ArchiveLimitError(Exception):
+    """Распаковка вышла за лимит; reason - depth/members/bytes/ratio"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ArchiveBombError(ArchiveLimitError):
+    """Член распаковывается в разы больше лимита степени сжатия - признак zip-бомбы"""
+
+    def __init__(self, path, limit):
+        super().__init__('ratio', f'{path}: степень сжатия больше {limit}:1')
+
+
+class ArchiveBudget:
+    """Лимиты одной распаковки: все уровни вложенности расходуют общий бюджет"""
+
+    def __init__(self, max_depth=ARCHIVE_MAX_DEPTH, max_members=ARCHIVE_MAX_MEMBERS,
+                 max_bytes=ARCHIVE_MAX_BYTES, max_ratio=ARCHIVE_MAX_RATIO):
+        self.max_depth = max_depth
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.max_ratio = max_ratio
+        self.members = 0
+        self.bytes = 0
+
+    def add_member(self):
+        self.members += 1
+        if self.members > self.max_members:
+            raise ArchiveLimitError('members', f'В архиве больше {self.max_members} файлов')
+
+    def add_bytes(self, count):
+        self.bytes += count
+        if self.bytes > self.max_bytes:
+            raise ArchiveLimitError('bytes', f'Распаковано больше {self.max_bytes // 1024 // 1024} МБ')
+
+
+class MemberReader:
+    """Поток члена архива: считает распакованные байты и обрывает чтение на превышении лимитов"""
+
+    def __init__(self, stream, path, budget, packed_size=None):
+        self.stream = stream
+        self.path = path
+        self.budget = budget
+        self.size = 0
+        # packed_size=None - степень сжатия не проверяем (7z: заявленные размеры проверены заранее)
+        self.limit = None if packed_size is None else max(packed_size, RATIO_MIN_SIZE) * budget.max_ratio
+
+    def read(self, size=CHUNK_SIZE):
+        if size is None or size < 0:
+            size = CHUNK_SIZE  # read() без размера распаковал бы бомбу целиком
+        data = self.stream.read(size)
+        self.size += len(data)
+        self.budget.add_bytes(len(data))
+        if self.limit is not None and self.size > self.limit:
+            raise ArchiveBombError(self.path, self.budget.max_ratio)
+        return data
+
+
+def member_name(path):
+    """Имя единственного члена gzip/bzip2/xz - по имени самого файла"""
+    name = posixpath.basename(path)
+    stem, suffix = posixpath.splitext(name)
+    if suffix.lower() in COMPRESSED_SUFFIXES:
+        return stem + COMPRESSED_SUFFIXES[suffix.lower()]
+    return name + '.data'
+
+
+def open_members(stream, kind, path, packed_size, budget):
+    """(имя, поток, сжатый размер) по членам контейнера; читать строго по порядку"""
+    if kind in ZIP_TYPES:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if info.flag_bits & 0x1:
+                    yield info.filename, None, info.compress_size  # зашифрован, не прочитать
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, member, info.compress_size
+    elif kind == 'tar':
+        # 'r|' - потоковый режим без seek; сжатие снаружи распаковывает уровень gzip/bzip2/xz
+        with tarfile.open(fileobj=stream, mode='r|') as archive:
+            for info in archive:
+                if info.isreg():
+                    yield info.name, archive.extractfile(info), info.size
+    elif kind in COMPRESSED_TYPES:
+        with COMPRESSED_TYPES[kind](stream) as member:
+            yield member_name(path), member, packed_size
+    elif kind == '7z' and py7zr is not None:
+        with py7zr.SevenZipFile(stream) as archive:
+            # Solid-архив распаковывается только целиком: заявленные размеры проверяем заранее
+            declared = sum(info.uncompressed for info in archive.list() if not info.is_directory)
+            if declared > max(packed_size or 0, RATIO_MIN_SIZE) * budget.max_ratio:
+                raise ArchiveBombError(path, budget.max_ratio)
+            if budget.bytes + declared > budget.max_bytes:
+                raise ArchiveLimitError('bytes', f'Распаковано больше {budget.max_bytes // 1024 // 1024} МБ')
+            for name, member in archive.readall().items():
+                yield name, member, None
+
+
+def member_record(result, depth):
+    """Вердикт члена для ответа API: без отчетов движков целиком"""
+    clamav = result.get('clamav') or {}
+    vt = result.get('virustotal') or {}
+    return {
+        'path': result['filename'],
+        'depth': depth,
+        'size': result['size'],
+        'hash': result['hash'],
+        'file_type': result.get('file_type'),
+        'status': result['status'],
+        'threat': clamav.get('result') if clamav.get('detected') else None,
+        'detections': vt.get('detections', 0),
+        'cached': result.get('cached', False),
+        'source': result.get('source'),
+        'partial': result.get('partial', False)
+    }
+
+
+class ArchiveExpander:
+    """Распаковывает уже просканированный архив и сканирует каждый член"""
+
+    def __init__(self, workers=4, max_depth=ARCHIVE_MAX_DEPTH, max_members=ARCHIVE_MAX_MEMBERS,
+                 max_bytes=ARCHIVE_MAX_BYTES, max_ratio=ARCHIVE_MAX_RATIO):
+        self.workers = workers
+        self.limits = {'max_depth': max_depth, 'max_members': max_members,
+                       'max_bytes': max_bytes, 'max_ratio': max_ratio}
+        # Движки членов - в своем пуле: пул EngineRunner занят движками самих членов
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-archive')
+        # Прочитанные, но еще не проверенные члены держат копии для clamd - ограничиваем их число
+        self._slots = threading.BoundedSemaphore(workers * 2)
+
+    def expandable(self, file_type):
+        if file_type == '7z':
+            return py7zr is not None
+        return file_type in ZIP_TYPES or file_type == 'tar' or file_type in COMPRESSED_TYPES
+
+    def expand(self, scanner, stream, result, use_cache=True):
+        """Дополняет result архива вердиктами членов (result['archive']) и общим статусом"""
+        return ArchiveScan(self, scanner, use_cache).run(stream, result)
+
+    def submit(self, func, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class ArchiveScan:
+    """Одна распаковка: бюджет и вердикты членов всех уровней"""
+
+    def __init__(self, expander, scanner, use_cache):
+        self.expander = expander
+        self.scanner = scanner
+        self.use_cache = use_cache
+        self.budget = ArchiveBudget(**expander.limits)
+        self.limit = None  # ArchiveLimitError, на котором распаковка остановилась
+
+    def run(self, stream, result):
+        print(f"📦 Распаковка архива: {result['filename']}")
+        members = self.expand(stream, result, depth=1, packed_size=result['size'])
+        result['archive'] = {
+            'members': members,
+            'member_count': len(members),
+            'threats': sum(1 for member in members if member['status'] == 'THREAT_DETECTED'),
+            'cached': sum(1 for member in members if member['cached']),
+            'expanded_bytes': self.budget.bytes,
+            'limit': self.limit.reason if self.limit is not None else None,
+            'limit_message': str(self.limit) if self.limit is not None else None,
+            'error': result.pop('archive_error', None)
+        }
+        print(f"📦 Членов: {len(members)}, угроз: {result['archive']['threats']}"
+              f"{f', остановлено: {self.limit}' if self.limit is not None else ''}")
+        return result
+
+    def expand(self, stream, result, depth, packed_size):
+        """Члены одного контейнера (со вложенными); статус контейнера - с учетом членов"""
+        pending = []
+        error = None
+        try:
+            for name, member, packed in open_members(stream, result['file_type'], result['filename'],
+                                                     packed_size, self.budget):
+                if self.limit is not None:
+                    break
+                path = f"{result['filename']}/{name}"
+                self.budget.add_member()
+                if member is None:
+                    pending.append(done(encrypted_record(path, depth)))
+                    continue
+                pending.append(self.scan_member(MemberReader(member, path, self.budget, packed), path, depth))
+        except ArchiveLimitError as e:
+            self.limit = e
+        except ARCHIVE_ERRORS as e:
+            error = f"{result['filename']}: {e}"
+            print(f"⚠️ Архив не распакован до конца: {error}")
+
+        members = []
+        for future in pending:
+            members.extend(future.result())
+        self.finish(result, members, error)
+        return members
+
+    def scan_member(self, reader, path, depth):
+        """Читает член через конвейер сканера; движки - в пуле, вложенный архив - рекурсивно"""
+        try:
+            pipeline = self.scanner.read_stream(reader, store=False)
+        except ArchiveLimitError as e:
+            self.limit = e
+            if isinstance(e, ArchiveBombError):
+                return done([bomb_record(path, depth, reader.size)])
+            return done([])
+        kind, _ = self.scanner.file_type(pipeline)
+        if not self.expander.expandable(kind):
+            return self.expander.submit(self.evaluate, pipeline, path, depth)
+
+        # Вложенный архив - в этом же потоке: бюджет общий, а пул занят движками членов.
+        # Вердикт из кэша уже учитывает члены - тогда expand не вызывается
+        nested_members = []
+
+        def expand(stream, result):
+            if depth >= self.budget.max_depth:
+                print(f"⚠️ {path}: вложенность больше {self.budget.max_depth} - внутрь не идем")
+                result['partial'] = True
+                return
+            nested_members.extend(self.expand(stream, result, depth + 1, pipeline.size))
+
+        result = self.scanner.evaluate(pipeline, path, use_cache=self.use_cache, expand=expand, store=False)
+        return done([member_record(result, depth)] + nested_members)
+
+    def evaluate(self, pipeline, path, depth):
+        return [member_record(self.scanner.evaluate(pipeline, path, use_cache=self.use_cache, store=False), depth)]
+
+    def finish(self, result, members, error):
+        """Статус контейнера по членам; в кэш - только вердикт по полностью проверенному архиву"""
+        if any(member['status'] == 'THREAT_DETECTED' for member in members):
+            result['status'] = 'THREAT_DETECTED'
+        bomb = isinstance(self.limit, ArchiveBombError)
+        if bomb:
+            result['status'] = 'THREAT_DETECTED'
+            result['clamav'] = {'detected': True, 'result': 'Heuristics.Archive.Bomb',
+                                'source': 'archives', 'error': str(self.limit)}
+        if error:
+            result['archive_error'] = error
+        partial = (error is not None or (self.limit is not None and not bomb)
+                   or any(member['partial'] for member in members))
+        result['partial'] = result.get('partial', False) or partial
+
+        cache = self.scanner.cache
+        if cache is None:
+            return
+        if result['partial']:
+            # Неполный вердикт не кэшируем, а старый (до ?force=1) больше не подтвержден
+            cache.invalidate(result['hash'])
+        else:
+            cache.put(result['hash'], {
+                'status': result['status'],
+                'virustotal': result['virustotal'],
+                'clamav': result['clamav']
+            })
+
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def encrypted_record(path, depth):
+    return {'path': path, 'depth': depth, 'size': None, 'hash': None, 'file_type': None,
+            'status': 'ENCRYPTED', 'threat': None, 'detections': 0, 'cached': False,
+            'source': 'archives', 'partial': True}
+
+
+def bomb_record(path, depth, size):
+    return {'path': path, 'depth': depth, 'size': size, 'hash': None, 'file_type': None,
+            'status': 'THREAT_DETECTED', 'threat': 'Heuristics.Archive.Bomb', 'detections': 0,
+            'cached': False, 'source': 'archives', 'partial': False}
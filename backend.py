@@ -1,36 +1,106 @@
 # backend.py - ВЕСЬ БЭКЕНД В ОДНОМ ФАЙЛЕ С POSTGRESQL
 import os
-import hashlib
-import tempfile
-import uuid
-import random
+import io
+import functools
 import json
+import threading
+import time
+from concurrent.futures import as_completed
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from cache import VerdictCache
+from signatures import SignatureEngine, SIGNATURES_FILE
+from pipeline import FileTooLargeError
+from scanner import AntivirusScanner
+from archives import ArchiveExpander
+from samples import SampleStore
+from virustotal import VirusTotalClient
+from clamd import ClamdPool
+from engines import EngineRunner
+from settings import SettingsCache, parse_setting
+from hashfilter import KnownHashes, create_known_hashes_table
+from uploads import UploadError, open_batch, open_upload
+from digests import digest_kind
+from jobs import ScanJobQueue, QueueFullError, FINAL_STATUSES, STATUS_PENDING, STATUS_COMPLETED, STATUS_FAILED
 
 # ================== КОНФИГУРАЦИЯ ==================
 app = Flask(__name__)
 CORS(app)  # Разрешаем запросы с фронтенда
 
+# Только для разработки: отладчик и перезапуск при изменении файлов (прод - serve.py)
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')
+
 # Твой ключ VirusTotal
 VIRUSTOTAL_API_KEY = os.getenv('VIRUSTOTAL_API_KEY', 'КЛЮЧ')
+VIRUSTOTAL_URL = os.getenv('VIRUSTOTAL_URL', 'https://www.virustotal.com/api/v3')
+VIRUSTOTAL_RATE = float(os.getenv('VIRUSTOTAL_RATE', 4))  # запросов в минуту на ключ (бесплатный - 4)
+# serve.py: процессов gunicorn, у каждого свой VirusTotalClient - квота ключа делится поровну
+SERVE_PROCESSES = max(1, int(os.getenv('SERVE_PROCESSES', 1)))
+
+# clamd: 'unix:/run/clamav/clamd.ctl' или 'tcp:localhost:3310' (пусто - встроенные сигнатуры)
+CLAMD_ADDRESS = os.getenv('CLAMD_ADDRESS', '')
+CLAMD_POOL_SIZE = int(os.getenv('CLAMD_POOL_SIZE', 8))
+CLAMD_TIMEOUT = float(os.getenv('CLAMD_TIMEOUT', 30))
 MAX_FILE_SIZE = 32 * 1024 * 1024  # 32 МБ
+SIGNATURES_PATH = os.getenv('SIGNATURES_PATH', SIGNATURES_FILE)
+
+# Асинхронные сканирования (?async=1)
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 4))
+SCAN_QUEUE_LIMIT = int(os.getenv('SCAN_QUEUE_LIMIT', 100))
+# SSE по задаче, которую принял другой процесс gunicorn: как часто перечитывать scans
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+# /api/scan/batch: файлов в одном запросе и размер всего тела
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 500))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 512 * 1024 * 1024))
+# Прочитанных, но еще не просканированных файлов одного пакета (каждый держит копию для clamd)
+BATCH_IN_FLIGHT = int(os.getenv('BATCH_IN_FLIGHT', SCAN_WORKERS * 2))
+
+# Werkzeug отклонит тело больше лимита еще до разбора multipart (+1 МБ на заголовки частей)
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE + 1024 * 1024
+
+# system_settings перечитываются раз в SETTINGS_TTL секунд
+SETTINGS_TTL = int(os.getenv('SETTINGS_TTL', 30))
+
+# Фильтры известных хешей (python hashfilter.py строит их из БД и фидов)
+HASH_FILTER_DIR = os.getenv('HASH_FILTER_DIR', 'filters')
+
+# Хранилище загруженных образцов для пересканирования: копия каждой загрузки на диске,
+# поэтому только по явному SAMPLE_STORE_DIR (по умолчанию не храним)
+SAMPLE_STORE_DIR = os.getenv('SAMPLE_STORE_DIR', '')
+
+# Дайджесты сверх SHA-256 (md5,sha1,ssdeep): бэкенд их не хранит, а ssdeep на Python держит GIL
+# на каждой загрузке - по умолчанию выключены, полный набор считает bulk_scan.py
+SCAN_DIGESTS = [name.strip().lower() for name in os.getenv('SCAN_DIGESTS', '').split(',') if name.strip()]
+
+# Кэш вердиктов по SHA-256
+VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', 100000))
+VERDICT_CACHE_TTL = int(os.getenv('VERDICT_CACHE_TTL', 24 * 60 * 60))  # 24 часа
+
+# Записи scans со статусом задачи ('pending', 'running', 'failed') - не вердикты
+VERDICT_STATUSES = ('CLEAN', 'THREAT_DETECTED')
 
 # ================== POSTGRESQL ПОДКЛЮЧЕНИЕ ==================
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from db_pool import ConnectionPool
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
 
 class Database:
     def __init__(self):
-        self.conn = None
+        self.pool = None
         self.connect()
     
     def connect(self):
-        """Подключение к PostgreSQL"""
+        """Подключение к PostgreSQL (пул соединений)"""
         try:
             # ⚠️ 
-            self.conn = psycopg2.connect(
+            self.pool = ConnectionPool(
+                minconn=DB_POOL_MIN,
+                maxconn=DB_POOL_MAX,
+                timeout=DB_POOL_TIMEOUT,
                 host="localhost",          # localhost
                 database="XXX", # БД (с пробелом!)
                 user="postgres",          # Стандартный пользователь
@@ -46,268 +116,460 @@ class Database:
             print("2. Проверь пароль в строке 34 этого файла")
             print("3. Проверь название базы данных")
             print("4. Используй DEMO режим для школы")
-            self.conn = None
+            self.pool = None
+    
+    def ping(self):
+        """Живо ли соединение: выдача из пула сама проверяет и переподключает"""
+        if not self.pool:
+            return False
+        
+        try:
+            with self.pool.connection():
+                return True
+        except Exception:
+            return False
     
     def init_tables(self):
         """Создаём таблицы если их нет"""
-        if not self.conn:
+        if not self.pool:
             return
         
         try:
-            cursor = self.conn.cursor()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
             
-            # Таблица сканирований
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS scans (
-                    id SERIAL PRIMARY KEY,
-                    filename VARCHAR(255) NOT NULL,
-                    file_hash VARCHAR(64) NOT NULL,
-                    file_size BIGINT,
-                    status VARCHAR(20) NOT NULL,
-                    vt_detections INTEGER DEFAULT 0,
-                    vt_total INTEGER DEFAULT 70,
-                    clamav_result TEXT,
-                    virus_names TEXT,
-                    scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+                # Таблица сканирований
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS scans (
+                        id SERIAL PRIMARY KEY,
+                        filename VARCHAR(255) NOT NULL,
+                        file_hash VARCHAR(64) NOT NULL,
+                        file_size BIGINT,
+                        status VARCHAR(20) NOT NULL,
+                        vt_detections INTEGER DEFAULT 0,
+                        vt_total INTEGER DEFAULT 70,
+                        clamav_result TEXT,
+                        virus_names TEXT,
+                        scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        partial BOOLEAN NOT NULL DEFAULT FALSE
+                    )
+                ''')
+                # Неполный вердикт (движок не ответил) - в истории есть, но окончательным не считается
+                cursor.execute('ALTER TABLE scans ADD COLUMN IF NOT EXISTS partial BOOLEAN NOT NULL DEFAULT FALSE')
+                # Задача ?async=1: под gunicorn ее статус спрашивают у любого процесса
+                cursor.execute('ALTER TABLE scans ADD COLUMN IF NOT EXISTS job_id VARCHAR(32)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_id ON scans(job_id) WHERE job_id IS NOT NULL')
             
-            # Индексы для быстрого поиска
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_hash ON scans(file_hash)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_date ON scans(scan_date DESC)')
+                # Индексы для быстрого поиска
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_hash ON scans(file_hash)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_date ON scans(scan_date DESC)')
+                
+                # Импортированные фиды известных хешей (вредоносные и чистые)
+                create_known_hashes_table(cursor)
             
-            self.conn.commit()
-            cursor.close()
-            print("✅ Таблицы PostgreSQL созданы")
+                conn.commit()
+                cursor.close()
+                print("✅ Таблицы PostgreSQL созданы")
         except Exception as e:
             print(f"❌ Ошибка создания таблиц: {e}")
     
-    def save_scan(self, result):
+    def create_pending_scan(self, filename, file_hash, file_size, job_id=None):
+        """Создаем запись для асинхронной задачи со статусом 'pending'"""
+        if not self.pool:
+            return None
+        
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO scans (filename, file_hash, file_size, status, job_id)
+                    VALUES (%s, %s, %s, 'pending', %s)
+                    RETURNING id
+                ''', (filename, file_hash, file_size, job_id))
+                scan_id = cursor.fetchone()[0]
+                conn.commit()
+                cursor.close()
+                return scan_id
+            
+        except Exception as e:
+            print(f"❌ Ошибка создания задачи в PostgreSQL: {e}")
+            return None
+    
+    def update_scan_status(self, scan_id, status):
+        """Переводим задачу по жизненному циклу: pending -> running -> ..."""
+        if not self.pool or not scan_id:
+            return
+        
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE scans SET status = %s WHERE id = %s', (status, scan_id))
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"❌ Ошибка обновления статуса задачи: {e}")
+    
+    def get_scan_job(self, job_id):
+        """Задача по job_id из scans (ее запустил другой процесс) в формате ScanJob.to_dict() или None"""
+        if not self.pool:
+            return None
+        
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute('''
+                    SELECT id, job_id, filename, file_hash, file_size, status, vt_detections, vt_total,
+                           clamav_result, partial, created_at, scan_date
+                    FROM scans
+                    WHERE job_id = %s
+                ''', (job_id,))
+                row = cursor.fetchone()
+                cursor.close()
+        except Exception as e:
+            print(f"❌ Ошибка чтения задачи из PostgreSQL: {e}")
+            return None
+        
+        return None if row is None else row_to_job(row)
+    
+    def save_scan(self, result, scan_id=None):
         """Сохраняем результат сканирования в PostgreSQL"""
-        if not self.conn:
+        if not self.pool:
             print("⚠️ PostgreSQL не подключена, используем DEMO режим")
             return None
         
         try:
-            cursor = self.conn.cursor()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                values = scan_values(result)
             
-            # Формируем строку с названиями вирусов
-            virus_names = []
-            if result['virustotal'].get('engines'):
-                for virus in result['virustotal']['engines'].values():
-                    virus_names.append(virus)
-            if result['clamav'].get('result') and result['clamav']['result'] != 'OK':
-                virus_names.append(result['clamav']['result'])
+                if scan_id:
+                    # Завершаем запись, созданную асинхронной задачей
+                    cursor.execute('''
+                        UPDATE scans SET
+                            filename = %s, file_hash = %s, file_size = %s, status = %s,
+                            vt_detections = %s, vt_total = %s, clamav_result = %s, virus_names = %s,
+                            partial = %s, scan_date = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                    ''', values + (scan_id,))
+                else:
+                    # Вставляем запись
+                    cursor.execute('''
+                        INSERT INTO scans 
+                        (filename, file_hash, file_size, status, vt_detections, vt_total, clamav_result, virus_names,
+                         partial)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id
+                    ''', values)
+                    scan_id = cursor.fetchone()[0]
+                conn.commit()
+                cursor.close()
             
-            # Вставляем запись
-            cursor.execute('''
-                INSERT INTO scans 
-                (filename, file_hash, file_size, status, vt_detections, vt_total, clamav_result, virus_names)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            ''', (
-                result['filename'],
-                result['hash'],
-                result['size'],
-                result['status'],
-                result['virustotal']['detections'],
-                result['virustotal']['total'],
-                result['clamav']['result'],
-                ', '.join(virus_names) if virus_names else None
-            ))
-            
-            scan_id = cursor.fetchone()[0]
-            self.conn.commit()
-            cursor.close()
-            
-            print(f"💾 Сохранено в PostgreSQL, ID: {scan_id}")
-            return scan_id
+                print(f"💾 Сохранено в PostgreSQL, ID: {scan_id}")
+                return scan_id
             
         except Exception as e:
             print(f"❌ Ошибка сохранения в PostgreSQL: {e}")
             return None
     
+    def save_scans_batch(self, results):
+        """Пакет результатов одной транзакцией и одной вставкой; id - в порядке results"""
+        if not self.pool or not results:
+            return []
+        
+        try:
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                rows = execute_values(cursor, '''
+                    INSERT INTO scans 
+                    (filename, file_hash, file_size, status, vt_detections, vt_total, clamav_result, virus_names,
+                     partial)
+                    VALUES %s
+                    RETURNING id
+                ''', [scan_values(result) for result in results], page_size=len(results), fetch=True)
+                cursor.close()
+            print(f"💾 Сохранено в PostgreSQL: {len(rows)} сканов одной транзакцией")
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(f"❌ Ошибка пакетного сохранения в PostgreSQL: {e}")
+            return []
+    
     def get_history(self, limit=20):
         """Получаем историю сканирований"""
-        if not self.conn:
+        if not self.pool:
             return []
         
         try:
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute('''
-                SELECT 
-                    id, filename, file_hash, status, 
-                    vt_detections, vt_total, clamav_result,
-                    TO_CHAR(scan_date, 'DD.MM.YYYY HH24:MI') as scan_date,
-                    virus_names
-                FROM scans 
-                ORDER BY scan_date DESC 
-                LIMIT %s
-            ''', (limit,))
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute('''
+                    SELECT 
+                        id, filename, file_hash, status, 
+                        vt_detections, vt_total, clamav_result,
+                        TO_CHAR(scan_date, 'DD.MM.YYYY HH24:MI') as scan_date,
+                        virus_names
+                    FROM scans 
+                    WHERE status IN %s
+                    ORDER BY scan_date DESC 
+                    LIMIT %s
+                ''', (VERDICT_STATUSES, limit))
             
-            results = cursor.fetchall()
-            cursor.close()
-            return results
+                results = cursor.fetchall()
+                cursor.close()
+                return results
             
         except Exception as e:
             print(f"❌ Ошибка получения истории: {e}")
             return []
     
-    def get_stats(self):
-        """Получаем статистику из PostgreSQL"""
-        if not self.conn:
-            return {'total_scans': 0, 'threats_found': 0, 'clean_files': 0}
+    def get_recent_verdicts(self, limit=100000):
+        """Последние окончательные вердикты по каждому хешу для прогрева кэша"""
+        if not self.pool:
+            return []
         
         try:
-            cursor = self.conn.cursor()
-            
-            # Основная статистика
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_scans,
-                    SUM(CASE WHEN status = 'THREAT_DETECTED' THEN 1 ELSE 0 END) as threats_found,
-                    SUM(CASE WHEN status = 'CLEAN' THEN 1 ELSE 0 END) as clean_files,
-                    MAX(scan_date) as last_scan
-                FROM scans
-            ''')
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute('''
+                    SELECT * FROM (
+                        SELECT DISTINCT ON (file_hash)
+                            file_hash, status, vt_detections, vt_total,
+                            clamav_result, scan_date
+                        FROM scans
+                        WHERE status IN %s AND NOT partial
+                        ORDER BY file_hash, scan_date DESC
+                    ) latest
+                    ORDER BY scan_date DESC
+                    LIMIT %s
+                ''', (VERDICT_STATUSES, limit))
             
-            row = cursor.fetchone()
-            stats = {
-                'total_scans': row[0] or 0,
-                'threats_found': row[1] or 0,
-                'clean_files': row[2] or 0,
-                'last_scan': row[3]
-            }
+                rows = cursor.fetchall()
+                cursor.close()
             
-            cursor.close()
-            return stats
+                # От старых к новым, чтобы свежие оказались в конце LRU
+                return [(row['file_hash'], row_to_verdict(row)) for row in reversed(rows)]
             
         except Exception as e:
-            print(f"❌ Ошибка получения статистики: {e}")
-            return {'total_scans': 0, 'threats_found': 0, 'clean_files': 0}
-
-# ================== СКАНЕР ==================
-class AntivirusScanner:
-    def __init__(self, api_key):
-        self.api_key = api_key
-        print(f"🔑 VirusTotal: {'API КЛЮЧ АКТИВЕН' if api_key else 'ДЕМО-РЕЖИМ'}")
-    
-    def calculate_hash(self, file_path):
-        """Вычисляем SHA-256 хеш"""
-        sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                sha256.update(chunk)
-        return sha256.hexdigest()
-    
-    def check_virustotal(self, file_hash, filename):
-        """Демо-режим VirusTotal для школы"""
-        print(f"🌐 Проверка в VirusTotal (DEMO)...")
-        
-        # EICAR тестовый файл
-        if file_hash == "131f95c51cc819465a5e32bc2a4afce6980975a1c2b6c06e88c6b0b6da3c6c6a":
-            return {
-                'detected': True,
-                'detections': 10,
-                'total': 70,
-                'engines': {
-                    'Kaspersky': 'EICAR-Test-File',
-                    'Avast': 'EICAR-Test-File',
-                    'Bitdefender': 'EICAR-Test-File'
-                }
-            }
-        
-        # Для .exe файлов - 40% шанс угрозы
-        if filename.lower().endswith('.exe'):
-            if random.random() < 0.4:
-                return {
-                    'detected': True,
-                    'detections': random.randint(2, 8),
-                    'total': 70,
-                    'engines': {
-                        'DemoAV': 'Trojan.Generic',
-                        'AnotherAV': 'RiskWare'
-                    }
-                }
-        
-        # Для остальных - 90% чистые
-        return {
-            'detected': False,
-            'detections': 0,
-            'total': 70,
-            'engines': {}
-        }
+            print(f"❌ Ошибка загрузки вердиктов: {e}")
+            return []
     
-    def check_clamav(self, file_path, filename):
-        """Демо-режим ClamAV"""
-        print(f"🦠 Проверка в ClamAV (DEMO)...")
+    def get_known_verdict(self, file_hash):
+        """Точная проверка после фильтра: последний вердикт по хешу или запись из фида"""
+        if not self.pool:
+            return None
         
-        # Проверяем EICAR в содержимом - ИСПРАВЛЕННАЯ СТРОКА!
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                if r'X5O!P%@AP[4\PZX54(P^)7CC)7}$EICAR' in content:
-                    return {
-                        'detected': True,
-                        'result': 'Eicar-Test-Signature'
-                    }
-        except:
-            pass
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute('''
+                    SELECT file_hash, status, vt_detections, vt_total, clamav_result
+                    FROM scans
+                    WHERE file_hash = %s AND status IN %s AND NOT partial
+                    ORDER BY scan_date DESC
+                    LIMIT 1
+                ''', (file_hash, VERDICT_STATUSES))
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('SELECT verdict, source FROM known_hashes WHERE file_hash = %s',
+                                   (file_hash,))
+                    known = cursor.fetchone()
+                cursor.close()
+        except Exception as e:
+            print(f"❌ Ошибка проверки известного хеша: {e}")
+            return None
         
-        # Подозрительные расширения
-        suspicious_ext = ['.exe', '.dll', '.js', '.vbs', '.bat', '.ps1', '.scr']
-        if any(filename.lower().endswith(ext) for ext in suspicious_ext):
-            if random.random() < 0.3:
-                return {
-                    'detected': True,
-                    'result': 'Trojan.Generic.123456'
-                }
+        if row is not None:
+            verdict = row_to_verdict(row)
+            verdict['source'] = 'history'
+            return verdict
+        if known is None:
+            return None
         
+        malicious = known['verdict'] == 'malicious'
         return {
-            'detected': False,
-            'result': 'OK'
+            'status': 'THREAT_DETECTED' if malicious else 'CLEAN',
+            'virustotal': {'detected': False, 'detections': 0, 'total': 0, 'engines': {}},
+            'clamav': {
+                'detected': malicious,
+                'result': f"Known-Malicious ({known['source']})" if malicious else 'OK'
+            },
+            'source': f"feed:{known['source']}"
         }
     
-    def scan_file(self, file_path, filename):
-        """Основная функция сканирования"""
-        print(f"\n🔍 Начинаю сканирование: {filename}")
-        
-        # 1. Вычисляем хеш
-        file_hash = self.calculate_hash(file_path)
-        print(f"📊 SHA-256: {file_hash[:16]}...")
-        
-        # 2. Проверяем в VirusTotal (демо)
-        vt_result = self.check_virustotal(file_hash, filename)
+    def get_system_settings(self):
+        """Настройки из system_settings (таблица расширенной БД, если она рядом)"""
+        if not self.pool:
+            return {}
         
-        # 3. Проверяем в ClamAV (демо)
-        clamav_result = self.check_clamav(file_path, filename)
-        
-        # 4. Определяем общий статус
-        if vt_result['detected'] or clamav_result['detected']:
-            status = 'THREAT_DETECTED'
-            print(f"⚠️  ОБНАРУЖЕНА УГРОЗА!")
-        else:
-            status = 'CLEAN'
-            print(f"✅ Файл чистый")
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT to_regclass('system_settings')")
+            if cursor.fetchone()[0] is None:
+                cursor.close()
+                return {}
+            cursor.execute('SELECT key, value, data_type FROM system_settings')
+            rows = cursor.fetchall()
+            cursor.close()
+        return {key: parse_setting(value, data_type) for key, value, data_type in rows}
+    
+    def get_stats(self):
+        """Получаем статистику из PostgreSQL"""
+        if not self.pool:
+            return {'total_scans': 0, 'threats_found': 0, 'clean_files': 0}
         
-        # 5. Формируем результат
-        result = {
-            'filename': filename,
-            'hash': file_hash,
-            'size': os.path.getsize(file_path),
-            'timestamp': datetime.now().isoformat(),
-            'status': status,
-            'virustotal': vt_result,
-            'clamav': clamav_result,
-            'postgresql': 'ready'
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                # Основная статистика
+                cursor.execute('''
+                    SELECT 
+                        COUNT(*) as total_scans,
+                        SUM(CASE WHEN status = 'THREAT_DETECTED' THEN 1 ELSE 0 END) as threats_found,
+                        SUM(CASE WHEN status = 'CLEAN' THEN 1 ELSE 0 END) as clean_files,
+                        MAX(scan_date) as last_scan
+                    FROM scans
+                    WHERE status IN %s
+                ''', (VERDICT_STATUSES,))
+            
+                row = cursor.fetchone()
+                stats = {
+                    'total_scans': row[0] or 0,
+                    'threats_found': row[1] or 0,
+                    'clean_files': row[2] or 0,
+                    'last_scan': row[3]
+                }
+            
+                cursor.close()
+                return stats
+            
+        except Exception as e:
+            print(f"❌ Ошибка получения статистики: {e}")
+            return {'total_scans': 0, 'threats_found': 0, 'clean_files': 0}
+
+def scan_values(result):
+    """Результат сканера -> значения колонок scans (без id и даты)"""
+    # Формируем строку с названиями вирусов
+    virus_names = []
+    if result['virustotal'].get('engines'):
+        for virus in result['virustotal']['engines'].values():
+            virus_names.append(virus)
+    if result['clamav'].get('result') and result['clamav']['result'] != 'OK':
+        virus_names.append(result['clamav']['result'])
+    
+    return (
+        result['filename'],
+        result['hash'],
+        result['size'],
+        result['status'],
+        result['virustotal'].get('detections', 0),
+        result['virustotal'].get('total', 0),
+        result['clamav'].get('result', 'OK'),
+        ', '.join(virus_names) if virus_names else None,
+        bool(result.get('partial'))
+    )
+
+def row_to_verdict(row):
+    """Строка scans -> вердикт в формате кэша"""
+    clamav_result = row['clamav_result'] or 'OK'
+    return {
+        'status': row['status'],
+        'virustotal': {
+            'detected': (row['vt_detections'] or 0) > 0,
+            'detections': row['vt_detections'] or 0,
+            'total': row['vt_total'] or 70,
+            'engines': {}
+        },
+        'clamav': {
+            'detected': clamav_result != 'OK',
+            'result': clamav_result
         }
-        
-        return result
+    }
+
+def row_to_job(row):
+    """Строка scans задачи -> ответ /api/scan/<job_id>; вердикт - без отчетов движков целиком"""
+    finished = row['status'] in VERDICT_STATUSES
+    result = None
+    if finished:
+        result = dict(row_to_verdict(row), filename=row['filename'], hash=row['file_hash'],
+                      size=row['file_size'], partial=row['partial'], cached=False, source='scan')
+    return {
+        'job_id': row['job_id'],
+        'filename': row['filename'],
+        'hash': row['file_hash'],
+        'status': STATUS_COMPLETED if finished else row['status'],
+        'scan_id': row['id'],
+        'created_at': row['created_at'].isoformat(),
+        'started_at': None,
+        'completed_at': row['scan_date'].isoformat() if finished or row['status'] == STATUS_FAILED else None,
+        'result': result,
+        'error': None
+    }
 
 # ================== ИНИЦИАЛИЗАЦИЯ ==================
-scanner = AntivirusScanner(VIRUSTOTAL_API_KEY)
+verdict_cache = VerdictCache(max_size=VERDICT_CACHE_SIZE, ttl=VERDICT_CACHE_TTL)
+signature_engine = SignatureEngine.from_file(SIGNATURES_PATH)  # автомат строится один раз
+virustotal_client = None
+if VIRUSTOTAL_API_KEY and VIRUSTOTAL_API_KEY != 'КЛЮЧ':
+    virustotal_client = VirusTotalClient(VIRUSTOTAL_API_KEY, base_url=VIRUSTOTAL_URL,
+                                         requests_per_minute=VIRUSTOTAL_RATE / SERVE_PROCESSES,
+                                         pool_size=SCAN_WORKERS * 2)
 db = Database()  # Подключаемся к PostgreSQL
+clamd_pool = ClamdPool(CLAMD_ADDRESS, max_size=CLAMD_POOL_SIZE, timeout=CLAMD_TIMEOUT) if CLAMD_ADDRESS else None
+settings = SettingsCache(db.get_system_settings, ttl=SETTINGS_TTL)
+# Отрицательный ответ фильтра - сразу к движкам, положительный проверяем в БД
+known_hashes = KnownHashes.load(HASH_FILTER_DIR, db.get_known_verdict) if db.pool else None
+# Срок хранения - retention_days из system_settings
+sample_store = SampleStore(SAMPLE_STORE_DIR, settings=settings) if SAMPLE_STORE_DIR else None
+# Запросы и фоновые задачи сканируют одновременно - по два движка на каждый скан
+engine_runner = EngineRunner(workers=(SCAN_WORKERS + 4) * 2)
+scanner = AntivirusScanner(VIRUSTOTAL_API_KEY, cache=verdict_cache, signatures=signature_engine,
+                           virustotal=virustotal_client, runner=engine_runner, settings=settings,
+                           clamd=clamd_pool, known_hashes=known_hashes, digests=SCAN_DIGESTS,
+                           archives=ArchiveExpander(workers=SCAN_WORKERS), samples=sample_store)
+
+def on_job_status(job):
+    """Отражаем жизненный цикл задачи в scans.status"""
+    if job.status == STATUS_PENDING:
+        job.scan_id = db.create_pending_scan(job.filename, job.file_hash, job.file_size, job_id=job.id)
+    elif job.status == STATUS_COMPLETED:
+        db.save_scan(job.result, scan_id=job.scan_id)
+    else:
+        db.update_scan_status(job.scan_id, job.status)
+
+# Сессию clamd задача берет только на время своих движков - воркеров не больше, чем сессий в пуле,
+# иначе лишние воркеры ждали бы CLAMD_TIMEOUT и уходили на одни встроенные сигнатуры
+JOB_WORKERS = min(SCAN_WORKERS, CLAMD_POOL_SIZE) if clamd_pool is not None else SCAN_WORKERS
+scan_jobs = ScanJobQueue(workers=JOB_WORKERS, max_pending=SCAN_QUEUE_LIMIT, on_status=on_job_status)
+
+# Прогреваем кэш вердиктов из таблицы scans
+if db.pool:
+    warmed = verdict_cache.warm(db.get_recent_verdicts(VERDICT_CACHE_SIZE))
+    print(f"⚡ Кэш вердиктов: загружено {warmed} записей")
+
+def max_workers():
+    """serve.py: без PostgreSQL задачи ?async=1 есть только в памяти процесса - процесс должен быть один"""
+    return None if db.pool else 1
+
+def prepare_fork():
+    """serve.py, перед fork воркеров: соединения мастера не должны достаться потомкам"""
+    if db.pool:
+        db.pool.close_idle()
+    if clamd_pool is not None:
+        clamd_pool.closeall()
+
+def shutdown():
+    """Плавная остановка: доделываем задачи из очереди, потом закрываем пулы"""
+    scan_jobs.shutdown(wait=True)
+    # Зависшие движки уже брошены по таймауту - их не ждем
+    scanner.archives.shutdown(wait=False)
+    engine_runner.shutdown(wait=False)
+    if clamd_pool is not None:
+        clamd_pool.closeall()
+    if virustotal_client is not None:
+        virustotal_client.close()
+    if db.pool:
+        db.pool.closeall()
 
 # ================== API ЭНДПОИНТЫ ==================
 @app.route('/')
@@ -336,7 +598,16 @@ def index():
                 <strong>GET /api/status</strong> - Статус сервера
             </div>
             <div class="endpoint">
-                <strong>POST /api/scan</strong> - Сканирование файла (сохраняет в PostgreSQL)
+                <strong>POST /api/scan</strong> - Сканирование файла (сохраняет в PostgreSQL, ?force=1 - без кэша)
+            </div>
+            <div class="endpoint">
+                <strong>POST /api/scan/batch</strong> - Пакет файлов (multipart или tar), ответ - NDJSON по мере готовности
+            </div>
+            <div class="endpoint">
+                <strong>GET|HEAD /api/scan/by-hash/&lt;sha256&gt;</strong> - Вердикт по хешу без загрузки (404 - загрузите файл)
+            </div>
+            <div class="endpoint">
+                <strong>POST /api/scan?async=1</strong> - Асинхронное сканирование, GET /api/scan/&lt;job_id&gt; и /events (SSE)
             </div>
             <div class="endpoint">
                 <strong>GET /api/history</strong> - История сканирований
@@ -354,17 +625,8 @@ def index():
 
 @app.route('/api/status', methods=['GET'])
 def api_status():
-    # Проверяем реальное соединение с PostgreSQL
-    postgres_connected = False
-    if hasattr(db, 'conn') and db.conn:
-        try:
-            cursor = db.conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            postgres_connected = True
-            cursor.close()
-        except:
-            postgres_connected = False
+    # Проверяем соединение через пул (без отдельного коннекта на каждый вызов)
+    postgres_connected = db.ping()
     
     return jsonify({
         'status': 'online',
@@ -375,40 +637,49 @@ def api_status():
         'postgresql': {
             'connected': postgres_connected,
             'tables': ['scans', 'stats'] if postgres_connected else [],
+            'pool': db.pool.stats() if db.pool else None,
             'timestamp': datetime.now().isoformat()
         },
-        'scanner': 'ready'
+        'scanner': 'ready',
+        'cache': verdict_cache.stats(),
+        'jobs': scan_jobs.stats(),
+        'virustotal': virustotal_client.stats() if virustotal_client else None,
+        'clamd': clamd_pool.stats() if clamd_pool else None,
+        'known_hashes': known_hashes.stats() if known_hashes else None,
+        'samples': sample_store.stats() if sample_store else None,
+        'engines': scanner.registry.describe()
     })
 
 @app.route('/api/scan', methods=['POST'])
 def scan_file():
     """Сканирование файла с сохранением в PostgreSQL"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'Файл не предоставлен'}), 400
-    
-    file = request.files['file']
+    asynchronous = request.args.get('async', '0').lower() in ('1', 'true', 'yes')
+    # Не request.files: размер проверяем до чтения тела, а сам файл идет из сокета в конвейер
+    try:
+        if asynchronous:
+            # Очередь полна - отказываем сразу, не читая, не хешируя и не сохраняя тело
+            scan_jobs.check_capacity()
+        upload = open_upload(request, MAX_FILE_SIZE)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if file.filename == '':
+    if not upload.filename:
         return jsonify({'error': 'Файл не выбран'}), 400
     
-    # Проверяем размер файла
-    file.seek(0, 2)
-    file_size = file.tell()
-    file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE:
-        return jsonify({'error': f'Файл слишком большой (макс {MAX_FILE_SIZE // 1024 // 1024} МБ)'}), 400
-    
-    # Сохраняем временный файл
-    temp_dir = tempfile.gettempdir()
-    temp_filename = f"scan_{uuid.uuid4().hex}_{file.filename}"
-    temp_path = os.path.join(temp_dir, temp_filename)
+    # ?force=1 - пересканировать, игнорируя кэш вердиктов (поле формы - только до файла)
+    force = request.args.get('force', upload.fields.get('force', '0'))
+    use_cache = force.lower() not in ('1', 'true', 'yes')
     
     try:
-        file.save(temp_path)
+        if asynchronous:
+            return submit_scan_job(upload, use_cache)
         
-        # Сканируем файл
-        result = scanner.scan_file(temp_path, file.filename)
+        # Сканируем поток загрузки за один проход, без временного файла
+        result = scanner.scan_stream(upload, upload.filename,
+                                     use_cache=use_cache, max_size=MAX_FILE_SIZE)
+        upload.finish()
         
         # Сохраняем в PostgreSQL
         scan_id = db.save_scan(result)
@@ -416,20 +687,288 @@ def scan_file():
             result['postgresql_id'] = scan_id
             result['message'] = 'Сохранено в PostgreSQL'
         
-        # Удаляем временный файл
-        os.remove(temp_path)
-        
         return jsonify(result)
         
+    except FileTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        # Удаляем временный файл при ошибке
+        return jsonify({'error': str(e)}), 500
+
+def submit_scan_job(upload, use_cache):
+    """Читаем загрузку в запросе, а движки запускаем в пуле воркеров"""
+    pipeline = scanner.read_stream(upload, max_size=MAX_FILE_SIZE)
+    try:
+        upload.finish()
+        job = scan_jobs.submit(
+            functools.partial(scanner.evaluate, pipeline, upload.filename, use_cache=use_cache),
+            upload.filename, file_hash=pipeline.hexdigest, file_size=pipeline.size
+        )
+    except Exception:
+        # Задача не создана (очередь полна, тело оборвалось) - evaluate не вызовется, освобождаем сами
+        scanner.release(pipeline)
+        raise
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'hash': pipeline.hexdigest,
+        'result_url': f'/api/scan/{job.id}',
+        'events_url': f'/api/scan/{job.id}/events'
+    }), 202
+
+class BatchGroup:
+    """Файлы пакета с одинаковым хешем: сканируется первый, вердикт и строки scans - у каждого
+
+    Строки сохраняются, как только готов вердикт, - независимо от того, дочитал ли клиент ответ.
+    """
+
+    def __init__(self, file_hash):
+        self.file_hash = file_hash
+        self.files = []  # (номер в пакете, имя); первый - тот, что сканируется
+        self.result = None
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def add(self, index, filename):
+        """Еще один файл с этим хешем; вердикт уже есть - сохраняем его строку сразу"""
+        with self._lock:
+            self.files.append((index, filename))
+            position = len(self.files) - 1
+            ready = self.result is not None
+        if ready:
+            self.save([(position, index, filename)])
+
+    def scan(self, pipeline, use_cache, slots):
+        """В воркере: вердикт первого файла и строки всех уже известных дубликатов
+
+        evaluate - тот же, что у одиночной загрузки: архив в пакете распаковывается и сохраняется
+        (в scans и в кэш) с вердиктами членов.
+        """
         try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except:
-            pass
+            result = scanner.evaluate(pipeline, self.files[0][1], use_cache=use_cache)
+        finally:
+            slots.release()
+        with self._lock:
+            self.result = result
+            files = [(position, index, filename) for position, (index, filename) in enumerate(self.files)]
+        self.save(files)
+        return result
+
+    def record(self, position, index, filename):
+        record = dict(self.result, index=index, filename=filename)
+        if position:
+            record['duplicate_of'] = self.files[0][1]
+        return record
+
+    def records(self):
+        return [self.record(position, index, filename)
+                for position, (index, filename) in enumerate(self.files)]
+
+    def save(self, files):
+        scan_ids = db.save_scans_batch([self.record(*item) for item in files])
+        with self._lock:
+            self.saved += len(scan_ids)
+
+
+@app.route('/api/scan/batch', methods=['POST'])
+def scan_batch():
+    """Много файлов за запрос (multipart или tar): вердикты строками NDJSON по мере готовности"""
+    # У пакета свой лимит тела - больше, чем MAX_CONTENT_LENGTH одиночной загрузки
+    request.max_content_length = BATCH_MAX_SIZE
+    try:
+        batch = open_batch(request, BATCH_MAX_SIZE)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    force = request.args.get('force', '0')
+    use_cache = force.lower() not in ('1', 'true', 'yes')
+    started = time.monotonic()
+    
+    # 1. Тело читаем по порядку; движки каждого нового хеша сразу уходят в очередь сканирования.
+    # Прочитанный, но не просканированный файл держит копию в памяти или на диске - таких не больше BATCH_IN_FLIGHT
+    slots = threading.BoundedSemaphore(BATCH_IN_FLIGHT)
+    groups = {}    # хеш -> BatchGroup
+    futures = {}   # future -> BatchGroup
+    errors = []
+    count = 0
+    try:
+        while batch.next_file():
+            index = count
+            count += 1
+            if count > BATCH_MAX_FILES:
+                raise UploadError(f'В пакете больше {BATCH_MAX_FILES} файлов', 413)
+            filename = batch.filename or f'file_{index}'
+            # tar сообщает размер заранее - такой файл даже не читаем
+            if getattr(batch, 'size', None) and batch.size > MAX_FILE_SIZE:
+                errors.append({'index': index, 'filename': filename, 'error': str(FileTooLargeError(MAX_FILE_SIZE))})
+                continue
+            slots.acquire()
+            try:
+                pipeline = scanner.read_stream(batch, max_size=MAX_FILE_SIZE)
+            except FileTooLargeError as e:
+                slots.release()
+                errors.append({'index': index, 'filename': filename, 'error': str(e)})
+                continue
+            except Exception:
+                slots.release()
+                raise
+            
+            # Одинаковое содержимое в пакете сканируем один раз
+            file_hash = pipeline.hexdigest
+            if file_hash in groups:
+                scanner.release(pipeline)
+                slots.release()
+                groups[file_hash].add(index, filename)
+                continue
+            group = groups[file_hash] = BatchGroup(file_hash)
+            group.files.append((index, filename))
+            try:
+                future = scan_jobs.submit_task(group.scan, pipeline, use_cache, slots)
+            except QueueFullError:
+                scanner.release(pipeline)
+                slots.release()
+                raise
+            futures[future] = group
+        batch.finish()
+    except UploadError as e:
+        # Ответ еще не начат - можно вернуть обычную ошибку (отправленные сканы досчитаются и сохранятся)
+        return jsonify({'error': str(e)}), e.status
+    except QueueFullError as e:
+        return jsonify({'error': str(e), 'processed': len(futures)}), 503
+    
+    # 2. Ответ: строка на файл в порядке готовности, в конце - сводка
+    def ndjson(item):
+        return json.dumps(item, ensure_ascii=False, default=str) + '\n'
+    
+    def generate():
+        for error in errors:
+            yield ndjson(error)
         
-        return jsonify({'error': str(e)}), 500
+        results = []
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                for index, filename in group.files:
+                    errors.append({'index': index, 'filename': filename, 'hash': group.file_hash, 'error': str(e)})
+                    yield ndjson(errors[-1])
+                continue
+            for record in group.records():
+                results.append(record)
+                yield ndjson(record)
+        
+        yield ndjson({'summary': {
+            'files': count,
+            'unique': len(groups),
+            'scanned': len(results),
+            'threats': sum(1 for result in results if result['status'] == 'THREAT_DETECTED'),
+            'errors': len(errors),
+            'saved': sum(group.saved for group in groups.values()),
+            'duration': round(time.monotonic() - started, 3)
+        }})
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/scan/by-hash/<file_hash>', methods=['GET', 'HEAD'])
+def scan_by_hash(file_hash):
+    """Вердикт по SHA-256 до загрузки: 200 - известен, 404 - файл нужно загрузить в /api/scan"""
+    file_hash = file_hash.lower()
+    if digest_kind(file_hash) != 'sha256':
+        return jsonify({'error': 'Нужен SHA-256 (64 hex-символа)'}), 400
+    
+    # Кэш вердиктов, затем индекс scans.file_hash и фиды известных хешей
+    verdict = verdict_cache.get(file_hash)
+    source = 'cache'
+    if verdict is None:
+        verdict = db.get_known_verdict(file_hash)
+        if verdict is not None:
+            source = verdict.get('source', 'history')
+            verdict_cache.put(file_hash, verdict)
+    
+    if verdict is None:
+        response = jsonify({'hash': file_hash, 'status': 'unknown', 'upload_url': '/api/scan'})
+        response.status_code = 404
+    else:
+        response = jsonify({
+            'filename': request.args.get('filename') or file_hash,
+            'hash': file_hash,
+            'timestamp': datetime.now().isoformat(),
+            'status': verdict['status'],
+            'virustotal': verdict['virustotal'],
+            'clamav': verdict['clamav'],
+            'cached': True,
+            'source': source,
+            'uploaded': False
+        })
+    # HEAD: тела нет, ответ - в статусе и заголовке
+    response.headers['X-Scan-Status'] = verdict['status'] if verdict else 'unknown'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/scan/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    """Результат асинхронного сканирования"""
+    job = scan_jobs.get(job_id)
+    if job is not None:
+        return jsonify(job.to_dict())
+    # Под gunicorn задачу мог принять другой процесс - ее состояние в scans
+    stored = db.get_scan_job(job_id)
+    if stored is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(stored)
+
+@app.route('/api/scan/<job_id>/events', methods=['GET'])
+def stream_scan_job(job_id):
+    """Server-Sent Events: статус задачи до завершения"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        stored = db.get_scan_job(job_id)
+        if stored is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        return Response(stored_job_events(job_id, stored), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    def events():
+        version = -1
+        while True:
+            if version != job.version:
+                version = job.version
+                yield f"event: status\ndata: {json.dumps(job.to_dict(), default=str)}\n\n"
+                if job.done:
+                    return
+            elif job.wait_for_change(version, timeout=15) == version:
+                yield ": keep-alive\n\n"
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stored_job_events(job_id, state):
+    """SSE по задаче другого процесса: уведомлений между процессами нет - опрашиваем scans"""
+    idle = 0
+    while True:
+        yield f"event: status\ndata: {json.dumps(state, default=str)}\n\n"
+        if state['status'] in FINAL_STATUSES:
+            return
+        previous = state
+        while state == previous:
+            time.sleep(JOB_POLL_INTERVAL)
+            state = db.get_scan_job(job_id)
+            if state is None:
+                return
+            idle += JOB_POLL_INTERVAL
+            if idle >= 15:
+                idle = 0
+                yield ": keep-alive\n\n"
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Файл слишком большой (макс {MAX_FILE_SIZE // 1024 // 1024} МБ)'}), 413
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
@@ -438,7 +977,7 @@ def get_history():
     
     return jsonify({
         'success': True,
-        'database': 'PostgreSQL' if db.conn else 'Demo Mode',
+        'database': 'PostgreSQL' if db.pool else 'Demo Mode',
         'count': len(history),
         'scans': history
     })
@@ -450,7 +989,7 @@ def get_stats():
     
     return jsonify({
         'success': True,
-        'database': 'PostgreSQL' if db.conn else 'Demo Mode',
+        'database': 'PostgreSQL' if db.pool else 'Demo Mode',
         'stats': stats,
         'tables': ['scans']
     })
@@ -461,20 +1000,12 @@ def test_eicar():
     # ИСПРАВЛЕННАЯ СТРОКА!
     eicar_content = r'X5O!P%@AP[4\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
     
-    temp_dir = tempfile.gettempdir()
-    temp_path = os.path.join(temp_dir, 'eicar_test.txt')
-    
-    with open(temp_path, 'w') as f:
-        f.write(eicar_content)
-    
-    result = scanner.scan_file(temp_path, 'eicar_test.txt')
+    # Сканируем прямо из памяти - временный файл не нужен
+    result = scanner.scan_stream(io.BytesIO(eicar_content.encode()), 'eicar_test.txt')
     
     # Сохраняем в PostgreSQL
     db.save_scan(result)
     
-    # Удаляем временный файл
-    os.remove(temp_path)
-    
     return jsonify(result)
 
 # ================== ЗАПУСК СЕРВЕРА ==================
@@ -485,14 +1016,20 @@ if __name__ == '__main__':
     print("🌐 API сервер запущен: http://localhost:5000")
     print("🗄️  База данных: PostgreSQL")
     print("📁  Имя БД: dbt antivirus")
+    if sample_store:
+        print(f"📦 Образцы: {SAMPLE_STORE_DIR} (сжатие: {'zstd' if sample_store.compress else 'нет'})")
     print("📊 API эндпоинты:")
     print("   GET  /              - Документация")
     print("   GET  /api/status    - Статус сервера")
-    print("   POST /api/scan      - Сканирование файла")
+    print("   POST /api/scan      - Сканирование файла (?async=1 - в очередь)")
+    print("   POST /api/scan/batch - Пакет файлов (multipart/tar), ответ NDJSON")
+    print("   GET  /api/scan/by-hash/<sha256> - Вердикт без загрузки (404 - загрузите)")
+    print("   GET  /api/scan/<id> - Результат задачи (/events - SSE)")
     print("   GET  /api/history   - История из PostgreSQL")
     print("   GET  /api/stats     - Статистика")
     print("="*60)
     print("💡 Для остановки: Ctrl+C")
+    print("🏭 Продакшен (несколько процессов): python serve.py backend")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=FLASK_DEBUG)
\ No newline at end of file
@@ -1,19 +1,26 @@
 # backend_advanced.py - УЛУЧШЕННЫЙ БЭКЕНД С ПРОДВИНУТОЙ БД
 from database import AdvancedDatabase
-from flask import Flask, request, jsonify, send_file, render_template_string
+from snapshot import SnapshotService
+from flask import Flask, Response, request, jsonify, send_file, render_template_string
 from flask_cors import CORS
 import os
 import tempfile
 import uuid
 import hashlib
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
 # Конфигурация
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Только для разработки: отладчик и перезапуск при изменении файлов (прод - serve.py)
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')
+
+# Как часто пересчитывать данные дашборда (админка опрашивает раз в 30 с)
+DASHBOARD_SNAPSHOT_INTERVAL = int(os.getenv('DASHBOARD_SNAPSHOT_INTERVAL', 30))
+
 # Инициализация БД
 db = AdvancedDatabase()
 
@@ -419,27 +426,80 @@ def admin_panel():
     """Админ-панель"""
     return render_template_string(ADMIN_TEMPLATE)
 
+def build_dashboard_payload():
+    """Все данные админ-панели одним словарем (считается в фоне)"""
+    stats = db.get_dashboard_stats()
+    
+    # Получаем последние сканирования
+    recent_scans = db.get_scan_history(limit=10)
+    
+    # Получаем пользователей
+    users = db.get_user_stats()
+    
+    return {
+        'success': True,
+        'general': stats['general'],
+        'threats': stats['threats'],
+        'weekly': stats['weekly'],
+        'top_threats': stats['top_threats'],
+        'recent_scans': recent_scans,
+        'users': users,
+        'generated_at': stats['timestamp']
+    }
+
+# Снимок пересчитывается раз в интервал, сколько бы вкладок ни опрашивало API
+dashboard_snapshot = SnapshotService(build_dashboard_payload, interval=DASHBOARD_SNAPSHOT_INTERVAL,
+                                     serialize=app.json.dumps)
+
+def prepare_fork():
+    """serve.py, перед fork воркеров: соединения мастера не должны достаться потомкам"""
+    if db.pool:
+        db.pool.close_idle()
+
+def shutdown():
+    """Плавная остановка воркера"""
+    dashboard_snapshot.stop()
+    if db.pool:
+        db.pool.closeall()
+
 @app.route('/api/admin/stats')
 def admin_stats():
     """Полная статистика для админ-панели"""
     try:
-        stats = db.get_dashboard_stats()
-        
-        # Получаем последние сканирования
-        recent_scans = db.get_scan_history(limit=10)
+        snapshot = dashboard_snapshot.get()
+        if snapshot is None:
+            return jsonify({'success': False, 'error': dashboard_snapshot.last_error}), 500
         
-        # Получаем пользователей
-        users = db.get_user_stats()
+        if request.if_none_match.contains(snapshot.etag):
+            response = Response(status=304)
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = f'private, max-age={DASHBOARD_SNAPSHOT_INTERVAL}'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/pool')
+def pool_stats():
+    """Метрики пула соединений: ожидание и загрузка"""
+    if not db.pool:
+        return jsonify({'success': False, 'error': 'PostgreSQL не подключена'}), 503
+    return jsonify({'success': True, 'pool': db.pool.stats()})
+
+@app.route('/api/admin/stats/reconcile', methods=['POST'])
+def reconcile_stats():
+    """Пересчет дневной статистики из сырых данных"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('date'):
+            days = [datetime.strptime(data['date'], '%Y-%m-%d').date()]
+        else:
+            today = datetime.now().date()
+            days = [today - timedelta(days=i) for i in range(int(data.get('days', 1)))]
         
-        return jsonify({
-            'success': True,
-            'general': stats['general'],
-            'threats': stats['threats'],
-            'weekly': stats['weekly'],
-            'top_threats': stats['top_threats'],
-            'recent_scans': recent_scans,
-            'users': users
-        })
+        rebuilt = [db.reconcile_daily_stats(day) for day in days]
+        return jsonify({'success': True, 'reconciled': rebuilt})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -482,11 +542,26 @@ def search_data():
         
         if search_type == 'threats':
             results = db.search_threats(query)
+        elif search_type == 'similar':
+            # q - хеш ssdeep или SHA-256/MD5/SHA-1 уже известного файла
+            results = db.find_similar_files(
+                query,
+                min_score=int(request.args.get('min_score', 50)),
+                limit=min(int(request.args.get('limit', 20)), 200)
+            )
         elif search_type == 'scans':
             filters = {
-                'query': query
+                'query': query,
+                'threat_level': request.args.get('threat_level'),
+                'status': request.args.get('status'),
+                'date_from': request.args.get('date_from'),
+                'date_to': request.args.get('date_to')
             }
-            results = db.get_scan_history(filters=filters)
+            results = db.get_scan_history(
+                limit=min(int(request.args.get('limit', 50)), 500),
+                cursor=request.args.get('cursor'),
+                filters=filters
+            )
         else:
             results = []
         
@@ -495,6 +570,9 @@ def search_data():
             'type': search_type,
             'results': results
         })
+    except ValueError as e:
+        # Неверный курсор пагинации, дата или limit - ошибка запроса, а не сервера
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -527,6 +605,9 @@ def index():
             <div><strong>POST /api/admin/backup</strong> - Создание бэкапа</div>
             <div><strong>POST /api/admin/cleanup</strong> - Очистка старых данных</div>
             <div><strong>GET /api/admin/search?q=...</strong> - Поиск по БД</div>
+            <div><strong>GET /api/admin/search?type=similar&q=...</strong> - Похожие файлы (ssdeep)</div>
+            <div><strong>POST /api/admin/stats/reconcile</strong> - Пересчет дневной статистики</div>
+            <div><strong>GET /api/admin/pool</strong> - Метрики пула соединений</div>
             
             <h2>🛡️ Основные функции:</h2>
             <div>• Улучшенная структура БД с 8 таблицами</div>
@@ -550,9 +631,10 @@ if __name__ == '__main__':
     print("💾 Автобэкапы: Каждые 24 часа")
     print("="*60)
     print("💡 Для остановки: Ctrl+C")
+    print("🏭 Продакшен (несколько процессов): python serve.py advanced")
     print("="*60 + "\n")
     
     # Создаем папку для бэкапов
     os.makedirs('backups', exist_ok=True)
     
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    app.run(host='0.0.0.0', port=5001, debug=FLASK_DEBUG)
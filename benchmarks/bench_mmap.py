@@ -0,0 +1,90 @@
+# bench_mmap.py - ЧТЕНИЕ ФАЙЛА ДЛЯ СКАНИРОВАНИЯ: read() ПО КУСКАМ vs mmap + memoryview
+#
+#   python benchmarks/bench_mmap.py
+#   python benchmarks/bench_mmap.py --sizes 1K,1M,32M --repeat 5 --no-signatures
+# Без --no-signatures конвейер гоняет и сигнатурный автомат (как при реальном скане)
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline import ScanPipeline  # noqa: E402
+from signatures import SignatureEngine  # noqa: E402
+
+MAX_FILE_SIZE = 32 * 1024 * 1024  # как в backend.py
+UNITS = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def legacy_hash(path):
+    """Старый calculate_hash: чтение по 4 КБ"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def buffered(path, signatures):
+    with open(path, 'rb') as f:
+        return ScanPipeline(signatures=signatures).consume(f).hexdigest
+
+
+def mapped(path, signatures):
+    with open(path, 'rb') as f:
+        return ScanPipeline(signatures=signatures).consume_mmap(f).hexdigest
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк чтения файла: read() против mmap')
+    parser.add_argument('--sizes', default='1K,16K,256K,1M,4M,16M,32M')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-signatures', action='store_true', help='только SHA-256')
+    args = parser.parse_args()
+
+    signatures = None if args.no_signatures else SignatureEngine.from_file()
+    sizes = [min(parse_size(size), MAX_FILE_SIZE) for size in args.sizes.split(',')]
+
+    print(f"\n📊 лучшее из {args.repeat}, файл в кэше ОС"
+          f"{'' if signatures else ', только SHA-256'}")
+    # Первая колонка - старый calculate_hash (только SHA-256), остальные - весь конвейер
+    print(f"{'размер':>8} {'хеш по 4 КБ':>12} {'read 1 МБ':>12} {'mmap':>12} {'mmap, МБ/с':>12}")
+    for size in sizes:
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(os.urandom(size))
+            path = f.name
+        try:
+            expected = legacy_hash(path)
+            assert buffered(path, signatures) == expected == mapped(path, signatures)
+
+            legacy_time = best_of(lambda: legacy_hash(path), args.repeat)
+            buffered_time = best_of(lambda: buffered(path, signatures), args.repeat)
+            mapped_time = best_of(lambda: mapped(path, signatures), args.repeat)
+        finally:
+            os.unlink(path)
+
+        label = f'{size // 1024 // 1024} МБ' if size >= UNITS['M'] else f'{size // 1024} КБ'
+        print(f"{label:>8} {legacy_time * 1000:>10.2f}мс {buffered_time * 1000:>10.2f}мс "
+              f"{mapped_time * 1000:>10.2f}мс {size / mapped_time / 1024 / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
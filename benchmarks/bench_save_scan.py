@@ -0,0 +1,156 @@
+# bench_save_scan.py - СРАВНЕНИЕ ЗАПИСИ РЕЗУЛЬТАТА: ЦИКЛ ПО ДЕТЕКЦИЯМ vs ПАКЕТНАЯ
+#
+# Запуск (нужен PostgreSQL, лучше отдельная тестовая БД):
+#   python benchmarks/bench_save_scan.py --database dbt_bench --password ... --scans 200 --detections 60
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import Json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import AdvancedDatabase  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Считает каждый отправленный на сервер SQL-запрос"""
+    statements = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.statements += 1
+        return super().execute(query, vars)
+
+
+def legacy_save_scan_result(conn, file_id, scanner_type, result):
+    """Старый путь записи: SELECT + UPDATE/INSERT + INSERT на каждую детекцию"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO scans 
+        (file_id, scanner_type, status, result, threat_level, 
+         detection_count, engine_count, malicious_engines, scan_duration, completed_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    ''', (
+        file_id, scanner_type, 'completed', Json(result), result['threat_level'],
+        result['detection_count'], result['engine_count'], result['malicious_engines'],
+        result['scan_duration'], datetime.now()
+    ))
+    scan_id = cursor.fetchone()[0]
+
+    for detection in result['detections']:
+        cursor.execute('SELECT id FROM threats WHERE name = %s', (detection['threat_name'],))
+        threat_row = cursor.fetchone()
+        if threat_row:
+            threat_id = threat_row[0]
+            cursor.execute('''
+                UPDATE threats SET detection_count = detection_count + 1, last_seen = %s
+                WHERE id = %s
+            ''', (datetime.now(), threat_id))
+        else:
+            cursor.execute('''
+                INSERT INTO threats (name, type, severity, first_seen, last_seen)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id
+            ''', (detection['threat_name'], detection['type'], detection['severity'],
+                  datetime.now(), datetime.now()))
+            threat_id = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO detections 
+            (scan_id, threat_id, engine_name, detection_name, confidence, details)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', (scan_id, threat_id, detection['engine_name'], detection['detection_name'],
+              detection['confidence'], Json({})))
+
+    cursor.execute('''
+        SELECT COUNT(*), SUM(CASE WHEN threat_level > 0 THEN 1 ELSE 0 END)
+        FROM scans WHERE DATE(started_at) = %s
+    ''', (datetime.now().date(),))
+    cursor.fetchone()
+    cursor.close()
+    return scan_id
+
+
+def make_result(detections):
+    engines = [f'Engine{i:02d}' for i in range(detections)]
+    return {
+        'threat_level': 8 if detections else 0,
+        'detection_count': detections,
+        'engine_count': 70,
+        'malicious_engines': engines,
+        'scan_duration': 0.5,
+        'detections': [
+            {
+                'engine_name': engine,
+                # Разные движки часто называют одну угрозу одинаково
+                'threat_name': f'Bench.Trojan.{i % 10}',
+                'detection_name': f'Bench.Trojan.{i % 10}',
+                'type': 'trojan',
+                'severity': 7,
+                'confidence': 0.9
+            }
+            for i, engine in enumerate(engines)
+        ]
+    }
+
+
+def run(label, save, file_ids, result):
+    CountingCursor.statements = 0
+    started = time.perf_counter()
+    for file_id in file_ids:
+        save(file_id, result)
+    elapsed = time.perf_counter() - started
+    scans = len(file_ids)
+    print(f"{label:<8} {CountingCursor.statements / scans:>12.1f} {elapsed / scans * 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк записи результатов сканирования')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--database', default='dbt_bench')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.getenv('PGPASSWORD', ''))
+    parser.add_argument('--scans', type=int, default=200)
+    parser.add_argument('--detections', type=int, default=60)
+    args = parser.parse_args()
+
+    connect_kwargs = dict(host=args.host, port=args.port, database=args.database,
+                          user=args.user, password=args.password)
+    db = AdvancedDatabase(**connect_kwargs)
+    if not db.pool:
+        sys.exit('❌ Нет подключения к PostgreSQL')
+
+    # Тот же пул, но курсоры считают запросы
+    db.pool.closeall()
+    db.pool = ConnectionPool(minconn=1, maxconn=2, autocommit=True,
+                             cursor_factory=CountingCursor, **connect_kwargs)
+
+    file_ids = []
+    for _ in range(args.scans * 2):
+        file_hash = uuid.uuid4().hex + uuid.uuid4().hex
+        file_ids.append(db.save_file_metadata('bench.bin', file_hash, 1024, 'bin'))
+
+    result = make_result(args.detections)
+
+    def legacy(file_id, result):
+        # Старый код работал в autocommit: каждый запрос - своя транзакция
+        with db.pool.connection() as conn:
+            legacy_save_scan_result(conn, file_id, 'bench', result)
+
+    def bulk(file_id, result):
+        db.save_scan_result(file_id, 'bench', result)
+
+    print(f"\n📊 {args.scans} сканов x {args.detections} детекций")
+    print(f"{'путь':<8} {'запросов/скан':>12} {'мс/скан':>12}")
+    run('legacy', legacy, file_ids[:args.scans], result)
+    run('bulk', bulk, file_ids[args.scans:], result)
+
+
+if __name__ == '__main__':
+    main()
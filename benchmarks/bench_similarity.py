@@ -0,0 +1,130 @@
+# bench_similarity.py - ПОИСК ПОХОЖИХ ФАЙЛОВ: ПОЛНЫЙ ПЕРЕБОР ssdeep vs ИНДЕКС 7-ГРАММ
+#
+# Запуск (нужен PostgreSQL, лучше отдельная тестовая БД):
+#   python benchmarks/bench_similarity.py --database dbt_bench --password ... --files 20000 --queries 20
+# Хеши синтетические: случайные дайджесты ssdeep и их "перепакованные" варианты с правками
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+from psycopg2.extras import Json, execute_values
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import AdvancedDatabase  # noqa: E402
+from digests import B64, MIN_BLOCKSIZE, SPAMSUM_LENGTH, compare  # noqa: E402
+
+BENCH_PREFIX = 'bench_similarity_'
+
+
+def random_hash(rng):
+    blocksize = MIN_BLOCKSIZE << rng.randint(4, 14)
+    first = ''.join(rng.choice(B64) for _ in range(SPAMSUM_LENGTH))
+    second = ''.join(rng.choice(B64) for _ in range(SPAMSUM_LENGTH // 2))
+    return f'{blocksize}:{first}:{second}'
+
+
+def mutate(value, rng, edits):
+    """Вариант того же файла: несколько символов дайджеста заменены"""
+    blocksize, first, second = value.split(':')
+    first = list(first)
+    for _ in range(edits):
+        first[rng.randrange(len(first))] = rng.choice(B64)
+    return f"{blocksize}:{''.join(first)}:{second}"
+
+
+def fill(db, count, rng):
+    """count файлов: треть - варианты уже добавленных, остальные - случайные"""
+    hashes = []
+    batch = []
+    for i in range(count):
+        if hashes and i % 3 == 0:
+            value = mutate(rng.choice(hashes), rng, rng.randint(1, 8))
+        else:
+            value = random_hash(rng)
+        hashes.append(value)
+        batch.append(value)
+        if len(batch) == 1000 or i == count - 1:
+            with db.pool.transaction() as conn:
+                cursor = conn.cursor()
+                rows = execute_values(cursor, '''
+                    INSERT INTO files (original_name, stored_name, file_hash, file_size, metadata)
+                    VALUES %s
+                    RETURNING id, metadata->>'ssdeep'
+                ''', [
+                    (BENCH_PREFIX + str(i), BENCH_PREFIX + digest, digest, 0, Json({'ssdeep': value}))
+                    for value in batch
+                    for digest in [hashlib.sha256(f'{value}{i}{rng.random()}'.encode()).hexdigest()]
+                ], page_size=len(batch), fetch=True)
+                db.index_fuzzy_hashes(cursor, rows)
+                cursor.close()
+            batch = []
+    return hashes
+
+
+def brute_force(db, query, min_score):
+    """Как без индекса: все хеши из БД и compare() с каждым"""
+    with db.pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, metadata->>'ssdeep' FROM files WHERE metadata ? 'ssdeep'")
+        rows = cursor.fetchall()
+        cursor.close()
+    return sorted((row_id for row_id, value in rows if compare(query, value) >= min_score))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска похожих файлов')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--database', default='dbt_bench')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.getenv('PGPASSWORD', 'xxx'))
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--min-score', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = AdvancedDatabase(host=args.host, port=args.port, database=args.database,
+                          user=args.user, password=args.password)
+    if not db.pool:
+        sys.exit('❌ Нет подключения к PostgreSQL')
+
+    try:
+        started = time.perf_counter()
+        hashes = fill(db, args.files, rng)
+        print(f"\n📦 Добавлено {args.files} хешей за {time.perf_counter() - started:.1f} с")
+
+        queries = [mutate(rng.choice(hashes), rng, 3) for _ in range(args.queries)]
+        indexed_time = brute_time = 0.0
+        found = missed = 0
+        for query in queries:
+            started = time.perf_counter()
+            similar = db.find_similar_files(query, min_score=args.min_score, limit=10 ** 6)
+            indexed_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            expected = brute_force(db, query, args.min_score)
+            brute_time += time.perf_counter() - started
+
+            got = {row['id'] for row in similar}
+            found += len(got)
+            missed += len(set(expected) - got)
+
+        print(f"🔎 Запросов: {args.queries}, найдено похожих: {found}, пропущено индексом: {missed}")
+        print(f"{'':>12} {'мс/запрос':>10}")
+        print(f"{'перебор':>12} {brute_time / args.queries * 1000:>10.1f}")
+        print(f"{'индекс':>12} {indexed_time / args.queries * 1000:>10.1f}")
+    finally:
+        with db.pool.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM files WHERE original_name LIKE %s', (BENCH_PREFIX + '%',))
+            cursor.close()
+        db.pool.closeall()
+
+
+if __name__ == '__main__':
+    main()
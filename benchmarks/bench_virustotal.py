@@ -0,0 +1,84 @@
+# bench_virustotal.py - ЗАДЕРЖКА ПОИСКА В VIRUSTOTAL ПОД ДАВЛЕНИЕМ КВОТЫ (ОФЛАЙН)
+#
+# Поднимает tools/fake_virustotal.py в этом же процессе и гоняет поиск по хешам
+# из нескольких потоков: простой requests.get на каждый запрос против VirusTotalClient.
+#   python benchmarks/bench_virustotal.py --quota 120 --lookups 200 --unique 50 --threads 16
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.fake_virustotal import start_fake_virustotal  # noqa: E402
+from virustotal import VirusTotalClient  # noqa: E402
+
+
+def naive_lookup(url, api_key, file_hash):
+    """Как сделали бы "в лоб": новое соединение, повтор через секунду на 429"""
+    while True:
+        response = requests.get(f'{url}/files/{file_hash}', headers={'x-apikey': api_key}, timeout=15)
+        if response.status_code != 429:
+            return response.status_code
+        time.sleep(1)
+
+
+def run(label, lookup, hashes, threads):
+    latencies = []
+
+    def timed(file_hash):
+        started = time.perf_counter()
+        lookup(file_hash)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, hashes))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<8} {elapsed:>8.2f} {statistics.median(latencies) * 1000:>10.1f} "
+          f"{p95 * 1000:>10.1f} {latencies[-1] * 1000:>10.1f}", end='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк клиента VirusTotal на локальной замене')
+    parser.add_argument('--quota', type=int, default=120, help='запросов в минуту на ключ')
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа сервера, секунд')
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--unique', type=int, default=50, help='разных хешей среди lookups')
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    unique = [uuid.uuid4().hex + uuid.uuid4().hex for _ in range(args.unique)]
+    # Повторы вперемешку: одинаковые хеши попадают в полет одновременно
+    hashes = random.Random(42).choices(unique, k=args.lookups)
+
+    print(f"\n📊 {args.lookups} поисков ({args.unique} разных хешей), {args.threads} потоков, "
+          f"квота {args.quota}/мин, задержка {args.latency * 1000:.0f} мс")
+    print(f"{'клиент':<8} {'всего, с':>8} {'p50, мс':>10} {'p95, мс':>10} {'max, мс':>10}  сервер")
+
+    # У каждого прогона свой сервер: квота не переходит из одного в другой
+    server = start_fake_virustotal(quota=args.quota, latency=args.latency)
+    run('naive', lambda h: naive_lookup(server.url, 'bench', h), hashes, args.threads)
+    print(f"  {server.counters}")
+    server.shutdown()
+
+    server = start_fake_virustotal(quota=args.quota, latency=args.latency)
+    client = VirusTotalClient('bench', base_url=server.url, requests_per_minute=args.quota,
+                              pool_size=args.threads, queue_timeout=None)
+    run('client', client.lookup, hashes, args.threads)
+    print(f"  {server.counters}")
+    print(f"\n🔌 Клиент: {client.stats()}")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
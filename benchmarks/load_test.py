@@ -0,0 +1,138 @@
+# load_test.py - НАГРУЗОЧНЫЙ ТЕСТ /api/scan И /api/status: ЗАПРОСОВ В СЕКУНДУ И p99 ОТ ЧИСЛА ВОРКЕРОВ
+#
+#   python benchmarks/load_test.py --workers 1,2,4 --concurrency 16 --requests 400
+#   python benchmarks/load_test.py --url http://localhost:5000 --endpoints status
+# Без --url сервер поднимается через serve.py отдельно для каждого числа воркеров.
+# Файлы для /api/scan случайные (промах кэша вердиктов); --cached - один и тот же файл
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNITS = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def start_server(args, workers):
+    command = [sys.executable, os.path.join(ROOT, 'serve.py'), args.app, '--bind', f'127.0.0.1:{args.port}',
+               '--workers', str(workers), '--threads', str(args.threads), '--server', args.server]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                               stderr=None if args.verbose else subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{args.port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'❌ Сервер завершился с кодом {process.returncode}')
+        try:
+            if requests.get(f'{url}/api/status', timeout=1).ok:
+                return process, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('❌ Сервер не поднялся за 60 с')
+
+
+def stop_server(process):
+    # SIGTERM - та же плавная остановка, что и в проде
+    process.terminate()
+    try:
+        process.wait(timeout=90)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_load(url, endpoint, args):
+    """(запросов в секунду, задержки в секундах, ошибок)"""
+    local = threading.local()
+    payload = os.urandom(args.size) if args.cached else None
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            if endpoint == 'scan':
+                data = payload or os.urandom(args.size)
+                response = session.post(f'{url}/api/scan', files={'file': (f'load_{i}.bin', data)},
+                                        timeout=args.timeout)
+            else:
+                response = session.get(f'{url}/api/status', timeout=args.timeout)
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    # Прогрев: соединения, ленивые пулы в воркерах
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        list(executor.map(one, range(args.concurrency)))
+
+        started = time.perf_counter()
+        results = list(executor.map(one, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+    return len(latencies) / elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бэкенда')
+    parser.add_argument('--app', default='backend', choices=['backend', 'advanced'])
+    parser.add_argument('--url', help='уже запущенный сервер (тогда --workers не используется)')
+    parser.add_argument('--workers', default='1,2,4', help='числа воркеров через запятую')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--server', default='auto', choices=['auto', 'gunicorn', 'waitress', 'werkzeug'])
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--endpoints', default='status,scan')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--size', type=parse_size, default='64K', help='размер файла для /api/scan')
+    parser.add_argument('--cached', action='store_true', help='один файл на все запросы (попадание в кэш)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--verbose', action='store_true', help='вывод сервера в консоль')
+    args = parser.parse_args()
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',')]
+    runs = [None] if args.url else [int(workers) for workers in args.workers.split(',')]
+
+    print(f"\n📊 {args.requests} запросов, {args.concurrency} клиентов, файл {args.size // 1024} КБ"
+          f"{', из кэша' if args.cached else ''}")
+    print(f"{'воркеры':>8} {'эндпоинт':>10} {'запр/с':>10} {'p50, мс':>10} {'p99, мс':>10} {'ошибок':>8}")
+    for workers in runs:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(args, workers)
+        try:
+            for endpoint in endpoints:
+                throughput, latencies, errors = run_load(url, endpoint, args)
+                p50 = statistics.median(latencies) * 1000 if latencies else 0
+                p99 = percentile(latencies, 0.99) * 1000 if latencies else 0
+                label = workers if workers is not None else '-'
+                print(f"{label:>8} {endpoint:>10} {throughput:>10.1f} {p50:>10.1f} {p99:>10.1f} {errors:>8}")
+        finally:
+            if process is not None:
+                stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+# bulk_scan.py - МАССОВОЕ СКАНИРОВАНИЕ КАТАЛОГОВ ИЗ КОМАНДНОЙ СТРОКИ
+#
+#   python bulk_scan.py /srv/uploads --report report.jsonl
+#   python bulk_scan.py --list paths.txt --db --batch-size 500
+#   python bulk_scan.py /srv/uploads --resume        # продолжить прерванный запуск
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from scanner import AntivirusScanner, to_db_result
+from signatures import SIGNATURES_FILE, SignatureEngine
+from virustotal import VIRUSTOTAL_URL, VirusTotalClient
+from clamd import ClamdPool
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 2.0  # секунд между строками прогресса
+
+# Состояние процесса-воркера (создается один раз в initializer)
+_scanner = None
+
+
+def init_worker(api_key, signatures_path, virustotal_url, virustotal_rate, clamd_address):
+    """Воркер: свой сигнатурный движок и сканер, без вывода в консоль"""
+    global _scanner
+    # Сканер печатает каждый шаг - в пуле это только шум, прогресс пишет родитель
+    sys.stdout = open(os.devnull, 'w')
+    virustotal = None
+    if api_key:
+        virustotal = VirusTotalClient(api_key, base_url=virustotal_url,
+                                      requests_per_minute=virustotal_rate, queue_timeout=None)
+    # Воркер сканирует по одному файлу - ему хватит одной сессии clamd
+    clamd = ClamdPool(clamd_address, max_size=1) if clamd_address else None
+    _scanner = AntivirusScanner(api_key, signatures=SignatureEngine.from_file(signatures_path),
+                                virustotal=virustotal, clamd=clamd)
+
+
+def hash_task(path):
+    """SHA-256 для файлов с одинаковым размером (кандидаты в дубликаты)"""
+    sha256 = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+    except OSError as e:
+        return path, None, str(e)
+    return path, sha256.hexdigest(), None
+
+
+def scan_task(path):
+    started = time.perf_counter()
+    try:
+        result = _scanner.scan_file(path, os.path.basename(path), use_cache=False)
+    except OSError as e:
+        return path, None, 0, str(e)
+    return path, result, time.perf_counter() - started, None
+
+
+def walk(paths):
+    """Все обычные файлы под путями (без перехода по симлинкам): (путь, размер)"""
+    stack = list(paths)
+    while stack:
+        path = stack.pop()
+        try:
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield path, os.path.getsize(path)
+                continue
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False).st_size
+        except OSError as e:
+            print(f"⚠️ Пропускаю {path}: {e}")
+
+
+def read_list(list_path):
+    stream = sys.stdin if list_path == '-' else open(list_path, 'r', encoding='utf-8')
+    with stream:
+        return [line.strip() for line in stream if line.strip()]
+
+
+def run_pool(executor, func, items, window, on_result):
+    """Не больше window задач в полете: память не растет с размером дерева"""
+    items = iter(items)
+    in_flight = set()
+    while True:
+        for item in items:
+            in_flight.add(executor.submit(func, item))
+            if len(in_flight) >= window:
+                break
+        if not in_flight:
+            return
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            on_result(future.result())
+
+
+class Progress:
+    def __init__(self, total_files, total_bytes):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.threats = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.last_print = 0.0
+
+    def add(self, size, threat=False, error=False):
+        self.files += 1
+        self.bytes += size
+        self.threats += 1 if threat else 0
+        self.errors += 1 if error else 0
+        if time.monotonic() - self.last_print >= PROGRESS_INTERVAL:
+            self.print()
+
+    def print(self):
+        self.last_print = time.monotonic()
+        elapsed = max(self.last_print - self.started, 1e-9)
+        print(f"📈 {self.files}/{self.total_files} файлов "
+              f"({self.bytes / 1024 / 1024:.1f}/{self.total_bytes / 1024 / 1024:.1f} МБ) | "
+              f"{self.files / elapsed:.1f} файлов/с, {self.bytes / 1024 / 1024 / elapsed:.2f} МБ/с | "
+              f"угроз: {self.threats}, ошибок: {self.errors}", flush=True)
+
+
+class ResultWriter:
+    """Отчет JSONL, пакетная запись в БД и чекпоинт - сбрасываются вместе"""
+
+    def __init__(self, report_path, checkpoint_path, db=None, batch_size=200, append=False):
+        mode = 'a' if append else 'w'
+        self.report = open(report_path, mode, encoding='utf-8')
+        self.checkpoint = open(checkpoint_path, mode, encoding='utf-8')
+        self.db = db
+        self.batch_size = batch_size
+        self.records = []
+        self.db_items = []
+        self.saved_scans = 0
+
+    def add(self, record, db_item=None):
+        self.records.append(record)
+        if db_item is not None:
+            self.db_items.append(db_item)
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Путь попадает в чекпоинт только после того, как его результат записан везде
+        if self.db is not None and self.db_items:
+            self.saved_scans += len(self.db.save_scan_results_batch(self.db_items, 'bulk'))
+        for record in self.records:
+            self.report.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.report.flush()
+        for record in self.records:
+            self.checkpoint.write(record['path'] + '\n')
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+        self.records = []
+        self.db_items = []
+
+    def close(self):
+        self.flush()
+        self.report.close()
+        self.checkpoint.close()
+
+
+def make_record(path, size, result=None, duration=0, error=None, duplicate_of=None):
+    record = {'path': path, 'size': size}
+    if error:
+        record.update({'status': 'ERROR', 'error': error})
+        return record
+    db_result = to_db_result(result, round(duration, 4))
+    record.update({
+        'hash': result['hash'],
+        'status': result['status'],
+        'threat_level': db_result['threat_level'],
+        'malicious_engines': db_result['malicious_engines'],
+        'signatures': [m['name'] for m in result['clamav'].get('matches', [])],
+        'scan_duration': db_result['scan_duration']
+    })
+    if duplicate_of:
+        record['duplicate_of'] = duplicate_of
+    return record
+
+
+def make_db_item(path, result, duration, duplicate_of=None):
+    """Строка для save_scan_results_batch: у дубликата - вердикт представителя, без времени скана"""
+    db_result = to_db_result(result, 0 if duplicate_of else round(duration, 4))
+    db_result['path'] = path
+    if duplicate_of:
+        db_result['duplicate_of'] = duplicate_of
+    return (os.path.basename(path), result['hash'], result['size'], file_type(path, result), db_result)
+
+
+def file_type(path, result=None):
+    """Тип по содержимому (filetype в сканере); без него - по расширению"""
+    if result and result.get('file_type'):
+        return result['file_type']
+    return os.path.splitext(path)[1].lstrip('.').lower()[:50] or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Массовое сканирование файлов и каталогов')
+    parser.add_argument('paths', nargs='*', help='файлы и каталоги для сканирования')
+    parser.add_argument('--list', help="файл со списком путей (по одному в строке, '-' - stdin)")
+    parser.add_argument('--report', default='bulk_scan_report.jsonl', help='отчет JSONL')
+    parser.add_argument('--checkpoint', help='файл чекпоинта (по умолчанию <report>.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='пропустить пути из чекпоинта')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--signatures', default=os.getenv('SIGNATURES_PATH', SIGNATURES_FILE))
+    parser.add_argument('--virustotal-rate', type=float, default=float(os.getenv('VIRUSTOTAL_RATE', 4)),
+                        help='квота VirusTotal, запросов в минуту на все воркеры')
+    parser.add_argument('--db', action='store_true', help='писать результаты в PostgreSQL')
+    parser.add_argument('--batch-size', type=int, default=200, help='результатов в одной транзакции')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--database', default='xxx')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.getenv('PGPASSWORD', 'xxx'))
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+    if args.list:
+        paths.extend(read_list(args.list))
+    if not paths:
+        parser.error('укажите пути или --list')
+
+    checkpoint_path = args.checkpoint or args.report + '.checkpoint'
+    done = set()
+    if args.resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            done = {line.rstrip('\n') for line in f}
+        print(f"♻️ Продолжаем: уже обработано {len(done)} файлов")
+
+    db = None
+    if args.db:
+        from database import AdvancedDatabase
+        db = AdvancedDatabase(host=args.host, port=args.port, database=args.database,
+                              user=args.user, password=args.password, pool_min=1, pool_max=2)
+        if not db.pool:
+            sys.exit('❌ Нет подключения к PostgreSQL')
+
+    # 1. Обход дерева и группировка по размеру
+    print("📂 Собираю список файлов...")
+    by_size = defaultdict(list)
+    for path, size in walk(paths):
+        if path not in done:
+            by_size[size].append(path)
+    total_files = sum(len(group) for group in by_size.values())
+    total_bytes = sum(size * len(group) for size, group in by_size.items())
+    print(f"📊 Найдено файлов: {total_files} ({total_bytes / 1024 / 1024:.1f} МБ), "
+          f"воркеров: {args.workers}")
+
+    sizes = {}
+    unique = []      # файлы для сканирования
+    to_hash = []     # одинаковый размер - сначала сравниваем хеши
+    for size, group in by_size.items():
+        for path in group:
+            sizes[path] = size
+        (to_hash if len(group) > 1 else unique).extend(group)
+
+    writer = ResultWriter(args.report, checkpoint_path, db=db,
+                          batch_size=args.batch_size, append=args.resume)
+    progress = Progress(total_files, total_bytes)
+    window = args.workers * 4
+    duplicates = defaultdict(list)  # путь-представитель -> его дубликаты
+
+    api_key = os.getenv('VIRUSTOTAL_API_KEY', '')
+    # Квота ключа общая: делим ее поровну между процессами
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(api_key, args.signatures,
+                                             os.getenv('VIRUSTOTAL_URL', VIRUSTOTAL_URL),
+                                             args.virustotal_rate / args.workers,
+                                             os.getenv('CLAMD_ADDRESS', '')))
+    try:
+        # 2. Дедупликация по хешу внутри групп одного размера
+        if to_hash:
+            print(f"🔁 Хеширую кандидатов в дубликаты: {len(to_hash)}")
+            first_by_hash = {}
+
+            def on_hash(item):
+                path, file_hash, error = item
+                if error:
+                    writer.add(make_record(path, sizes[path], error=error))
+                    progress.add(sizes[path], error=True)
+                    return
+                key = (sizes[path], file_hash)
+                if key in first_by_hash:
+                    duplicates[first_by_hash[key]].append(path)
+                else:
+                    first_by_hash[key] = path
+                    unique.append(path)
+
+            run_pool(executor, hash_task, to_hash, window, on_hash)
+            print(f"🔁 Дубликатов: {sum(len(d) for d in duplicates.values())}")
+
+        # 3. Сканирование уникального содержимого
+        def on_scan(item):
+            path, result, duration, error = item
+            record = make_record(path, sizes[path], result, duration, error)
+            writer.add(record, None if error else make_db_item(path, result, duration))
+            threat = record['status'] == 'THREAT_DETECTED'
+            progress.add(sizes[path], threat=threat, error=bool(error))
+
+            # Дубликаты получают тот же вердикт без повторного сканирования (и свою строку в БД)
+            for duplicate in duplicates.pop(path, []):
+                writer.add(make_record(duplicate, sizes[duplicate], result, duration, error,
+                                       duplicate_of=path),
+                           None if error else make_db_item(duplicate, result, duration, duplicate_of=path))
+                progress.add(sizes[duplicate], threat=threat, error=bool(error))
+
+        run_pool(executor, scan_task, unique, window, on_scan)
+    except KeyboardInterrupt:
+        print("\n⏹️ Остановлено. Продолжить: тот же запуск с --resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        executor.shutdown()
+    finally:
+        writer.close()
+        progress.print()
+        if db is not None:
+            db.pool.closeall()
+
+    print(f"✅ Готово: отчет {args.report}"
+          + (f", записано сканов в БД: {writer.saved_scans}" if db is not None else ''))
+
+
+if __name__ == '__main__':
+    main()
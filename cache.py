@@ -0,0 +1,72 @@
+# cache.py - КЭШ ВЕРДИКТОВ ПО ХЕШУ ФАЙЛА
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerdictCache:
+    """LRU-кэш вердиктов сканирования с TTL, ключ - SHA-256 файла"""
+
+    def __init__(self, max_size=100000, ttl=24 * 60 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_hash):
+        """Возвращает вердикт или None, если его нет или он устарел"""
+        with self._lock:
+            entry = self._data.get(file_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, verdict = entry
+            if expires_at < time.monotonic():
+                del self._data[file_hash]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(file_hash)
+            self.hits += 1
+            return verdict
+
+    def put(self, file_hash, verdict, ttl=None):
+        """Сохраняем вердикт, вытесняя самые старые записи"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[file_hash] = (expires_at, verdict)
+            self._data.move_to_end(file_hash)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, file_hash=None):
+        """Удаляем один вердикт или очищаем весь кэш"""
+        with self._lock:
+            if file_hash is None:
+                self._data.clear()
+            else:
+                self._data.pop(file_hash, None)
+
+    def warm(self, verdicts):
+        """Заполняем кэш из БД при холодном старте (от старых к новым)"""
+        count = 0
+        for file_hash, verdict in verdicts:
+            self.put(file_hash, verdict)
+            count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
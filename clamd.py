@@ -0,0 +1,253 @@
+# clamd.py - КЛИЕНТ CLAMD: ПУЛ СЕССИЙ IDSESSION И ПОТОКОВЫЙ INSTREAM
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+INSTREAM_CHUNK = 64 * 1024  # clamd читает INSTREAM кусками, большие чанки режем
+
+
+class ClamdError(Exception):
+    """clamd недоступен или ответил ошибкой"""
+
+
+def parse_address(address):
+    """'unix:/run/clamd.sock', '/run/clamd.sock', 'tcp:host:3310' или 'host:3310'"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[5:]
+    if address.startswith('/'):
+        return socket.AF_UNIX, address
+    if address.startswith('tcp:'):
+        address = address[4:]
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or 'localhost', int(port or 3310))
+
+
+class ClamdSession:
+    """Одно соединение в режиме IDSESSION: команды идут подряд без переподключения"""
+
+    def __init__(self, address, timeout):
+        family, target = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(target)
+            self.sock.sendall(b'zIDSESSION\0')
+        except OSError:
+            self.sock.close()
+            raise
+        self._buffer = b''
+        self.closed = False
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def command(self, name):
+        self.send(b'z' + name + b'\0')
+        return self.read_reply()
+
+    def read_reply(self):
+        """Ответ до '\\0' без префикса '<id>: ' сессии"""
+        while b'\0' not in self._buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ClamdError('clamd закрыл соединение')
+            self._buffer += data
+        reply, self._buffer = self._buffer.split(b'\0', 1)
+        reply = reply.decode('utf-8', 'replace')
+        request_id, sep, rest = reply.partition(': ')
+        return rest if sep and request_id.isdigit() else reply
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.sendall(b'zEND\0')
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ClamdPool:
+    """Пул сессий к долгоживущему clamd: базы сигнатур грузятся один раз, а не на каждый файл"""
+
+    def __init__(self, address, max_size=8, timeout=30, ping_after=10):
+        self.address = address
+        self.max_size = max_size
+        self.timeout = timeout
+        # clamd закрывает простаивающие сессии (IdleTimeout) - проверяем PING
+        self.ping_after = ping_after
+        self._idle = deque()  # (сессия, время возврата)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {'sessions_opened': 0, 'scans': 0, 'errors': 0}
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    session, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    session, idle_since = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ClamdError(f'Нет свободных сессий clamd за {self.timeout} с')
+                self._cond.wait(remaining)
+
+        try:
+            if session is not None and time.monotonic() - idle_since >= self.ping_after:
+                try:
+                    if session.command(b'PING') != 'PONG':
+                        raise ClamdError('clamd не ответил на PING')
+                except (OSError, ClamdError):
+                    session.close()
+                    session = None
+            if session is None:
+                session = ClamdSession(self.address, self.timeout)
+                self._count('sessions_opened')
+        except Exception as e:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise ClamdError(f'clamd недоступен ({self.address}): {e}') from e
+        return session
+
+    def putconn(self, session, discard=False):
+        with self._cond:
+            if discard or session.closed:
+                self._size -= 1
+                session.close()
+            else:
+                self._idle.append((session, time.monotonic()))
+            self._cond.notify()
+
+    def instream(self):
+        """Начинаем INSTREAM: дальше чанки пишутся по мере чтения загрузки"""
+        session = self.getconn()
+        try:
+            session.send(b'zINSTREAM\0')
+        except OSError as e:
+            self.putconn(session, discard=True)
+            raise ClamdError(f'clamd: {e}') from e
+        return ClamdStream(self, session)
+
+    def scan_bytes(self, data):
+        stream = self.instream()
+        stream.write(data)
+        return stream.result()
+
+    def ping(self):
+        session = self.getconn()
+        try:
+            alive = session.command(b'PING') == 'PONG'
+        except (OSError, ClamdError):
+            self.putconn(session, discard=True)
+            return False
+        self.putconn(session)
+        return alive
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({'address': self.address, 'max': self.max_size,
+                          'size': self._size, 'idle': len(self._idle)})
+            return stats
+
+    def closeall(self):
+        """Закрываем свободные сессии; пул остается рабочим (в том числе перед fork)"""
+        with self._cond:
+            while self._idle:
+                session, _ = self._idle.pop()
+                self._size -= 1
+                session.close()
+            self._cond.notify_all()
+
+
+class ClamdStream:
+    """Приемник для ScanPipeline: write(chunk) уходит в clamd без временного файла"""
+
+    def __init__(self, pool, session):
+        self.pool = pool
+        self.session = session
+        self.error = None
+        self._verdict = None
+        self._finished = False
+        self._lock = threading.Lock()  # result() и close() из разных потоков
+
+    def write(self, chunk):
+        if self.session is None:
+            return
+        try:
+            view = memoryview(chunk)
+            for start in range(0, len(view), INSTREAM_CHUNK):
+                part = view[start:start + INSTREAM_CHUNK]
+                self.session.send(struct.pack('>I', len(part)) + part)
+        except OSError as e:
+            # Обычно clamd уже объяснил причину (StreamMaxLength) и закрыл сокет
+            try:
+                reason = self.session.read_reply()
+            except (OSError, ClamdError):
+                reason = str(e)
+            # Чтение загрузки не прерываем: вердикт даст запасной движок
+            self._fail(f'clamd: {reason}')
+
+    def result(self):
+        """Имя угрозы или None; ClamdError, если clamd не дал вердикта"""
+        with self._lock:
+            if not self._finished:
+                self._finished = True
+                if self.session is not None:
+                    try:
+                        self.session.send(struct.pack('>I', 0))
+                        reply = self.session.read_reply()
+                    except (OSError, ClamdError) as e:
+                        self._fail(f'clamd: {e}')
+                    else:
+                        self._parse(reply)
+        if self.error:
+            raise ClamdError(self.error)
+        return self._verdict
+
+    def _parse(self, reply):
+        # "stream: OK", "stream: Eicar-Signature FOUND", "INSTREAM size limit exceeded. ERROR"
+        session, self.session = self.session, None
+        if reply.endswith('ERROR'):
+            # После ошибки INSTREAM clamd закрывает соединение
+            self.pool.putconn(session, discard=True)
+            self.pool._count('errors')
+            self.error = f'clamd: {reply}'
+            return
+        self.pool.putconn(session)
+        self.pool._count('scans')
+        if reply.endswith(' FOUND'):
+            self._verdict = reply[:-len(' FOUND')].split(': ', 1)[-1]
+
+    def _fail(self, error):
+        self.error = error
+        if self.session is not None:
+            self.pool.putconn(self.session, discard=True)
+            self.session = None
+            self.pool._count('errors')
+
+    def close(self):
+        """Поток не понадобился (кэш, движок пропущен): недописанную сессию не переиспользуем"""
+        # result() уже идет в другом потоке - сессию вернет он
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self.session is not None and not self._finished:
+                self._finished = True
+                self.pool.putconn(self.session, discard=True)
+                self.session = None
+        finally:
+            self._lock.release()
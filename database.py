@@ -1,37 +1,58 @@
 # database.py - УЛУЧШЕННАЯ БАЗА ДАННЫХ POSTGRESQL
+#
+#   python database.py --rebuild-fuzzy-index --host localhost --database xxx --password ...
+# Без флагов - только создание таблиц, индексов и представлений
+import argparse
+import sys
+
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from datetime import datetime, timedelta
+import base64
 import hashlib
 import json
 import os
 
+from db_pool import ConnectionPool
+from settings import parse_setting
+from digests import compare, digest_kind, fuzzy_ngrams
+
 class AdvancedDatabase:
     """Улучшенная база данных с расширенными функциями"""
     
     def __init__(self, host="localhost", database="xxx", 
-                 user="postgres", password="xxx", port="5432"):
+                 user="postgres", password="xxx", port="5432",
+                 pool_min=None, pool_max=None):
         self.host = host
         self.database = database
         self.user = user
         self.password = password
         self.port = port
-        self.conn = None
+        self.pool_min = pool_min or int(os.getenv('DB_POOL_MIN', 1))
+        self.pool_max = pool_max or int(os.getenv('DB_POOL_MAX', 10))
+        self.pool = None
         self.connect()
     
+    def create_pool(self):
+        """Пул соединений к нашей БД (autocommit, как и раньше)"""
+        return ConnectionPool(
+            minconn=self.pool_min,
+            maxconn=self.pool_max,
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+            autocommit=True,
+            host=self.host,
+            database=self.database,
+            user=self.user,
+            password=self.password,
+            port=self.port
+        )
+    
     def connect(self):
         """Подключение к PostgreSQL"""
         try:
             # Пробуем подключиться к существующей БД
-            self.conn = psycopg2.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port
-            )
-            self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self.pool = self.create_pool()
             print(f"✅ Подключено к PostgreSQL: {self.database}")
             self.init_advanced_tables()
             return True
@@ -63,14 +84,7 @@ class AdvancedDatabase:
             temp_conn.close()
             
             # Подключаемся к новой БД
-            self.conn = psycopg2.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port
-            )
-            self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self.pool = self.create_pool()
             
             # Инициализируем таблицы
             self.init_advanced_tables()
@@ -82,450 +96,936 @@ class AdvancedDatabase:
     
     def init_advanced_tables(self):
         """Создание улучшенной структуры таблиц"""
-        cursor = self.conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
         
-        # 1. Таблица пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE,
-                password_hash VARCHAR(255),
-                role VARCHAR(20) DEFAULT 'user',
-                avatar_url TEXT,
-                settings JSONB DEFAULT '{"theme": "dark", "notifications": true}',
-                last_login TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            # 1. Таблица пользователей
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    username VARCHAR(50) UNIQUE NOT NULL,
+                    email VARCHAR(100) UNIQUE,
+                    password_hash VARCHAR(255),
+                    role VARCHAR(20) DEFAULT 'user',
+                    avatar_url TEXT,
+                    settings JSONB DEFAULT '{"theme": "dark", "notifications": true}',
+                    last_login TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
         
-        # 2. Таблица файлов (основная)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                id SERIAL PRIMARY KEY,
-                original_name VARCHAR(255) NOT NULL,
-                stored_name VARCHAR(100) UNIQUE NOT NULL,
-                file_hash VARCHAR(64) UNIQUE NOT NULL,
-                file_size BIGINT NOT NULL,
-                file_type VARCHAR(50),
-                mime_type VARCHAR(100),
-                uploader_id INTEGER REFERENCES users(id),
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expiration_date TIMESTAMP,
-                download_count INTEGER DEFAULT 0,
-                metadata JSONB DEFAULT '{}',
-                INDEX idx_file_hash (file_hash),
-                INDEX idx_upload_date (upload_date DESC)
-            )
-        ''')
+            # 2. Таблица файлов (основная)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    id SERIAL PRIMARY KEY,
+                    original_name VARCHAR(255) NOT NULL,
+                    stored_name VARCHAR(100) UNIQUE NOT NULL,
+                    file_hash VARCHAR(64) UNIQUE NOT NULL,
+                    file_size BIGINT NOT NULL,
+                    file_type VARCHAR(50),
+                    mime_type VARCHAR(100),
+                    uploader_id INTEGER REFERENCES users(id),
+                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    expiration_date TIMESTAMP,
+                    download_count INTEGER DEFAULT 0,
+                    metadata JSONB DEFAULT '{}'
+                )
+            ''')
         
-        # 3. Таблица сканирований
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scans (
-                id SERIAL PRIMARY KEY,
-                file_id INTEGER REFERENCES files(id),
-                scanner_type VARCHAR(20) NOT NULL,
-                status VARCHAR(20) DEFAULT 'pending',
-                result JSONB NOT NULL,
-                threat_level INTEGER DEFAULT 0,
-                detection_count INTEGER DEFAULT 0,
-                engine_count INTEGER DEFAULT 0,
-                malicious_engines TEXT[],
-                scan_duration FLOAT,
-                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP,
-                INDEX idx_scans_file_id (file_id),
-                INDEX idx_scans_status (status),
-                INDEX idx_scans_threat (threat_level DESC)
-            )
-        ''')
+            # 3. Таблица сканирований
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scans (
+                    id SERIAL PRIMARY KEY,
+                    file_id INTEGER REFERENCES files(id),
+                    scanner_type VARCHAR(20) NOT NULL,
+                    status VARCHAR(20) DEFAULT 'pending',
+                    result JSONB NOT NULL,
+                    threat_level INTEGER DEFAULT 0,
+                    detection_count INTEGER DEFAULT 0,
+                    engine_count INTEGER DEFAULT 0,
+                    malicious_engines TEXT[],
+                    scan_duration FLOAT,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP
+                )
+            ''')
         
-        # 4. Таблица угроз
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS threats (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                type VARCHAR(50) NOT NULL,
-                severity INTEGER NOT NULL CHECK (severity BETWEEN 1 AND 10),
-                description TEXT,
-                signature TEXT,
-                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_seen TIMESTAMP,
-                detection_count INTEGER DEFAULT 1,
-                INDEX idx_threats_severity (severity DESC),
-                INDEX idx_threats_name (name)
-            )
-        ''')
+            # 4. Таблица угроз
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS threats (
+                    id SERIAL PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL,
+                    type VARCHAR(50) NOT NULL,
+                    severity INTEGER NOT NULL CHECK (severity BETWEEN 1 AND 10),
+                    description TEXT,
+                    signature TEXT,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    detection_count INTEGER DEFAULT 1
+                )
+            ''')
         
-        # 5. Таблица детекций
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS detections (
-                id SERIAL PRIMARY KEY,
-                scan_id INTEGER REFERENCES scans(id),
-                threat_id INTEGER REFERENCES threats(id),
-                engine_name VARCHAR(50) NOT NULL,
-                detection_name VARCHAR(100),
-                confidence FLOAT CHECK (confidence BETWEEN 0 AND 1),
-                details JSONB,
-                detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_detections_scan (scan_id),
-                INDEX idx_detections_threat (threat_id)
-            )
-        ''')
+            # 5. Таблица детекций
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS detections (
+                    id SERIAL PRIMARY KEY,
+                    scan_id INTEGER REFERENCES scans(id),
+                    threat_id INTEGER REFERENCES threats(id),
+                    engine_name VARCHAR(50) NOT NULL,
+                    detection_name VARCHAR(100),
+                    confidence FLOAT CHECK (confidence BETWEEN 0 AND 1),
+                    details JSONB,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
         
-        # 6. Таблица статистики (агрегированные данные)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS statistics (
-                id SERIAL PRIMARY KEY,
-                date DATE UNIQUE NOT NULL,
-                total_scans INTEGER DEFAULT 0,
-                clean_files INTEGER DEFAULT 0,
-                threats_found INTEGER DEFAULT 0,
-                top_threats JSONB,
-                avg_scan_time FLOAT,
-                user_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            # 6. Таблица статистики (агрегированные данные)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS statistics (
+                    id SERIAL PRIMARY KEY,
+                    date DATE UNIQUE NOT NULL,
+                    total_scans INTEGER DEFAULT 0,
+                    clean_files INTEGER DEFAULT 0,
+                    threats_found INTEGER DEFAULT 0,
+                    top_threats JSONB,
+                    avg_scan_time FLOAT,
+                    user_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # update_daily_stats пишет updated_at - добавляем в уже созданные таблицы
+            cursor.execute('ALTER TABLE statistics ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
         
-        # 7. Таблица настроек системы
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_settings (
-                key VARCHAR(50) PRIMARY KEY,
-                value TEXT NOT NULL,
-                data_type VARCHAR(20) DEFAULT 'string',
-                category VARCHAR(30),
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_by INTEGER REFERENCES users(id)
-            )
-        ''')
+            # 7. Таблица настроек системы
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS system_settings (
+                    key VARCHAR(50) PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    data_type VARCHAR(20) DEFAULT 'string',
+                    category VARCHAR(30),
+                    description TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_by INTEGER REFERENCES users(id)
+                )
+            ''')
         
-        # 8. Таблица квот пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_quotas (
-                user_id INTEGER PRIMARY KEY REFERENCES users(id),
-                max_file_size BIGINT DEFAULT 104857600, -- 100 MB
-                max_files_per_day INTEGER DEFAULT 100,
-                max_concurrent_scans INTEGER DEFAULT 5,
-                current_daily_usage INTEGER DEFAULT 0,
-                last_reset_date DATE DEFAULT CURRENT_DATE,
-                INDEX idx_quotas_usage (current_daily_usage DESC)
-            )
-        ''')
-        
-        # Вставляем начальные настройки
-        initial_settings = [
-            ('max_upload_size', '33554432', 'integer', 'uploads', 'Максимальный размер загружаемого файла (32MB)'),
-            ('scan_timeout', '300', 'integer', 'scanning', 'Таймаут сканирования в секундах'),
-            ('retention_days', '30', 'integer', 'storage', 'Дней хранения файлов'),
-            ('clamav_enabled', 'true', 'boolean', 'scanners', 'Включить ClamAV сканер'),
-            ('virustotal_enabled', 'true', 'boolean', 'scanners', 'Включить VirusTotal'),
-            ('notification_emails', 'true', 'boolean', 'notifications', 'Отправлять email уведомления'),
-            ('daily_scan_limit', '1000', 'integer', 'limits', 'Лимит сканирований в день')
-        ]
-        
-        for key, value, data_type, category, description in initial_settings:
+            # 8. Таблица квот пользователей
             cursor.execute('''
-                INSERT INTO system_settings (key, value, data_type, category, description)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (key) DO NOTHING
-            ''', (key, value, data_type, category, description))
+                CREATE TABLE IF NOT EXISTS user_quotas (
+                    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+                    max_file_size BIGINT DEFAULT 104857600, -- 100 MB
+                    max_files_per_day INTEGER DEFAULT 100,
+                    max_concurrent_scans INTEGER DEFAULT 5,
+                    current_daily_usage INTEGER DEFAULT 0,
+                    last_reset_date DATE DEFAULT CURRENT_DATE
+                )
+            ''')
         
-        # Создаем демо-пользователя
-        cursor.execute('''
-            INSERT INTO users (username, email, role, settings)
-            VALUES ('admin', 'admin@dbt-antivirus.local', 'admin', 
-                    '{"theme": "dark", "notifications": true, "language": "ru"}')
-            ON CONFLICT (username) DO NOTHING
-        ''')
+            # 9. Индекс сходства: 7-граммы хешей ssdeep (кандидаты для find_similar_files)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fuzzy_ngrams (
+                    block_size BIGINT NOT NULL,
+                    ngram BIGINT NOT NULL,
+                    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+                    PRIMARY KEY (block_size, ngram, file_id)
+                )
+            ''')
         
-        self.conn.commit()
-        cursor.close()
-        print("✅ Улучшенная структура БД создана")
+            # Индексы (в PostgreSQL они создаются отдельно от CREATE TABLE)
+            indexes = [
+                'CREATE INDEX IF NOT EXISTS idx_files_upload_date ON files(upload_date DESC)',
+                # Поиск по любому дайджесту из files.metadata без повторного чтения файла
+                "CREATE INDEX IF NOT EXISTS idx_files_md5 ON files((metadata->>'md5'))",
+                "CREATE INDEX IF NOT EXISTS idx_files_sha1 ON files((metadata->>'sha1'))",
+                "CREATE INDEX IF NOT EXISTS idx_files_ssdeep ON files((metadata->>'ssdeep'))",
+                'CREATE INDEX IF NOT EXISTS idx_scans_file_id ON scans(file_id)',
+                'CREATE INDEX IF NOT EXISTS idx_scans_status ON scans(status)',
+                'CREATE INDEX IF NOT EXISTS idx_scans_threat ON scans(threat_level DESC)',
+                # Keyset-пагинация истории: ORDER BY started_at DESC, id DESC + фильтры
+                'CREATE INDEX IF NOT EXISTS idx_scans_started_id ON scans(started_at, id)',
+                'CREATE INDEX IF NOT EXISTS idx_scans_status_started ON scans(status, started_at, id)',
+                'CREATE INDEX IF NOT EXISTS idx_scans_file_started ON scans(file_id, started_at, id)',
+                'CREATE INDEX IF NOT EXISTS idx_scans_threats_started ON scans(started_at, id) WHERE threat_level > 0',
+                'CREATE INDEX IF NOT EXISTS idx_threats_severity ON threats(severity DESC)',
+                'CREATE INDEX IF NOT EXISTS idx_detections_scan ON detections(scan_id)',
+                'CREATE INDEX IF NOT EXISTS idx_detections_threat ON detections(threat_id)',
+                'CREATE INDEX IF NOT EXISTS idx_quotas_usage ON user_quotas(current_daily_usage DESC)',
+                'CREATE INDEX IF NOT EXISTS idx_fuzzy_ngrams_file ON fuzzy_ngrams(file_id)'
+            ]
+            for statement in indexes:
+                cursor.execute(statement)
+            
+        
+            # Вставляем начальные настройки
+            initial_settings = [
+                ('max_upload_size', '33554432', 'integer', 'uploads', 'Максимальный размер загружаемого файла (32MB)'),
+                ('scan_timeout', '300', 'integer', 'scanning', 'Таймаут сканирования в секундах'),
+                ('retention_days', '30', 'integer', 'storage', 'Дней хранения файлов'),
+                ('signatures_enabled', 'true', 'boolean', 'scanners', 'Включить встроенные сигнатуры'),
+                ('clamav_enabled', 'true', 'boolean', 'scanners', 'Включить ClamAV сканер'),
+                ('virustotal_enabled', 'true', 'boolean', 'scanners', 'Включить VirusTotal'),
+                ('notification_emails', 'true', 'boolean', 'notifications', 'Отправлять email уведомления'),
+                ('daily_scan_limit', '1000', 'integer', 'limits', 'Лимит сканирований в день')
+            ]
+        
+            for key, value, data_type, category, description in initial_settings:
+                cursor.execute('''
+                    INSERT INTO system_settings (key, value, data_type, category, description)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (key) DO NOTHING
+                ''', (key, value, data_type, category, description))
+        
+            # Создаем демо-пользователя
+            cursor.execute('''
+                INSERT INTO users (username, email, role, settings)
+                VALUES ('admin', 'admin@dbt-antivirus.local', 'admin', 
+                        '{"theme": "dark", "notifications": true, "language": "ru"}')
+                ON CONFLICT (username) DO NOTHING
+            ''')
+        
+            conn.commit()
+            cursor.close()
+            print("✅ Улучшенная структура БД создана")
+        
+        # Имя угрозы уникально - на этом держится пакетный upsert в save_scan_result
+        self.ensure_unique_threat_names()
         
         # Создаем представления для удобства
         self.create_views()
     
+    def ensure_unique_threat_names(self):
+        """Склеиваем дубликаты угроз и создаем уникальный индекс по имени - одной транзакцией"""
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT to_regclass('uq_threats_name')")
+            if cursor.fetchone()[0]:
+                cursor.close()
+                return
+            # Пока склеиваем, новых дубликатов никто не вставит
+            cursor.execute('LOCK TABLE threats IN SHARE ROW EXCLUSIVE MODE')
+            
+            # Детекции переносим на самую раннюю запись с тем же именем
+            cursor.execute('''
+                UPDATE detections d SET threat_id = k.keep_id
+                FROM (
+                    SELECT id, MIN(id) OVER (PARTITION BY name) as keep_id FROM threats
+                ) k
+                WHERE d.threat_id = k.id AND k.id <> k.keep_id
+            ''')
+            cursor.execute('''
+                UPDATE threats t SET 
+                    detection_count = agg.total,
+                    first_seen = agg.first_seen,
+                    last_seen = agg.last_seen
+                FROM (
+                    SELECT name, MIN(id) as keep_id, SUM(detection_count) as total,
+                           MIN(first_seen) as first_seen, MAX(last_seen) as last_seen
+                    FROM threats
+                    GROUP BY name
+                    HAVING COUNT(*) > 1
+                ) agg
+                WHERE t.id = agg.keep_id
+            ''')
+            cursor.execute('DELETE FROM threats t USING threats k WHERE t.name = k.name AND t.id > k.id')
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_threats_name ON threats(name)')
+            cursor.close()
+    
     def create_views(self):
         """Создание SQL-представлений"""
-        cursor = self.conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
         
-        # Представление для детальной статистики
-        cursor.execute('''
-            CREATE OR REPLACE VIEW scan_stats_view AS
-            SELECT 
-                DATE(s.started_at) as scan_date,
-                COUNT(*) as total_scans,
-                SUM(CASE WHEN s.threat_level > 0 THEN 1 ELSE 0 END) as threats_found,
-                AVG(s.scan_duration) as avg_duration,
-                ARRAY_AGG(DISTINCT t.name) as top_threats
-            FROM scans s
-            LEFT JOIN detections d ON s.id = d.scan_id
-            LEFT JOIN threats t ON d.threat_id = t.id
-            WHERE s.completed_at IS NOT NULL
-            GROUP BY DATE(s.started_at)
-            ORDER BY scan_date DESC
-        ''')
-        
-        # Представление для пользовательской активности
-        cursor.execute('''
-            CREATE OR REPLACE VIEW user_activity_view AS
-            SELECT 
-                u.username,
-                u.role,
-                COUNT(f.id) as files_uploaded,
-                COUNT(s.id) as scans_performed,
-                MAX(s.started_at) as last_scan,
-                COALESCE(SUM(f.file_size), 0) as total_upload_size
-            FROM users u
-            LEFT JOIN files f ON u.id = f.uploader_id
-            LEFT JOIN scans s ON f.id = s.file_id
-            GROUP BY u.id, u.username, u.role
-            ORDER BY scans_performed DESC
-        ''')
-        
-        # Представление для угроз по дням
-        cursor.execute('''
-            CREATE OR REPLACE VIEW daily_threats_view AS
-            SELECT 
-                DATE(s.completed_at) as threat_date,
-                t.name as threat_name,
-                t.severity,
-                COUNT(*) as detection_count
-            FROM scans s
-            JOIN detections d ON s.id = d.scan_id
-            JOIN threats t ON d.threat_id = t.id
-            WHERE s.threat_level > 0
-            GROUP BY DATE(s.completed_at), t.name, t.severity
-            ORDER BY threat_date DESC, detection_count DESC
-        ''')
-        
-        self.conn.commit()
-        cursor.close()
-        print("✅ SQL-представления созданы")
+            # Представление для детальной статистики
+            cursor.execute('''
+                CREATE OR REPLACE VIEW scan_stats_view AS
+                SELECT 
+                    DATE(s.started_at) as scan_date,
+                    COUNT(*) as total_scans,
+                    SUM(CASE WHEN s.threat_level > 0 THEN 1 ELSE 0 END) as threats_found,
+                    AVG(s.scan_duration) as avg_duration,
+                    ARRAY_AGG(DISTINCT t.name) as top_threats
+                FROM scans s
+                LEFT JOIN detections d ON s.id = d.scan_id
+                LEFT JOIN threats t ON d.threat_id = t.id
+                WHERE s.completed_at IS NOT NULL
+                GROUP BY DATE(s.started_at)
+                ORDER BY scan_date DESC
+            ''')
+        
+            # Представление для пользовательской активности
+            cursor.execute('''
+                CREATE OR REPLACE VIEW user_activity_view AS
+                SELECT 
+                    u.username,
+                    u.role,
+                    COUNT(f.id) as files_uploaded,
+                    COUNT(s.id) as scans_performed,
+                    MAX(s.started_at) as last_scan,
+                    COALESCE(SUM(f.file_size), 0) as total_upload_size
+                FROM users u
+                LEFT JOIN files f ON u.id = f.uploader_id
+                LEFT JOIN scans s ON f.id = s.file_id
+                GROUP BY u.id, u.username, u.role
+                ORDER BY scans_performed DESC
+            ''')
+        
+            # Представление для угроз по дням
+            cursor.execute('''
+                CREATE OR REPLACE VIEW daily_threats_view AS
+                SELECT 
+                    DATE(s.completed_at) as threat_date,
+                    t.name as threat_name,
+                    t.severity,
+                    COUNT(*) as detection_count
+                FROM scans s
+                JOIN detections d ON s.id = d.scan_id
+                JOIN threats t ON d.threat_id = t.id
+                WHERE s.threat_level > 0
+                GROUP BY DATE(s.completed_at), t.name, t.severity
+                ORDER BY threat_date DESC, detection_count DESC
+            ''')
+        
+            conn.commit()
+            cursor.close()
+            print("✅ SQL-представления созданы")
     
-    # ========== МЕТОДЫ ДЛЯ РАБОТЫ С ДАННЫМИ ==========
+        # ========== МЕТОДЫ ДЛЯ РАБОТЫ С ДАННЫМИ ==========
     
-    def save_file_metadata(self, filename, file_hash, size, file_type, uploader_id=None):
-        """Сохранение метаданных файла"""
-        cursor = self.conn.cursor()
-        stored_name = f"{file_hash[:16]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    def save_file_metadata(self, filename, file_hash, size, file_type, uploader_id=None, metadata=None,
+                           mime_type=None):
+        """Сохранение метаданных файла (metadata - дайджесты MD5/SHA-1/ssdeep и прочее)
+
+        Повторный хеш обновляет существующую запись; файл и индекс сходства - одной транзакцией.
+        """
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            stored_name = file_hash  # содержимое - в SampleStore под этим же хешем
         
-        cursor.execute('''
-            INSERT INTO files 
-            (original_name, stored_name, file_hash, file_size, file_type, uploader_id, upload_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (filename, stored_name, file_hash, size, file_type, uploader_id, datetime.now()))
-        
-        file_id = cursor.fetchone()[0]
-        self.conn.commit()
-        cursor.close()
-        return file_id
+            cursor.execute('''
+                INSERT INTO files 
+                (original_name, stored_name, file_hash, file_size, file_type, mime_type,
+                 uploader_id, upload_date, metadata)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (file_hash) DO UPDATE SET
+                    file_size = EXCLUDED.file_size,
+                    file_type = COALESCE(EXCLUDED.file_type, files.file_type),
+                    mime_type = COALESCE(EXCLUDED.mime_type, files.mime_type),
+                    metadata = files.metadata || EXCLUDED.metadata
+                RETURNING id
+            ''', (filename, stored_name, file_hash, size, file_type, mime_type, uploader_id, datetime.now(),
+                  Json(metadata or {})))
+        
+            file_id = cursor.fetchone()[0]
+            if metadata and metadata.get('ssdeep'):
+                self.index_fuzzy_hashes(cursor, [(file_id, metadata['ssdeep'])])
+            cursor.close()
+            return file_id
     
     def save_scan_result(self, file_id, scanner_type, result):
         """Сохранение результата сканирования"""
-        cursor = self.conn.cursor()
+        # Скан, угрозы, детекции и статистика - в одной транзакции
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
         
-        threat_level = result.get('threat_level', 0)
-        detection_count = result.get('detection_count', 0)
-        engine_count = result.get('engine_count', 0)
-        malicious_engines = result.get('malicious_engines', [])
-        scan_duration = result.get('scan_duration', 0)
+            threat_level = result.get('threat_level', 0)
+            detection_count = result.get('detection_count', 0)
+            engine_count = result.get('engine_count', 0)
+            malicious_engines = result.get('malicious_engines', [])
+            scan_duration = result.get('scan_duration', 0)
+        
+            values = (
+                file_id, scanner_type, 'completed', 
+                Json(result), threat_level, detection_count, 
+                engine_count, malicious_engines, scan_duration, datetime.now()
+            )
         
-        cursor.execute('''
-            INSERT INTO scans 
-            (file_id, scanner_type, status, result, threat_level, 
-             detection_count, engine_count, malicious_engines, scan_duration, completed_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (
-            file_id, scanner_type, 'completed', 
-            Json(result), threat_level, detection_count, 
-            engine_count, malicious_engines, scan_duration, datetime.now()
-        ))
-        
-        scan_id = cursor.fetchone()[0]
-        
-        # Сохраняем детекции
-        detections = result.get('detections', [])
-        for detection in detections:
-            threat_name = detection.get('threat_name')
-            engine_name = detection.get('engine_name')
-            
-            # Находим или создаем угрозу
             cursor.execute('''
-                SELECT id FROM threats WHERE name = %s
-            ''', (threat_name,))
+                INSERT INTO scans 
+                (file_id, scanner_type, status, result, threat_level, 
+                 detection_count, engine_count, malicious_engines, scan_duration, completed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, started_at
+            ''', values)
             
-            threat_row = cursor.fetchone()
-            if threat_row:
-                threat_id = threat_row[0]
-                cursor.execute('''
-                    UPDATE threats 
-                    SET detection_count = detection_count + 1, last_seen = %s
-                    WHERE id = %s
-                ''', (datetime.now(), threat_id))
-            else:
-                cursor.execute('''
-                    INSERT INTO threats (name, type, severity, first_seen, last_seen)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id
-                ''', (
-                    threat_name,
+            scan_id, started_at = cursor.fetchone()
+        
+            # Сохраняем детекции: один upsert в threats и один INSERT в detections
+            self.save_detections(cursor, [(scan_id, d) for d in result.get('detections', [])])
+        
+            # Обновляем счетчики за день (день скана - по started_at, как при пересчете)
+            is_threat = 1 if threat_level and threat_level > 0 else 0
+            self.update_daily_stats(conn, started_at.date(), 1, is_threat, scan_duration or 0)
+        
+            cursor.close()
+            return scan_id
+    
+    def save_detections(self, cursor, detections):
+        """Пакетная запись детекций [(scan_id, detection), ...] в транзакции вызывающего"""
+        if not detections:
+            return
+        
+        now = datetime.now()
+        
+        # Одна строка на угрозу: ON CONFLICT не может задеть строку дважды
+        threats = {}
+        for _, detection in detections:
+            threat_name = detection.get('threat_name')
+            if not threat_name:
+                continue
+            if threat_name not in threats:
+                threats[threat_name] = [
                     detection.get('type', 'unknown'),
                     detection.get('severity', 5),
-                    datetime.now(),
-                    datetime.now()
-                ))
-                threat_id = cursor.fetchone()[0]
-            
-            # Сохраняем детекцию
-            cursor.execute('''
-                INSERT INTO detections 
-                (scan_id, threat_id, engine_name, detection_name, confidence, details)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (
+                    0
+                ]
+            threats[threat_name][2] += 1
+        
+        threat_ids = {}
+        if threats:
+            # Строки блокируются в порядке VALUES: сортируем, иначе две транзакции
+            # с теми же угрозами в разном порядке ждут друг друга (deadlock)
+            rows = execute_values(cursor, '''
+                INSERT INTO threats (name, type, severity, detection_count, first_seen, last_seen)
+                VALUES %s
+                ON CONFLICT (name) DO UPDATE SET 
+                    detection_count = threats.detection_count + EXCLUDED.detection_count,
+                    last_seen = EXCLUDED.last_seen
+                RETURNING id, name
+            ''', [
+                (name, threat_type, severity, count, now, now)
+                for name, (threat_type, severity, count) in sorted(threats.items())
+            ], page_size=len(threats), fetch=True)
+            threat_ids = {name: threat_id for threat_id, name in rows}
+        
+        execute_values(cursor, '''
+            INSERT INTO detections 
+            (scan_id, threat_id, engine_name, detection_name, confidence, details)
+            VALUES %s
+        ''', [
+            (
                 scan_id,
-                threat_id,
-                engine_name,
+                threat_ids.get(detection.get('threat_name')),
+                detection.get('engine_name'),
                 detection.get('detection_name'),
                 detection.get('confidence', 0.0),
                 Json(detection.get('details', {}))
-            ))
-        
-        # Обновляем статистику за день
-        self.update_daily_stats()
-        
-        self.conn.commit()
-        cursor.close()
-        return scan_id
+            )
+            for scan_id, detection in detections
+        ], page_size=len(detections))
     
-    def update_daily_stats(self):
-        """Обновление дневной статистики"""
-        cursor = self.conn.cursor()
-        today = datetime.now().date()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN threat_level > 0 THEN 1 ELSE 0 END) as threats
-            FROM scans 
-            WHERE DATE(started_at) = %s
-        ''', (today,))
+    def save_scan_results_batch(self, items, scanner_type):
+        """Пакет [(filename, file_hash, size, file_type, result), ...] одной транзакцией"""
+        if not items:
+            return []
         
-        stats = cursor.fetchone()
+        now = datetime.now()
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # 1. Файлы: один upsert, уникальность по хешу; тип и MIME - по содержимому (filetype)
+            files = {}
+            for filename, file_hash, size, file_type, result in items:
+                files.setdefault(file_hash, (filename, size, file_type, result.get('mime_type'),
+                                             result.get('digests') or {}))
+            rows = execute_values(cursor, '''
+                INSERT INTO files
+                (original_name, stored_name, file_hash, file_size, file_type, mime_type, upload_date, metadata)
+                VALUES %s
+                ON CONFLICT (file_hash) DO UPDATE SET
+                    file_size = EXCLUDED.file_size,
+                    file_type = COALESCE(EXCLUDED.file_type, files.file_type),
+                    mime_type = COALESCE(EXCLUDED.mime_type, files.mime_type),
+                    metadata = files.metadata || EXCLUDED.metadata
+                RETURNING id, file_hash
+            ''', [
+                (filename, file_hash, file_hash, size, file_type, mime_type, now, Json(digests))
+                for file_hash, (filename, size, file_type, mime_type, digests) in files.items()
+            ], page_size=len(files), fetch=True)
+            file_ids = {file_hash: file_id for file_id, file_hash in rows}
+            self.index_fuzzy_hashes(cursor, [
+                (file_ids[file_hash], digests['ssdeep'])
+                for file_hash, (*_, digests) in files.items() if digests.get('ssdeep')
+            ])
+            
+            # 2. Сканы: одна вставка, RETURNING в порядке VALUES
+            rows = execute_values(cursor, '''
+                INSERT INTO scans 
+                (file_id, scanner_type, status, result, threat_level, 
+                 detection_count, engine_count, malicious_engines, scan_duration, completed_at)
+                VALUES %s
+                RETURNING id, started_at
+            ''', [
+                (
+                    file_ids[file_hash], scanner_type, 'completed', Json(result),
+                    result.get('threat_level', 0), result.get('detection_count', 0),
+                    result.get('engine_count', 0), result.get('malicious_engines', []),
+                    result.get('scan_duration', 0), now
+                )
+                for _, file_hash, _, _, result in items
+            ], page_size=len(items), fetch=True)
+            scan_ids = [scan_id for scan_id, _ in rows]
+            
+            # 3. Угрозы и детекции всего пакета
+            self.save_detections(cursor, [
+                (scan_id, detection)
+                for scan_id, (*_, result) in zip(scan_ids, items)
+                for detection in result.get('detections', [])
+            ])
+            
+            # 4. Счетчики по дням
+            days = {}
+            for (_, started_at), (*_, result) in zip(rows, items):
+                day = days.setdefault(started_at.date(), [0, 0, 0.0])
+                day[0] += 1
+                day[1] += 1 if result.get('threat_level', 0) > 0 else 0
+                day[2] += result.get('scan_duration') or 0
+            for day, (scans, threats, total_duration) in days.items():
+                self.update_daily_stats(conn, day, scans, threats, total_duration)
+            
+            cursor.close()
         
+        return scan_ids
+    
+    def index_fuzzy_hashes(self, cursor, items):
+        """7-граммы хешей ssdeep [(file_id, ssdeep), ...] в индекс сходства (транзакция вызывающего)"""
+        rows = set()
+        for file_id, value in items:
+            try:
+                rows.update((block_size, ngram, file_id) for block_size, ngram in fuzzy_ngrams(value))
+            except ValueError:
+                continue
+        if not rows:
+            return
+        execute_values(cursor, '''
+            INSERT INTO fuzzy_ngrams (block_size, ngram, file_id)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        ''', list(rows), page_size=1000)
+    
+    def rebuild_fuzzy_index(self, batch_size=1000):
+        """Заполнить индекс сходства по files.metadata (для файлов, сохраненных до него)"""
+        indexed = 0
+        last_id = 0
+        while True:
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, metadata->>'ssdeep' FROM files
+                    WHERE id > %s AND metadata ? 'ssdeep'
+                    ORDER BY id
+                    LIMIT %s
+                ''', (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    cursor.close()
+                    return indexed
+                self.index_fuzzy_hashes(cursor, rows)
+                cursor.close()
+            indexed += len(rows)
+            last_id = rows[-1][0]
+    
+    def update_daily_stats(self, conn, day, scans=1, threats=0, total_duration=0.0):
+        """Счетчики дня: +сканы, +угрозы, скользящее среднее времени (в транзакции скана)"""
+        cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO statistics (date, total_scans, threats_found)
-            VALUES (%s, %s, %s)
+            INSERT INTO statistics (date, total_scans, clean_files, threats_found, avg_scan_time)
+            VALUES (%s, %s, %s, %s, %s)
             ON CONFLICT (date) 
             DO UPDATE SET 
-                total_scans = EXCLUDED.total_scans,
-                threats_found = EXCLUDED.threats_found,
+                total_scans = statistics.total_scans + EXCLUDED.total_scans,
+                clean_files = statistics.clean_files + EXCLUDED.clean_files,
+                threats_found = statistics.threats_found + EXCLUDED.threats_found,
+                avg_scan_time = (COALESCE(statistics.avg_scan_time, 0) * statistics.total_scans
+                                 + EXCLUDED.avg_scan_time * EXCLUDED.total_scans)
+                                / (statistics.total_scans + EXCLUDED.total_scans),
                 updated_at = CURRENT_TIMESTAMP
-        ''', (today, stats[0] or 0, stats[1] or 0))
-        
-        self.conn.commit()
+        ''', (day, scans, scans - threats, threats, total_duration / scans))
         cursor.close()
     
+    def reconcile_daily_stats(self, day):
+        """Пересчет дня с нуля по таблице scans (если есть подозрение на расхождение)"""
+        day_start = datetime.combine(day, datetime.min.time())
+        
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            
+            # Диапазон по started_at, а не DATE(started_at) - работает индекс
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as total,
+                    COUNT(*) FILTER (WHERE threat_level > 0) as threats,
+                    COALESCE(AVG(COALESCE(scan_duration, 0)), 0) as avg_time
+                FROM scans 
+                WHERE started_at >= %s AND started_at < %s
+                  AND status = 'completed'
+            ''', (day_start, day_start + timedelta(days=1)))
+            stats = cursor.fetchone()
+            
+            cursor.execute('''
+                INSERT INTO statistics (date, total_scans, clean_files, threats_found, avg_scan_time)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (date) 
+                DO UPDATE SET 
+                    total_scans = EXCLUDED.total_scans,
+                    clean_files = EXCLUDED.clean_files,
+                    threats_found = EXCLUDED.threats_found,
+                    avg_scan_time = EXCLUDED.avg_scan_time,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING date, total_scans, clean_files, threats_found, avg_scan_time
+            ''', (day, stats['total'], stats['total'] - stats['threats'], stats['threats'], stats['avg_time']))
+            row = cursor.fetchone()
+            cursor.close()
+        
+        return dict(row)
+    
+    def find_files_by_digest(self, digest, limit=50):
+        """Файлы по SHA-256, MD5, SHA-1 или точному ssdeep - по индексам, без чтения файлов"""
+        kind = digest_kind(digest)
+        if kind is None:
+            return []
+        value = digest.strip() if kind == 'ssdeep' else digest.strip().lower()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if kind == 'sha256':
+                cursor.execute('''
+                    SELECT id, original_name, file_hash, file_size, file_type, mime_type, upload_date, metadata
+                    FROM files WHERE file_hash = %s
+                ''', (value,))
+            else:
+                # Имя ключа - из digest_kind, не из запроса: выражение совпадает с индексом
+                cursor.execute(f'''
+                    SELECT id, original_name, file_hash, file_size, file_type, mime_type, upload_date, metadata
+                    FROM files WHERE metadata->>'{kind}' = %s
+                    ORDER BY upload_date DESC
+                    LIMIT %s
+                ''', (value, limit))
+            rows = cursor.fetchall()
+            cursor.close()
+        return [dict(row) for row in rows]
+    
+    def find_similar_files(self, query, min_score=50, limit=20, max_candidates=500):
+        """Файлы, похожие на хеш ssdeep (или на файл с таким SHA-256/MD5/SHA-1), по убыванию сходства
+
+        Полный перебор не нужен: кандидаты - файлы с общими 7-граммами на том же размере блока
+        (у остальных compare() все равно 0), точная оценка считается только для них.
+        """
+        query = query.strip()
+        source_hash = None
+        if digest_kind(query) != 'ssdeep':
+            files = self.find_files_by_digest(query, limit=1)
+            if not files or not files[0]['metadata'].get('ssdeep'):
+                return []
+            source_hash = files[0]['file_hash']
+            query = files[0]['metadata']['ssdeep']
+        try:
+            ngrams = fuzzy_ngrams(query)
+        except ValueError:
+            return []
+        block_sizes = [block_size for block_size, _ in ngrams]
+        values = [ngram for _, ngram in ngrams]
+        
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            # Больше общих 7-грамм - вероятнее высокая оценка: их и проверяем первыми
+            cursor.execute('''
+                SELECT n.file_id
+                FROM fuzzy_ngrams n
+                JOIN unnest(%s::bigint[], %s::bigint[]) AS q(block_size, ngram)
+                  ON n.block_size = q.block_size AND n.ngram = q.ngram
+                GROUP BY n.file_id
+                ORDER BY COUNT(*) DESC
+                LIMIT %s
+            ''', (block_sizes, values, max_candidates))
+            candidates = [row['file_id'] for row in cursor.fetchall()]
+            
+            # Плюс точные совпадения: у очень коротких хешей 7-грамм нет
+            cursor.execute('''
+                SELECT f.id, f.original_name, f.file_hash, f.file_size, f.file_type,
+                       f.metadata->>'ssdeep' AS ssdeep,
+                       s.verdict, s.threat_level, s.malicious_engines, s.started_at AS last_scan
+                FROM files f
+                LEFT JOIN LATERAL (
+                    SELECT result->>'status' AS verdict, threat_level, malicious_engines, started_at
+                    FROM scans WHERE file_id = f.id
+                    ORDER BY started_at DESC, id DESC
+                    LIMIT 1
+                ) s ON TRUE
+                WHERE f.id = ANY(%s) OR f.metadata->>'ssdeep' = %s
+            ''', (candidates, query))
+            rows = cursor.fetchall()
+            cursor.close()
+        
+        results = []
+        for row in rows:
+            if row['file_hash'] == source_hash:
+                continue
+            score = compare(query, row['ssdeep'])
+            if score >= min_score:
+                results.append(dict(row, score=score))
+        results.sort(key=lambda row: (-row['score'], row['id']))
+        return results[:limit]
+    
+    def search_threats(self, query, limit=50):
+        """Угрозы по части имени; хеш в запросе - угрозы, найденные в этом файле"""
+        file_ids = None
+        if digest_kind(query) in ('md5', 'sha1', 'sha256'):
+            file_ids = [row['id'] for row in self.find_files_by_digest(query)]
+        
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if file_ids is not None:
+                cursor.execute('''
+                    SELECT DISTINCT t.id, t.name, t.type, t.severity, t.detection_count,
+                           t.first_seen, t.last_seen
+                    FROM threats t
+                    JOIN detections d ON d.threat_id = t.id
+                    JOIN scans s ON s.id = d.scan_id
+                    WHERE s.file_id = ANY(%s)
+                    ORDER BY t.detection_count DESC
+                    LIMIT %s
+                ''', (file_ids, limit))
+            else:
+                cursor.execute('''
+                    SELECT id, name, type, severity, detection_count, first_seen, last_seen
+                    FROM threats
+                    WHERE name ILIKE %s
+                    ORDER BY detection_count DESC
+                    LIMIT %s
+                ''', (f'%{query}%', limit))
+            threats = cursor.fetchall()
+            cursor.close()
+        return threats
+    
+    def get_system_settings(self):
+        """Все настройки system_settings с приведением типов"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, value, data_type FROM system_settings')
+            rows = cursor.fetchall()
+            cursor.close()
+        return {key: parse_setting(value, data_type) for key, value, data_type in rows}
+    
     def get_dashboard_stats(self):
         """Получение статистики для дашборда"""
-        cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Общая статистика
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_scans,
-                COUNT(DISTINCT file_hash) as unique_files,
-                COUNT(DISTINCT uploader_id) as active_users,
-                COALESCE(SUM(file_size), 0) as total_data_size
-            FROM files
-        ''')
-        general_stats = cursor.fetchone()
-        
-        # Статистика по угрозам
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_threats,
-                AVG(severity) as avg_severity,
-                MAX(severity) as max_severity
-            FROM threats
-        ''')
-        threat_stats = cursor.fetchone()
-        
-        # Статистика за последние 7 дней
-        cursor.execute('''
-            SELECT 
-                date,
-                total_scans,
-                threats_found,
-                ROUND(CAST(threats_found AS DECIMAL) / NULLIF(total_scans, 0) * 100, 2) as threat_percentage
-            FROM statistics 
-            WHERE date >= CURRENT_DATE - INTERVAL '7 days'
-            ORDER BY date
-        ''')
-        weekly_stats = cursor.fetchall()
-        
-        # Топ угроз
-        cursor.execute('''
-            SELECT 
-                name,
-                severity,
-                detection_count,
-                last_seen
-            FROM threats 
-            ORDER BY detection_count DESC 
-            LIMIT 10
-        ''')
-        top_threats = cursor.fetchall()
+            # Общая статистика
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as total_scans,
+                    COUNT(*) as unique_files,  -- file_hash уникален, DISTINCT не нужен
+                    COUNT(DISTINCT uploader_id) as active_users,
+                    COALESCE(SUM(file_size), 0) as total_data_size
+                FROM files
+            ''')
+            general_stats = cursor.fetchone()
         
-        cursor.close()
+            # Статистика по угрозам
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as total_threats,
+                    AVG(severity) as avg_severity,
+                    MAX(severity) as max_severity
+                FROM threats
+            ''')
+            threat_stats = cursor.fetchone()
+        
+            # Статистика за последние 7 дней
+            cursor.execute('''
+                SELECT 
+                    date,
+                    total_scans,
+                    threats_found,
+                    ROUND(CAST(threats_found AS DECIMAL) / NULLIF(total_scans, 0) * 100, 2) as threat_percentage
+                FROM statistics 
+                WHERE date >= CURRENT_DATE - INTERVAL '7 days'
+                ORDER BY date
+            ''')
+            weekly_stats = cursor.fetchall()
+        
+            # Топ угроз
+            cursor.execute('''
+                SELECT 
+                    name,
+                    severity,
+                    detection_count,
+                    last_seen
+                FROM threats 
+                ORDER BY detection_count DESC 
+                LIMIT 10
+            ''')
+            top_threats = cursor.fetchall()
+        
+            cursor.close()
+        
+            return {
+                'general': dict(general_stats),
+                'threats': dict(threat_stats),
+                'weekly': weekly_stats,
+                'top_threats': top_threats,
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def get_user_stats(self):
+        """Активность пользователей для админ-панели"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute('''
+                SELECT username, role, files_uploaded, scans_performed,
+                       last_scan, total_upload_size
+                FROM user_activity_view
+            ''')
+            users = cursor.fetchall()
+            cursor.close()
+        
+        return users
+    
+    def get_scan_history(self, limit=50, cursor=None, filters=None):
+        """История сканирований: keyset-пагинация по (started_at, id)"""
+        query = ScanHistoryQuery(filters, cursor)
+        sql, params = query.build(limit + 1)  # +1 строка - узнать, есть ли следующая страница
+        
+        with self.pool.connection() as conn:
+            db_cursor = conn.cursor(cursor_factory=RealDictCursor)
+            db_cursor.execute(sql, params)
+            scans = db_cursor.fetchall()
+            db_cursor.close()
+        
+        has_more = len(scans) > limit
+        scans = scans[:limit]
+        next_cursor = None
+        if has_more:
+            last = scans[-1]
+            next_cursor = ScanHistoryQuery.encode_cursor(last['started_at'], last['id'])
         
         return {
-            'general': dict(general_stats),
-            'threats': dict(threat_stats),
-            'weekly': weekly_stats,
-            'top_threats': top_threats,
-            'timestamp': datetime.now().isoformat()
+            'scans': scans,
+            'count': len(scans),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': has_more
         }
+
+
+class ScanHistoryQuery:
+    """Сборщик запроса истории: только индексируемые условия по scans"""
     
-    def get_scan_history(self, limit=50, offset=0, filters=None):
-        """Получение истории сканирований с фильтрами"""
-        cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+    def __init__(self, filters=None, cursor=None):
+        self.conditions = []
+        self.params = []
+        
+        filters = filters or {}
+        if filters.get('threat_level'):
+            self.where("s.threat_level >= %s", int(filters['threat_level']))
+        if filters.get('status'):
+            self.where("s.status = %s", filters['status'])
+        if filters.get('date_from'):
+            # Диапазон вместо DATE(started_at) - условие остается sargable
+            self.where("s.started_at >= %s", self.day_start(filters['date_from']))
+        if filters.get('date_to'):
+            self.where("s.started_at < %s", self.day_start(filters['date_to']) + timedelta(days=1))
+        if filters.get('file_hash'):
+            self.where("f.file_hash = %s", filters['file_hash'])
+        if filters.get('query'):
+            self.where("(f.original_name ILIKE %s OR f.file_hash = %s)",
+                       f"%{filters['query']}%", filters['query'])
         
-        query = '''
+        if cursor:
+            started_at, scan_id = self.decode_cursor(cursor)
+            self.where("(s.started_at, s.id) < (%s, %s)", started_at, scan_id)
+    
+    def where(self, condition, *params):
+        self.conditions.append(condition)
+        self.params.extend(params)
+    
+    @staticmethod
+    def day_start(value):
+        if isinstance(value, str):
+            value = datetime.strptime(value[:10], '%Y-%m-%d')
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.min.time())
+        return value
+    
+    @staticmethod
+    def encode_cursor(started_at, scan_id):
+        raw = f"{started_at.isoformat()}|{scan_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            started_at, scan_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(started_at), int(scan_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('Неверный курсор пагинации')
+    
+    def build(self, limit):
+        """Сначала страница scans по индексу, потом детекции только для нее"""
+        where = ("WHERE " + " AND ".join(self.conditions)) if self.conditions else ""
+        sql = f'''
             SELECT 
-                s.id,
-                f.original_name as filename,
-                f.file_hash,
-                f.file_size,
-                s.scanner_type,
-                s.status,
-                s.threat_level,
-                s.detection_count,
-                s.engine_count,
-                s.started_at,
-                s.completed_at,
-                s.scan_duration,
+                page.id,
+                page.filename,
+                page.file_hash,
+                page.file_size,
+                page.scanner_type,
+                page.status,
+                page.threat_level,
+                page.detection_count,
+                page.engine_count,
+                page.started_at,
+                page.completed_at,
+                page.scan_duration,
                 u.username as uploader,
-                ARRAY_AGG(DISTINCT d.detection_name) as detections
-            FROM scans s
-            JOIN files f ON s.file_id = f.id
-            LEFT JOIN users u ON f.uploader_id = u.id
-            LEFT JOIN detections d ON s.id = d.scan_id
+                COALESCE(det.detections, '{{}}') as detections
+            FROM (
+                SELECT s.id, s.scanner_type, s.status, s.threat_level, s.detection_count,
+                       s.engine_count, s.started_at, s.completed_at, s.scan_duration,
+                       f.original_name as filename, f.file_hash, f.file_size, f.uploader_id
+                FROM scans s
+                JOIN files f ON s.file_id = f.id
+                {where}
+                ORDER BY s.started_at DESC, s.id DESC
+                LIMIT %s
+            ) page
+            LEFT JOIN users u ON page.uploader_id = u.id
+            LEFT JOIN LATERAL (
+                SELECT ARRAY_AGG(DISTINCT d.detection_name) as detections
+                FROM detections d
+                WHERE d.scan_id = page.id AND d.detection_name IS NOT NULL
+            ) det ON TRUE
+            ORDER BY page.started_at DESC, page.id DESC
         '''
-        
-        conditions = []
-        params = []
-        
-        if filters:
-            if filters.get('threat_level'):
-                conditions.append("s.threat_level >= %s")
-                params.append(filters['threat_level'])
-            if filters.get('date_from'):
-                conditions.append("DATE(s.started_at) >= %s")
-                params.append(filters['date_from'])
-   
\ No newline at end of file
+        return sql, self.params + [limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обслуживание расширенной БД')
+    parser.add_argument('--rebuild-fuzzy-index', action='store_true',
+                        help='заполнить индекс сходства ssdeep по files.metadata')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--database', default='xxx')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.getenv('PGPASSWORD', 'xxx'))
+    args = parser.parse_args()
+
+    db = AdvancedDatabase(host=args.host, port=args.port, database=args.database,
+                          user=args.user, password=args.password, pool_min=1, pool_max=1)
+    if not db.pool:
+        sys.exit('❌ Нет подключения к PostgreSQL')
+    try:
+        if args.rebuild_fuzzy_index:
+            indexed = db.rebuild_fuzzy_index(args.batch_size)
+            print(f"✅ Индекс сходства: обработано файлов с ssdeep: {indexed}")
+    finally:
+        db.pool.closeall()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+# db_pool.py - ПОТОКОБЕЗОПАСНЫЙ ПУЛ СОЕДИНЕНИЙ POSTGRESQL
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+
+class PoolTimeoutError(Exception):
+    """Не дождались свободного соединения"""
+
+
+class ConnectionPool:
+    """Пул с min/max размером, проверкой соединения при выдаче и переподключением"""
+
+    def __init__(self, minconn=1, maxconn=10, timeout=30, autocommit=False,
+                 ping_after=5, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.autocommit = autocommit
+        # Соединения, пролежавшие дольше ping_after секунд, проверяем SELECT 1
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()  # (conn, время возврата)
+        self._size = 0        # открытые + открываемые соединения
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.autocommit = self.autocommit
+        return conn
+
+    def _is_alive(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            if not self.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        """Берем соединение из пула (ждем не дольше timeout секунд)"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError('Пул соединений закрыт')
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Резервируем место, а подключаемся уже без блокировки
+                    self._size += 1
+                    conn, idle_since = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f'Нет свободных соединений за {timeout} с (макс {self.maxconn})')
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_alive(conn, idle_since):
+                self._discard(conn)
+                conn = self._connect()
+                self._reconnects += 1
+                print("🔄 Соединение с PostgreSQL восстановлено")
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        wait_time = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Возвращаем соединение; сломанные закрываем и освобождаем место"""
+        if not discard and not conn.closed and not self.autocommit:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ... - соединение вернется в пул"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            if not self.autocommit and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    @contextmanager
+    def transaction(self):
+        """Одна транзакция: COMMIT при успехе, ROLLBACK при ошибке"""
+        with self.connection() as conn:
+            autocommit = conn.autocommit
+            conn.autocommit = False
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not conn.closed:
+                    conn.autocommit = autocommit
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Метрики пула: ожидание и загрузка"""
+        with self._cond:
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'utilization': round(self._in_use / self.maxconn, 4) if self.maxconn else 0.0,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'avg_wait_ms': round(self._wait_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._wait_time_max * 1000, 3)
+            }
+
+    def close_idle(self):
+        """Закрываем свободные соединения, пул остается рабочим (новые откроются по требованию)
+
+        Нужно перед fork: сокет, унаследованный несколькими процессами, ломает сессию всем.
+        """
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
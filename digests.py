@@ -0,0 +1,300 @@
+# digests.py - ВСЕ ДАЙДЖЕСТЫ ЗА ОДИН ПРОХОД: MD5, SHA-1 И НЕЧЕТКИЙ ХЕШ ssdeep (CTPH)
+import hashlib
+import os
+
+try:
+    import ssdeep  # python-ssdeep поверх libfuzzy: в десятки раз быстрее своей реализации
+except ImportError:
+    ssdeep = None
+
+FUZZY = 'ssdeep'
+# SHA-256 конвейер считает всегда; здесь - дополнительные дайджесты
+DIGESTS = [name.strip().lower() for name in os.getenv('DIGESTS', 'md5,sha1,ssdeep').split(',')
+           if name.strip()]
+# Своя реализация CTPH - байтовый цикл на Python (~2 МБ/с): большие файлы без нечеткого хеша
+FUZZY_MAX_SIZE = int(os.getenv('FUZZY_MAX_SIZE', 1 << 62 if ssdeep else 2 * 1024 * 1024))
+
+# Параметры ssdeep 2.x - хеши совместимы с утилитой ssdeep и фидами угроз
+ROLLING_WINDOW = 7
+MIN_BLOCKSIZE = 3
+SPAMSUM_LENGTH = 64
+NUM_BLOCKHASHES = 31
+HASH_INIT = 0x27  # младшие 6 бит 0x28021967: в дайджест попадают только они
+B64 = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+B64_INDEX = {c: i for i, c in enumerate(B64)}
+MASK = 0xFFFFFFFF
+
+# FNV по модулю 64: SUM_TABLE[h][c] = (h * 0x01000193 ^ c) & 63
+SUM_TABLE = [[(h * 0x93 ^ c) & 63 for c in range(256)] for h in range(64)]
+# Тот же шаг для всех 64 состояний сразу (bytes.translate): когда состояний много
+STEP_TABLES = [bytes(SUM_TABLE[h][c] for h in range(64)) + bytes(192) for c in range(256)]
+IDENTITY = bytes(range(64))
+
+
+class FuzzyHash:
+    """Потоковый CTPH по алгоритму ssdeep 2.x: все размеры блока считаются одновременно,
+    поэтому размер файла заранее знать не нужно и данные читаются один раз"""
+
+    def __init__(self):
+        self.size = 0
+        self.bhstart = 0
+        self.bhend = 1
+        self.h = [HASH_INIT] * NUM_BLOCKHASHES
+        self.halfh = [HASH_INIT] * NUM_BLOCKHASHES
+        self.digests = [[] for _ in range(NUM_BLOCKHASHES)]
+        # Скользящий хеш по окну из 7 байт; окно - хвост предыдущего чанка
+        self.h1 = self.h2 = self.h3 = 0
+        self.tail = bytes(ROLLING_WINDOW)
+
+    def update(self, data):
+        buf = self.tail + bytes(data)
+        h1, h2, h3 = self.h1, self.h2, self.h3
+        # Размер после байта buf[pos] - base + pos
+        base = self.size - ROLLING_WINDOW + 1
+        blocksize = MIN_BLOCKSIZE << self.bhstart
+        trigger = blocksize - 1
+        folded = ROLLING_WINDOW
+
+        for pos, (old, c) in enumerate(zip(buf, memoryview(buf)[ROLLING_WINDOW:]), ROLLING_WINDOW):
+            h2 += ROLLING_WINDOW * c - h1
+            h1 += c - old
+            h3 = ((h3 << 5) ^ c) & MASK
+            if ((h1 + h2 + h3) & MASK) % blocksize == trigger:
+                # Кусочные хеши досчитываем только в точках срабатывания
+                self._fold(buf, folded, pos + 1)
+                folded = pos + 1
+                self.size = base + pos
+                self._trigger((h1 + h2 + h3) & MASK)
+                blocksize = MIN_BLOCKSIZE << self.bhstart
+                trigger = blocksize - 1
+
+        self._fold(buf, folded, len(buf))
+        self.size = base + len(buf) - 1
+        self.h1, self.h2, self.h3 = h1, h2, h3
+        self.tail = buf[-ROLLING_WINDOW:]
+
+    def _fold(self, buf, start, end):
+        """FNV всех активных блочных хешей по байтам buf[start:end]"""
+        if start >= end:
+            return
+        chunk = memoryview(buf)[start:end]
+        active = range(self.bhstart, self.bhend)
+        states = {self.h[i] for i in active} | {self.halfh[i] for i in active}
+        if len(states) <= 2:
+            folded = {}
+            for initial in states:
+                state = initial
+                for c in chunk:
+                    state = SUM_TABLE[state][c]
+                folded[initial] = state
+        else:
+            # Много разных состояний - ведем отображение всех 64 сразу
+            mapping = IDENTITY
+            for c in chunk:
+                mapping = mapping.translate(STEP_TABLES[c])
+            folded = {state: mapping[state] for state in states}
+        for i in active:
+            self.h[i] = folded[self.h[i]]
+            self.halfh[i] = folded[self.halfh[i]]
+
+    def _trigger(self, rolling):
+        i = self.bhstart
+        while i < self.bhend:
+            blocksize = MIN_BLOCKSIZE << i
+            if rolling % blocksize != blocksize - 1:
+                break
+            digest = self.digests[i]
+            if not digest:
+                self._fork()
+            if len(digest) < SPAMSUM_LENGTH - 1:
+                digest.append(B64[self.h[i]])
+                self.h[i] = HASH_INIT
+                if len(digest) < SPAMSUM_LENGTH // 2:
+                    self.halfh[i] = HASH_INIT
+            else:
+                self._reduce()
+            i += 1
+
+    def _fork(self):
+        """Следующий (вдвое больший) размер блока начинает со состояния текущего"""
+        if self.bhend < NUM_BLOCKHASHES:
+            self.h[self.bhend] = self.h[self.bhend - 1]
+            self.halfh[self.bhend] = self.halfh[self.bhend - 1]
+            self.digests[self.bhend] = []
+            self.bhend += 1
+
+    def _reduce(self):
+        """Самый мелкий размер блока больше не понадобится - перестаем его вести"""
+        if self.bhend - self.bhstart < 2:
+            return
+        if (MIN_BLOCKSIZE << self.bhstart) * SPAMSUM_LENGTH >= self.size:
+            return
+        if len(self.digests[self.bhstart + 1]) < SPAMSUM_LENGTH // 2:
+            return
+        self.bhstart += 1
+
+    def digest(self):
+        """'размер_блока:дайджест:дайджест_двойного_блока', как у ssdeep"""
+        rolling = (self.h1 + self.h2 + self.h3) & MASK
+        i = self.bhstart
+        while (MIN_BLOCKSIZE << i) * SPAMSUM_LENGTH < self.size:
+            i += 1
+        i = min(i, self.bhend - 1)
+        while i > self.bhstart and len(self.digests[i]) < SPAMSUM_LENGTH // 2:
+            i -= 1
+
+        first = ''.join(self.digests[i])
+        if rolling:
+            first += B64[self.h[i]]
+        if i < self.bhend - 1:
+            second = ''.join(self.digests[i + 1][:SPAMSUM_LENGTH // 2 - 1])
+            if rolling:
+                second += B64[self.halfh[i + 1]]
+        else:
+            second = B64[self.h[i]] if rolling else ''
+        return f'{MIN_BLOCKSIZE << i}:{first}:{second}'
+
+
+def new_fuzzy():
+    return ssdeep.Hash() if ssdeep is not None else FuzzyHash()
+
+
+def fuzzy_hash(data):
+    fuzzy = new_fuzzy()
+    fuzzy.update(data)
+    return fuzzy.digest()
+
+
+class Digests:
+    """Приемник для ScanPipeline: MD5, SHA-1 и нечеткий хеш за тот же проход, что и SHA-256"""
+
+    def __init__(self, algorithms=None, size_hint=None):
+        algorithms = DIGESTS if algorithms is None else algorithms
+        self.size = 0
+        # usedforsecurity=False: MD5/SHA-1 здесь - ключи поиска, а не защита
+        self.hashes = {
+            name: hashlib.new(name, usedforsecurity=False)
+            for name in algorithms if name != FUZZY
+        }
+        self.fuzzy = None
+        # Размер известен заранее и больше лимита - даже не начинаем
+        if FUZZY in algorithms and (size_hint is None or size_hint <= FUZZY_MAX_SIZE):
+            self.fuzzy = new_fuzzy()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        for digest in self.hashes.values():
+            digest.update(chunk)
+        if self.fuzzy is not None:
+            if self.size > FUZZY_MAX_SIZE:
+                self.fuzzy = None
+            else:
+                self.fuzzy.update(chunk)
+
+    def hexdigests(self):
+        result = {name: digest.hexdigest() for name, digest in self.hashes.items()}
+        if self.fuzzy is not None:
+            result[FUZZY] = self.fuzzy.digest()
+        return result
+
+
+def digest_kind(value):
+    """По виду строки: 'md5', 'sha1', 'sha256', 'ssdeep' или None"""
+    value = value.strip().lower()
+    if value.count(':') == 2 and value.split(':', 1)[0].isdigit():
+        return FUZZY
+    if all(c in '0123456789abcdef' for c in value):
+        return {32: 'md5', 40: 'sha1', 64: 'sha256'}.get(len(value))
+    return None
+
+
+# ========== СРАВНЕНИЕ НЕЧЕТКИХ ХЕШЕЙ (fuzzy_compare из ssdeep) ==========
+
+def _eliminate_sequences(text):
+    """Серии длиннее 3 одинаковых символов укорачиваем до 3 - как ssdeep перед сравнением"""
+    result = text[:3]
+    for i in range(3, len(text)):
+        if not (text[i] == text[i - 1] == text[i - 2] == text[i - 3]):
+            result += text[i]
+    return result
+
+
+def _has_common_substring(a, b):
+    """Без общей подстроки длины окна сходство не засчитывается"""
+    if len(a) < ROLLING_WINDOW or len(b) < ROLLING_WINDOW:
+        return False
+    grams = {a[i:i + ROLLING_WINDOW] for i in range(len(a) - ROLLING_WINDOW + 1)}
+    return any(b[i:i + ROLLING_WINDOW] in grams for i in range(len(b) - ROLLING_WINDOW + 1))
+
+
+def _edit_distance(a, b):
+    """Вставка и удаление - 1, замена - 2"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (0 if ca == cb else 2)))
+        previous = current
+    return previous[-1]
+
+
+def _score_strings(a, b, blocksize):
+    if not _has_common_substring(a, b):
+        return 0
+    score = _edit_distance(a, b) * SPAMSUM_LENGTH // (len(a) + len(b))
+    score = 100 * score // SPAMSUM_LENGTH
+    if score >= 100:
+        return 0
+    score = 100 - score
+    # На маленьких блоках короткие дайджесты совпадают случайно - ограничиваем оценку
+    if blocksize >= (99 + ROLLING_WINDOW) // ROLLING_WINDOW * MIN_BLOCKSIZE:
+        return score
+    return min(score, blocksize // MIN_BLOCKSIZE * min(len(a), len(b)))
+
+
+def parse_fuzzy(value):
+    """'bs:d1:d2' -> (bs, d1, d2) с укороченными сериями; ValueError, если это не ssdeep"""
+    blocksize, first, second = value.split(':', 2)
+    blocksize = int(blocksize)
+    if blocksize < MIN_BLOCKSIZE:
+        raise ValueError(f'Некорректный размер блока: {blocksize}')
+    second = second.split(',', 1)[0]  # у утилиты ssdeep дальше идет ,"имя файла"
+    if any(c not in B64_INDEX for c in first + second):
+        raise ValueError('Недопустимые символы в хеше ssdeep')
+    return blocksize, _eliminate_sequences(first), _eliminate_sequences(second)
+
+
+def fuzzy_ngrams(value):
+    """{(размер блока, 7-грамма)} обеих частей хеша
+
+    compare() дает 0 хешам без общей подстроки из 7 символов на одном размере блока,
+    поэтому кандидатов в похожие можно искать индексом по 7-граммам, не сравнивая со всеми.
+    7 символов base64 - 42 бита, влезают в BIGINT.
+    """
+    blocksize, first, second = parse_fuzzy(value)
+    ngrams = set()
+    for size, part in ((blocksize, first), (blocksize * 2, second)):
+        for i in range(len(part) - ROLLING_WINDOW + 1):
+            ngram = 0
+            for c in part[i:i + ROLLING_WINDOW]:
+                ngram = ngram << 6 | B64_INDEX[c]
+            ngrams.add((size, ngram))
+    return ngrams
+
+
+def compare(a, b):
+    """Сходство двух хешей ssdeep, 0-100"""
+    if ssdeep is not None:
+        return ssdeep.compare(a, b)
+    bs1, a1, a2 = parse_fuzzy(a)
+    bs2, b1, b2 = parse_fuzzy(b)
+    if bs1 not in (bs2, bs2 * 2) and bs2 != bs1 * 2:
+        return 0
+    if bs1 == bs2:
+        if a1 == b1 and a2 == b2:
+            return 100
+        return max(_score_strings(a1, b1, bs1), _score_strings(a2, b2, bs1 * 2))
+    if bs1 == bs2 * 2:
+        return _score_strings(a1, b2, bs1)
+    return _score_strings(a2, b1, bs2)
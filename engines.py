@@ -0,0 +1,289 @@
+# engines.py - РЕЕСТР ДВИЖКОВ СКАНИРОВАНИЯ И ИХ ПАРАЛЛЕЛЬНЫЙ ЗАПУСК
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ENGINE_OK = 'ok'
+ENGINE_TIMEOUT = 'timeout'
+ENGINE_ERROR = 'error'
+ENGINE_SKIPPED = 'skipped'  # не запускали: вердикт уже окончательный
+ENGINE_DISABLED = 'disabled'  # выключен в system_settings
+ENGINE_NOT_APPLICABLE = 'not_applicable'  # не берется за файлы такого типа
+
+# Цена движка: дешевые идут первыми и могут избавить от дорогих
+COST_CPU = 'cpu'
+COST_IO = 'io'
+COST_NETWORK = 'network'
+COST_ORDER = {COST_CPU: 0, COST_IO: 1, COST_NETWORK: 2}
+
+# Что движку нужно на входе
+NEEDS_HASH = 'hash'      # достаточно SHA-256 (можно проверить и без загрузки)
+NEEDS_STREAM = 'stream'  # данные во время единственного чтения загрузки
+NEEDS_FILE = 'file'      # файл целиком на диске
+
+
+class ScanContext:
+    """Что уже известно о файле после чтения: хеш, имя, размер, совпадения сигнатур"""
+
+    def __init__(self, file_hash, filename, size=0, matches=None, clamd_stream=None,
+                 path=None, streamed=True, file_type=None):
+        self.file_hash = file_hash
+        self.filename = filename
+        self.size = size
+        # Тип по magic bytes (filetype.sniff); None - не определяли
+        self.file_type = file_type
+        self.matches = matches or []
+        # INSTREAM, в который конвейер уже отправил данные (если clamd настроен)
+        self.clamd_stream = clamd_stream
+        self.path = path
+        self.inputs = {NEEDS_HASH}
+        if streamed:
+            self.inputs.add(NEEDS_STREAM)
+        if path:
+            self.inputs.add(NEEDS_FILE)
+
+
+class Engine:
+    """Движок: check(context) возвращает вердикт {'detected': bool, ...}"""
+    name = None
+    cost = COST_CPU
+    needs = NEEDS_HASH
+    timeout = None  # свой таймаут, секунд (не больше общего scan_timeout)
+    skip_types = frozenset()  # типы файлов (filetype), для которых движок не запускаем
+
+    @property
+    def setting(self):
+        """Ключ system_settings, которым движок включается и выключается"""
+        return f'{self.name}_enabled'
+
+    def check(self, context):
+        raise NotImplementedError
+
+    def is_definitive(self, result):
+        """Вердикт, после которого остальные движки уже ничего не изменят"""
+        return bool(result.get('detected'))
+
+
+class BuiltinSignaturesEngine(Engine):
+    """Встроенные сигнатуры: совпадения уже найдены конвейером при чтении"""
+    name = 'signatures'
+    cost = COST_CPU
+    needs = NEEDS_STREAM
+
+    def check(self, context):
+        matches = context.matches
+        return {
+            'detected': bool(matches),
+            'result': matches[0]['name'] if matches else 'OK',
+            'source': 'signatures',
+            'matches': matches
+        }
+
+
+class VirusTotalEngine(Engine):
+    name = 'virustotal'
+    cost = COST_NETWORK
+    needs = NEEDS_HASH
+    # Одно-два срабатывания из ~70 бывают ложными - не повод отменять остальные движки
+    definitive_detections = 3
+
+    # По умолчанию проверяем все типы: тип угадан по первым байтам, а "картинка" или "текст"
+    # бывают полиглотами. Сберечь квоту - virustotal_skip_types в system_settings
+    # (например, 'text,image,empty' - filetype.INERT_TYPES)
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+
+    def check(self, context):
+        return self.scanner.check_virustotal(context.file_hash, context.filename, context.file_type)
+
+    def is_definitive(self, result):
+        return result.get('detections', 0) >= self.definitive_detections
+
+
+class ClamAVEngine(Engine):
+    name = 'clamav'
+    cost = COST_IO
+    needs = NEEDS_STREAM
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+
+    def check(self, context):
+        return self.scanner.check_clamav(context.filename, context.matches, context.clamd_stream,
+                                         context.file_type)
+
+
+class EngineRegistry:
+    """Какие движки есть и какие из них включены в system_settings прямо сейчас"""
+
+    def __init__(self, settings=None):
+        self.settings = settings
+        self._engines = {}
+
+    def register(self, engine):
+        self._engines[engine.name] = engine
+        return engine
+
+    def get(self, name):
+        return self._engines.get(name)
+
+    def is_enabled(self, name):
+        engine = self._engines.get(name)
+        if engine is None:
+            return False
+        if self.settings is None:
+            return True
+        # SettingsCache перечитывает таблицу по TTL - перезапуск не нужен
+        return bool(self.settings.get(engine.setting, True))
+
+    def timeout_for(self, engine, default):
+        if self.settings is None:
+            return engine.timeout or default
+        return self.settings.get(f'{engine.name}_timeout', engine.timeout) or default
+
+    def skip_types_for(self, engine):
+        """Типы, которые движок пропускает; '<имя>_skip_types' в system_settings - через запятую"""
+        if self.settings is not None:
+            value = self.settings.get(f'{engine.name}_skip_types')
+            if value is not None:
+                return frozenset(kind.strip() for kind in str(value).split(',') if kind.strip())
+        return engine.skip_types
+
+    def applies_to(self, engine, file_type):
+        return file_type is None or file_type not in self.skip_types_for(engine)
+
+    def plan(self, context):
+        """Включенные движки, которым хватает входных данных и подходит тип, от дешевых к дорогим"""
+        engines = [
+            engine for name, engine in self._engines.items()
+            if self.is_enabled(name) and engine.needs in context.inputs
+            and self.applies_to(engine, context.file_type)
+        ]
+        return sorted(engines, key=lambda engine: COST_ORDER[engine.cost])
+
+    def describe(self):
+        return [
+            {
+                'name': engine.name,
+                'cost': engine.cost,
+                'needs': engine.needs,
+                'timeout': engine.timeout,
+                'skip_types': sorted(self.skip_types_for(engine)),
+                'enabled': self.is_enabled(engine.name)
+            }
+            for engine in self._engines.values()
+        ]
+
+    def scan(self, context, runner, timeout):
+        """Сначала дешевые (CPU) движки; окончательный вердикт отменяет дорогие"""
+        engines = self.plan(context)
+        cheap = [engine for engine in engines if engine.cost == COST_CPU]
+        expensive = [engine for engine in engines if engine.cost != COST_CPU]
+
+        results = {}
+        statuses = {name: ENGINE_DISABLED for name in self._engines if not self.is_enabled(name)}
+        for name, engine in self._engines.items():
+            if name not in statuses and not self.applies_to(engine, context.file_type):
+                statuses[name] = ENGINE_NOT_APPLICABLE
+        definitive = False
+        for engine in cheap:
+            try:
+                results[engine.name] = engine.check(context)
+                statuses[engine.name] = ENGINE_OK
+            except Exception as e:
+                traceback.print_exc()
+                results[engine.name] = {'detected': False, 'error': str(e)}
+                statuses[engine.name] = ENGINE_ERROR
+                continue
+            if engine.is_definitive(results[engine.name]):
+                definitive = True
+                break
+
+        if definitive:
+            skipped = expensive
+        else:
+            def stop_when(name, result):
+                return self._engines[name].is_definitive(result)
+
+            timeouts = {engine.name: self.timeout_for(engine, timeout) for engine in expensive}
+            more_results, more_statuses = runner.run(expensive, context, timeout,
+                                                     timeouts=timeouts, stop_when=stop_when)
+            results.update(more_results)
+            statuses.update(more_statuses)
+            skipped = [engine for engine in expensive if engine.name not in statuses]
+
+        for engine in skipped:
+            results[engine.name] = {'detected': False, 'skipped': True}
+            statuses[engine.name] = ENGINE_SKIPPED
+        return results, statuses
+
+
+class EngineRunner:
+    """Запускает движки одновременно; зависший движок не держит весь скан"""
+
+    def __init__(self, workers=8):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-engine')
+
+    def run(self, engines, context, timeout, timeouts=None, on_result=None, stop_when=None):
+        """{имя: вердикт} и {имя: ok/timeout/error}
+
+        on_result(имя, вердикт) вызывается по мере готовности; если stop_when(имя, вердикт)
+        вернул True, остальные движки больше не ждем (в ответе их нет).
+        """
+        started = time.monotonic()
+        timeouts = timeouts or {}
+        pending = {}
+        for engine in engines:
+            engine_timeout = min(timeouts.get(engine.name) or engine.timeout or timeout, timeout)
+            future = self._executor.submit(engine.check, context)
+            pending[future] = (engine, started + engine_timeout)
+
+        results = {}
+        statuses = {}
+        while pending:
+            nearest = min(deadline for _, deadline in pending.values())
+            done, _ = wait(pending, timeout=max(0, nearest - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+
+            stop = False
+            for future in done:
+                engine, _ = pending.pop(future)
+                try:
+                    results[engine.name] = future.result()
+                    statuses[engine.name] = ENGINE_OK
+                except Exception as e:
+                    traceback.print_exc()
+                    results[engine.name] = {'detected': False, 'error': str(e)}
+                    statuses[engine.name] = ENGINE_ERROR
+                if on_result is not None:
+                    on_result(engine.name, results[engine.name])
+                if (stop_when is not None and statuses[engine.name] == ENGINE_OK
+                        and stop_when(engine.name, results[engine.name])):
+                    stop = True
+
+            if stop:
+                # Недоделанные движки доработают в фоне, их результат не нужен
+                for future in pending:
+                    future.cancel()
+                break
+
+            # Просроченные движки помечаем и больше не ждем (поток доработает в фоне)
+            now = time.monotonic()
+            for future, (engine, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[future]
+                    future.cancel()
+                    waited = round(deadline - started, 3)
+                    print(f"⏱️ Движок {engine.name} не ответил за {waited} с")
+                    results[engine.name] = {'detected': False, 'timed_out': True,
+                                            'error': f'Таймаут {waited} с'}
+                    statuses[engine.name] = ENGINE_TIMEOUT
+                    if on_result is not None:
+                        on_result(engine.name, results[engine.name])
+
+        return results, statuses
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,171 @@
+# filetype.py - ТИП ФАЙЛА ПО СИГНАТУРЕ (MAGIC BYTES), А НЕ ПО РАСШИРЕНИЮ
+import re
+import struct
+
+SNIFF_SIZE = 8 * 1024  # хватает на заголовки PE/ELF/Mach-O, первые записи ZIP и tar
+
+# Группы типов - по ним движки решают, стоит ли за файл браться
+EXECUTABLE_TYPES = frozenset({'pe', 'elf', 'macho', 'java'})
+DOCUMENT_TYPES = frozenset({'pdf', 'ole', 'ooxml', 'odf', 'rtf'})
+ARCHIVE_TYPES = frozenset({'zip', 'jar', 'apk', 'gzip', 'bzip2', 'xz', '7z', 'rar', 'tar', 'cab'})
+SCRIPT_TYPES = frozenset({'script', 'html'})
+INERT_TYPES = frozenset({'text', 'image', 'empty'})  # без исполняемого содержимого
+# То, что стоит проверять внимательнее всего (в демо-режиме ClamAV - вместо списка расширений)
+SUSPICIOUS_TYPES = EXECUTABLE_TYPES | SCRIPT_TYPES | frozenset({'ole', 'rtf', 'jar', 'apk'})
+
+MIME_TYPES = {
+    'pe': 'application/vnd.microsoft.portable-executable',
+    'elf': 'application/x-executable',
+    'macho': 'application/x-mach-binary',
+    'java': 'application/java-vm',
+    'pdf': 'application/pdf',
+    'ole': 'application/x-ole-storage',
+    'ooxml': 'application/vnd.openxmlformats-officedocument',
+    'odf': 'application/vnd.oasis.opendocument',
+    'rtf': 'application/rtf',
+    'zip': 'application/zip',
+    'jar': 'application/java-archive',
+    'apk': 'application/vnd.android.package-archive',
+    'gzip': 'application/gzip',
+    'bzip2': 'application/x-bzip2',
+    'xz': 'application/x-xz',
+    '7z': 'application/x-7z-compressed',
+    'rar': 'application/vnd.rar',
+    'tar': 'application/x-tar',
+    'cab': 'application/vnd.ms-cab-compressed',
+    'script': 'text/x-script',
+    'html': 'text/html',
+    'text': 'text/plain',
+    'empty': 'application/x-empty',
+    'binary': 'application/octet-stream'
+}
+
+# (смещение, сигнатура, тип) - проверяются по порядку
+MAGIC = [
+    (0, b'\x7fELF', 'elf'),
+    (0, b'\xfe\xed\xfa\xce', 'macho'),
+    (0, b'\xce\xfa\xed\xfe', 'macho'),
+    (0, b'\xfe\xed\xfa\xcf', 'macho'),
+    (0, b'\xcf\xfa\xed\xfe', 'macho'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),  # doc/xls/ppt/msi
+    (0, b'{\\rtf', 'rtf'),
+    (0, b'\x1f\x8b', 'gzip'),
+    (0, b'BZh', 'bzip2'),
+    (0, b'\xfd7zXZ\x00', 'xz'),
+    (0, b"7z\xbc\xaf'\x1c", '7z'),
+    (0, b'Rar!\x1a\x07', 'rar'),
+    (0, b'MSCF', 'cab'),
+    (257, b'ustar', 'tar'),
+]
+
+IMAGE_MAGIC = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+# Признаки сценариев в тексте: PowerShell, VBScript/JScript (WSH), batch, JavaScript
+SCRIPT_MARKERS = re.compile(
+    rb'(?i)(powershell|invoke-expression|\biex\b|frombase64string|wscript\.|createobject\s*\('
+    rb'|@echo\s+off|\bcmd(\.exe)?\s+/c\b|\beval\s*\(|document\.write|activexobject|<script\b)'
+)
+HTML_MARKERS = re.compile(rb'(?i)^\s*(<!doctype\s+html|<html\b|<head\b|<body\b)')
+TEXT_BYTES = bytes(range(32, 127)) + b'\t\n\r\f\b\x1b'
+
+
+def sniff(head):
+    """(тип, MIME) по первым байтам файла"""
+    head = bytes(head[:SNIFF_SIZE])
+    if not head:
+        return 'empty', MIME_TYPES['empty']
+
+    kind = _sniff_binary(head)
+    if kind is None:
+        for magic, mime in IMAGE_MAGIC:
+            if head.startswith(magic):
+                return 'image', mime
+        if head.startswith(b'BM') and head[6:10] == b'\x00\x00\x00\x00':
+            return 'image', 'image/bmp'
+        kind = _sniff_text(head)
+    return kind, MIME_TYPES[kind]
+
+
+def _sniff_binary(head):
+    # В настоящем заголовке MZ есть нули; текст, начинающийся с "MZ", - не программа
+    if head.startswith(b'MZ') and b'\x00' in head[:64]:
+        return 'pe'
+    if head.startswith(b'\xca\xfe\xba\xbe') and len(head) >= 8:
+        # Тот же magic у Java class и у "толстого" Mach-O: у Mach-O там число архитектур
+        return 'macho' if struct.unpack('>I', head[4:8])[0] < 20 else 'java'
+    for offset, magic, kind in MAGIC:
+        if head.startswith(magic, offset):
+            return kind
+    if head.startswith(b'PK\x03\x04'):
+        return _sniff_zip(head)
+    # PDF-читатели ищут заголовок в первом килобайте, так же прячут и вредоносные PDF
+    if b'%PDF-' in head[:1024]:
+        return 'pdf'
+    return None
+
+
+def _sniff_zip(head):
+    """ZIP-контейнеры различаем по именам первых записей"""
+    names = set()
+    offset = 0
+    while head.startswith(b'PK\x03\x04', offset) and offset + 30 <= len(head):
+        compressed, _, name_length, extra_length = struct.unpack('<IIHH', head[offset + 18:offset + 30])
+        name = head[offset + 30:offset + 30 + name_length]
+        names.add(name)
+        if name == b'mimetype':
+            data = head[offset + 30 + name_length + extra_length:][:compressed]
+            if data.startswith(b'application/vnd.oasis.opendocument'):
+                return 'odf'
+        offset += 30 + name_length + extra_length + compressed
+    if b'[Content_Types].xml' in names or any(name.startswith((b'word/', b'xl/', b'ppt/'))
+                                                for name in names):
+        return 'ooxml'
+    if b'AndroidManifest.xml' in names or b'classes.dex' in names:
+        return 'apk'
+    if b'META-INF/MANIFEST.MF' in names or any(name.endswith(b'.class') for name in names):
+        return 'jar'
+    return 'zip'
+
+
+def _sniff_text(head):
+    if head.startswith(b'#!'):
+        return 'script'
+    # UTF-16 (частый у PowerShell и .reg) и BOM UTF-8
+    if head.startswith((b'\xff\xfe', b'\xfe\xff')):
+        head = head[2:].replace(b'\x00', b'')
+    elif head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    if b'\x00' in head:
+        return 'binary'
+    # Не-ASCII байты (UTF-8, cp1251) тоже текст; управляющие символы - нет
+    control = len(head.translate(None, TEXT_BYTES + bytes(range(128, 256))))
+    if control > len(head) // 100:
+        return 'binary'
+    if HTML_MARKERS.search(head):
+        return 'html'
+    if SCRIPT_MARKERS.search(head):
+        return 'script'
+    return 'text'
+
+
+class TypeSniffer:
+    """Приемник для ScanPipeline: запоминает первые SNIFF_SIZE байт, дальше ничего не делает"""
+
+    def __init__(self, size=SNIFF_SIZE):
+        self.size = size
+        self.head = b''
+        self._result = None
+
+    def write(self, chunk):
+        if len(self.head) < self.size:
+            self.head += bytes(chunk[:self.size - len(self.head)])
+
+    def result(self):
+        if self._result is None:
+            self._result = sniff(self.head)
+        return self._result
@@ -0,0 +1,330 @@
+# hashfilter.py - ФИЛЬТР БЛУМА ИЗВЕСТНЫХ ХЕШЕЙ: ПРОВЕРКА ДО ЗАПРОСА В БД
+#
+#   python hashfilter.py --host localhost --database xxx --password ...
+#   python hashfilter.py --import bad:feeds/malwarebazaar.txt --import good:feeds/nsrl.txt
+#   HASH_FILTER_DIR=filters python backend.py
+# Строится офлайн из таблиц scans/files и импортированных фидов (known_hashes);
+# бэкенд открывает файлы через mmap - процессы-воркеры делят одни и те же страницы
+import argparse
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+MAGIC = b'DBTBLOOM'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')  # magic, версия, число хеш-функций, бит, элементов
+HEADER_SIZE = 64  # данные начинаются с выровненного смещения
+FILTER_DIR = os.getenv('HASH_FILTER_DIR', 'filters')
+FILTER_FILES = {'bad': 'known_bad.bloom', 'good': 'known_good.bloom'}
+SHA256_RE = re.compile(r'\b[0-9a-fA-F]{64}\b')
+
+
+class BloomFilter:
+    """Фильтр Блума по SHA-256: ~18 бит на хеш при 0.01% ложных срабатываний вместо ~100 байт в set
+
+    Ключ уже равномерно распределен, поэтому индексы берем прямо из байт хеша
+    (двойное хеширование h1 + i*h2) без дополнительных хеш-функций.
+    """
+
+    def __init__(self, bits, num_hashes, data, count=0):
+        self.bits = bits
+        self.num_hashes = num_hashes
+        self.data = data  # bytearray при построении, mmap после load()
+        self.count = count
+        self._file = None
+
+    @classmethod
+    def create(cls, capacity, fp_rate=1e-4):
+        capacity = max(capacity, 1)
+        bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        bits = (bits + 7) // 8 * 8
+        num_hashes = max(1, round(-math.log2(fp_rate)))  # оптимум (m/n)*ln2 при таком m
+        return cls(bits, num_hashes, bytearray(bits // 8))
+
+    @classmethod
+    def load(cls, path):
+        """Открываем файл через mmap: в память попадают только страницы, которые читаем"""
+        f = open(path, 'rb')
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            f.close()
+            raise
+        magic, version, num_hashes, bits, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or len(data) < HEADER_SIZE + bits // 8:
+            data.close()
+            f.close()
+            raise ValueError(f'{path}: не файл фильтра или он поврежден')
+        bloom = cls(bits, num_hashes, memoryview(data)[HEADER_SIZE:], count)
+        bloom._file = (f, data)
+        return bloom
+
+    def _positions(self, file_hash):
+        digest = bytes.fromhex(file_hash)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.num_hashes)]
+
+    def add(self, file_hash):
+        data = self.data
+        for position in self._positions(file_hash):
+            data[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, file_hash):
+        data = self.data
+        try:
+            positions = self._positions(file_hash)
+        except ValueError:
+            return False
+        return all(data[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def save(self, path):
+        """Атомарно: читатели видят либо старый файл, либо новый целиком"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.num_hashes, self.bits, self.count)
+                        .ljust(HEADER_SIZE, b'\0'))
+                f.write(self.data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def close(self):
+        if self._file is not None:
+            f, data = self._file
+            self.data.release()
+            data.close()
+            f.close()
+            self._file = None
+
+
+class KnownHashes:
+    """Фильтры известных хешей + точная проверка положительного ответа
+
+    Отрицательный ответ фильтра точен - в БД не ходим. Положительный может быть ложным,
+    поэтому вердикт берем только из confirm(file_hash) (БД), а None от нее - повод сканировать.
+    """
+
+    def __init__(self, filters, confirm):
+        self.filters = filters  # {'bad': BloomFilter, 'good': BloomFilter}
+        self.confirm = confirm
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'negative': 0, 'confirmed': 0, 'false_positive': 0}
+
+    @classmethod
+    def load(cls, directory, confirm):
+        """Фильтры из каталога; None, если их еще не строили"""
+        filters = {}
+        for kind, name in FILTER_FILES.items():
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                filters[kind] = BloomFilter.load(path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Фильтр {path} не загружен: {e}")
+        if not filters:
+            return None
+        print("🧮 Фильтры известных хешей: " + ', '.join(
+            f"{kind} {bloom.count} ({bloom.bits // 8 // 1024} КБ)" for kind, bloom in filters.items()))
+        return cls(filters, confirm)
+
+    def lookup(self, file_hash):
+        """Вердикт для известного хеша или None (неизвестен - нужно сканировать)"""
+        kinds = [kind for kind, bloom in self.filters.items() if file_hash in bloom]
+        if not kinds:
+            self._count('checked', 'negative')
+            return None
+        verdict = self.confirm(file_hash)
+        self._count('checked', 'confirmed' if verdict is not None else 'false_positive')
+        return verdict
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['filters'] = {
+            kind: {'count': bloom.count, 'bits': bloom.bits, 'hashes': bloom.num_hashes}
+            for kind, bloom in self.filters.items()
+        }
+        return stats
+
+    def close(self):
+        for bloom in self.filters.values():
+            bloom.close()
+
+
+# ========== ПОСТРОЕНИЕ ФИЛЬТРОВ ==========
+
+def read_feed(path):
+    """SHA-256 из фида: по одному в строке, CSV или JSONL - берем первый 64-символьный hex"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            match = SHA256_RE.search(line)
+            if match:
+                yield match.group(0).lower()
+
+
+def import_feed(conn, kind, path, source):
+    """Фид в known_hashes; повторный импорт обновляет вердикт и источник"""
+    verdict = 'malicious' if kind == 'bad' else 'clean'
+    imported = 0
+    batch = []
+    cursor = conn.cursor()
+    for file_hash in read_feed(path):
+        batch.append((file_hash, verdict, source))
+        if len(batch) >= 10000:
+            imported += _insert_known(cursor, batch)
+            batch = []
+    if batch:
+        imported += _insert_known(cursor, batch)
+    cursor.close()
+    conn.commit()
+    return imported
+
+
+def _insert_known(cursor, batch):
+    # В одном пакете хеш может повториться - ON CONFLICT не примет его дважды
+    batch = list({row[0]: row for row in batch}.values())
+    execute_values(cursor, '''
+        INSERT INTO known_hashes (file_hash, verdict, source)
+        VALUES %s
+        ON CONFLICT (file_hash) DO UPDATE SET
+            verdict = EXCLUDED.verdict, source = EXCLUDED.source, imported_at = CURRENT_TIMESTAMP
+    ''', batch, page_size=len(batch))
+    return len(batch)
+
+
+def create_known_hashes_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS known_hashes (
+            file_hash VARCHAR(64) PRIMARY KEY,
+            verdict VARCHAR(20) NOT NULL,
+            source VARCHAR(100),
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def source_queries(cursor):
+    """SELECT (хеш, 'bad'/'good') для каждой таблицы, что есть в этой БД"""
+    cursor.execute('''
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name IN ('scans', 'files')
+    ''')
+    columns = {(table, column) for table, column in cursor.fetchall()}
+    queries = ['''
+        SELECT file_hash, CASE WHEN verdict = 'malicious' THEN 'bad' ELSE 'good' END
+        FROM known_hashes
+    ''']
+    if ('scans', 'file_hash') in columns:
+        # Простая схема backend.py: статус вердикта прямо в scans
+        # Неполные вердикты (движок не ответил) известными не считаем
+        partial = ' AND NOT partial' if ('scans', 'partial') in columns else ''
+        queries.append(f'''
+            SELECT DISTINCT file_hash, CASE WHEN status = 'THREAT_DETECTED' THEN 'bad' ELSE 'good' END
+            FROM scans WHERE status IN ('THREAT_DETECTED', 'CLEAN'){partial}
+        ''')
+    if ('scans', 'file_id') in columns and ('files', 'file_hash') in columns:
+        # Расширенная схема database.py: вердикт в scans.result
+        queries.append('''
+            SELECT DISTINCT f.file_hash,
+                   CASE WHEN s.result->>'status' = 'THREAT_DETECTED' THEN 'bad' ELSE 'good' END
+            FROM scans s JOIN files f ON f.id = s.file_id
+            WHERE s.result->>'status' IN ('THREAT_DETECTED', 'CLEAN')
+              AND COALESCE((s.result->>'partial')::boolean, FALSE) = FALSE
+        ''')
+    return queries
+
+
+def build_filters(conn, directory, fp_rate=1e-4):
+    """Два прохода по источникам: подсчет для размера фильтра, затем заполнение.
+    Хеши не собираются в память целиком - сервер отдает их курсором порциями."""
+    cursor = conn.cursor()
+    queries = source_queries(cursor)
+
+    counts = {'bad': 0, 'good': 0}
+    for query in queries:
+        cursor.execute(f'SELECT kind, COUNT(*) FROM ({query}) AS known(file_hash, kind) GROUP BY kind')
+        for kind, count in cursor.fetchall():
+            counts[kind] += count
+    cursor.close()
+
+    filters = {kind: BloomFilter.create(count, fp_rate) for kind, count in counts.items()}
+    for query in queries:
+        cursor = conn.cursor(name='hashfilter_build')  # серверный курсор
+        cursor.itersize = 50000
+        cursor.execute(query)
+        for file_hash, kind in cursor:
+            filters[kind].add(file_hash.lower())
+        cursor.close()
+
+    os.makedirs(directory, exist_ok=True)
+    for kind, bloom in filters.items():
+        bloom.save(os.path.join(directory, FILTER_FILES[kind]))
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Построение фильтров известных хешей')
+    parser.add_argument('--out', default=FILTER_DIR, help='каталог для *.bloom')
+    parser.add_argument('--fp-rate', type=float, default=1e-4, help='доля ложных срабатываний')
+    parser.add_argument('--import', dest='feeds', action='append', default=[], metavar='bad|good:ПУТЬ',
+                        help='сначала импортировать фид SHA-256 в known_hashes')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--database', default='xxx')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.getenv('PGPASSWORD', 'xxx'))
+    args = parser.parse_args()
+
+    try:
+        conn = psycopg2.connect(host=args.host, port=args.port, database=args.database,
+                                user=args.user, password=args.password)
+    except psycopg2.OperationalError as e:
+        sys.exit(f'❌ Нет подключения к PostgreSQL: {e}')
+
+    try:
+        cursor = conn.cursor()
+        create_known_hashes_table(cursor)
+        cursor.close()
+        conn.commit()
+
+        for feed in args.feeds:
+            kind, _, path = feed.partition(':')
+            if kind not in FILTER_FILES or not path:
+                parser.error(f'--import ожидает bad:ПУТЬ или good:ПУТЬ, получено {feed!r}')
+            imported = import_feed(conn, kind, path, os.path.basename(path)[:100])
+            print(f"📥 {path}: {imported} хешей ({kind})")
+
+        filters = build_filters(conn, args.out, args.fp_rate)
+        for kind, bloom in filters.items():
+            print(f"✅ {os.path.join(args.out, FILTER_FILES[kind])}: {bloom.count} хешей, "
+                  f"{bloom.bits // 8 / 1024 / 1024:.1f} МБ, {bloom.num_hashes} хеш-функций")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
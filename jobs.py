@@ -0,0 +1,178 @@
+# jobs.py - ОЧЕРЕДЬ ЗАДАЧ СКАНИРОВАНИЯ С ПУЛОМ ВОРКЕРОВ
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Жизненный цикл совпадает со scans.status: по умолчанию 'pending'
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+
+class QueueFullError(Exception):
+    """В очереди нет места для новой задачи"""
+
+
+class ScanJob:
+    def __init__(self, filename, file_hash=None, file_size=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.file_hash = file_hash
+        self.file_size = file_size
+        self.status = STATUS_PENDING
+        self.result = None
+        self.error = None
+        self.scan_id = None  # id строки в таблице scans
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.completed_at = None
+        self.finished_monotonic = None
+        self._changed = threading.Condition()
+        self.version = 0
+
+    @property
+    def done(self):
+        return self.status in FINAL_STATUSES
+
+    def set_status(self, status):
+        with self._changed:
+            self.status = status
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Ждем смены статуса после версии version (для SSE)"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'hash': self.file_hash,
+            'status': self.status,
+            'scan_id': self.scan_id,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class ScanJobQueue:
+    """Ограниченный пул воркеров; on_status(job) вызывается на каждом переходе"""
+
+    def __init__(self, workers=4, max_pending=100, on_status=None, job_ttl=3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.on_status = on_status
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-worker')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def submit(self, func, filename, file_hash=None, file_size=None):
+        """Ставим задачу в очередь, func() должна вернуть результат сканирования"""
+        self._prune()
+        with self._lock:
+            self._check_capacity()
+            job = ScanJob(filename, file_hash, file_size)
+            self._jobs[job.id] = job
+            self._active += 1
+
+        # Обработчик 'pending' успевает создать запись до старта воркера
+        self._notify(job)
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def submit_task(self, func, *args, **kwargs):
+        """Задача без отслеживания статуса (файлы пакетного скана): тот же пул и тот же лимит max_pending"""
+        with self._lock:
+            self._check_capacity()
+            self._active += 1
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._task_done(None)
+            raise
+        future.add_done_callback(self._task_done)
+        return future
+
+    def check_capacity(self):
+        """QueueFullError, если submit() сейчас откажет: проверяем до чтения загрузки"""
+        with self._lock:
+            self._check_capacity()
+
+    def _check_capacity(self):
+        if self._active >= self.max_pending:
+            raise QueueFullError(f'Очередь сканирования заполнена ({self.max_pending})')
+
+    def _task_done(self, future):
+        with self._lock:
+            self._active -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, func):
+        try:
+            job.started_at = datetime.now()
+            job.set_status(STATUS_RUNNING)
+            self._notify(job)
+
+            job.result = func()
+            job.completed_at = datetime.now()
+            self._finish(job, STATUS_COMPLETED)
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.completed_at = datetime.now()
+            self._finish(job, STATUS_FAILED)
+
+    def _finish(self, job, status):
+        # Сначала сохраняем, потом сообщаем клиентам - чтобы в ответе уже был scan_id
+        job.status = status
+        self._notify(job)
+        job.finished_monotonic = time.monotonic()
+        job.set_status(status)
+        with self._lock:
+            self._active -= 1
+
+    def _notify(self, job):
+        if self.on_status is None:
+            return
+        try:
+            self.on_status(job)
+        except Exception as e:
+            print(f"❌ Ошибка обработчика статуса задачи {job.id}: {e}")
+
+    def _prune(self):
+        """Забываем завершенные задачи старше job_ttl"""
+        deadline = time.monotonic() - self.job_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_monotonic is not None and job.finished_monotonic < deadline]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'active': self._active,
+                'tracked_jobs': len(self._jobs)
+            }
+
+    def shutdown(self, wait=True):
+        """Останавливаем прием задач и дожидаемся текущих"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,195 @@
+# pipeline.py - ОДНОПРОХОДНЫЙ КОНВЕЙЕР: ХЕШ + СИГНАТУРЫ + РАЗМЕР
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+
+from filetype import SNIFF_SIZE
+
+CHUNK_SIZE = 1024 * 1024  # 1 МБ за одно чтение
+# Файлы от этого размера отображаем в память; werkzeug держит в памяти загрузки до 500 КБ
+MMAP_THRESHOLD = int(os.getenv('MMAP_THRESHOLD', 1024 * 1024))
+# Копия потока для второго прохода держится в памяти до этого размера, дальше - на диске
+SPOOL_MEMORY_SIZE = int(os.getenv('SPOOL_MEMORY_SIZE', 8 * 1024 * 1024))
+
+
+class FileTooLargeError(Exception):
+    """Поток оказался больше разрешенного размера"""
+
+    def __init__(self, max_size):
+        super().__init__(f'Файл слишком большой (макс {max_size // 1024 // 1024} МБ)')
+        self.max_size = max_size
+
+
+class ScanPipeline:
+    """Читает данные один раз и раздает каждый чанк всем потребителям"""
+
+    def __init__(self, signatures=None, max_size=None, sinks=None, chunk_size=CHUNK_SIZE):
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.signature_stream = signatures.stream() if signatures is not None else None
+        # Дополнительные потребители с методом write(chunk)
+        self.sinks = list(sinks or [])
+
+    def update(self, chunk):
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLargeError(self.max_size)
+
+        self.sha256.update(chunk)
+        if self.signature_stream is not None:
+            self.signature_stream.update(chunk)
+        for sink in self.sinks:
+            sink.write(chunk)
+
+    def consume(self, stream):
+        """Вычитываем поток до конца большими чанками"""
+        read = stream.read
+        while True:
+            chunk = read(self.chunk_size)
+            if not chunk:
+                break
+            self.update(chunk)
+        return self
+
+    def consume_mmap(self, fileobj, start=0):
+        """Файл на диске: одно отображение, потребителям - срезы memoryview без копий"""
+        size = os.fstat(fileobj.fileno()).st_size
+        if self.max_size is not None and size - start > self.max_size:
+            raise FileTooLargeError(self.max_size)
+        if size <= start:
+            return self
+        
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for offset in range(start, size, self.chunk_size):
+                    # Срез обязан освободиться до закрытия mmap
+                    with view[offset:offset + self.chunk_size] as chunk:
+                        self.update(chunk)
+        fileobj.seek(size)
+        return self
+    
+    def consume_auto(self, stream):
+        """Большой файл на диске - через mmap, остальное - обычным чтением"""
+        fileobj = mappable(stream)
+        if fileobj is not None:
+            return self.consume_mmap(fileobj, stream.tell())
+        return self.consume(stream)
+    
+    def consume_file(self, file_path):
+        with open(file_path, 'rb') as f:
+            return self.consume_auto(f)
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    @property
+    def digests(self):
+        """SHA-256 и дайджесты приемников с hexdigests() (MD5, SHA-1, ssdeep)"""
+        digests = {'sha256': self.hexdigest}
+        for sink in self.sinks:
+            if hasattr(sink, 'hexdigests'):
+                digests.update(sink.hexdigests())
+        return digests
+
+    @property
+    def matches(self):
+        if self.signature_stream is None:
+            return []
+        return self.signature_stream.matches
+
+
+class Spool:
+    """Приемник: данные для второго прохода после проверки кэша (clamd, члены архива)
+
+    Поток с seek перечитываем с того же места, остальное (тело запроса, член архива) копируем:
+    в памяти до SPOOL_MEMORY_SIZE, дальше - во временном файле. accept(первые байты) решает,
+    нужна ли копия вообще.
+    """
+
+    def __init__(self, stream, accept=None, head_size=SNIFF_SIZE):
+        self.stream = None
+        self.start = None
+        try:
+            if stream.seekable():
+                self.stream, self.start = stream, stream.tell()
+        except (AttributeError, OSError, ValueError):
+            pass
+        self.accept = accept
+        self.head_size = head_size
+        self.file = None
+        self._head = bytearray() if self.stream is None else None  # None - решение принято
+
+    def write(self, chunk):
+        if self._head is not None:
+            # Тип определяем по заголовку, а не по первому сетевому куску
+            self._head += chunk
+            if len(self._head) >= self.head_size:
+                self._decide()
+        elif self.file is not None:
+            self.file.write(chunk)
+
+    def _decide(self):
+        head, self._head = bytes(self._head), None
+        if self.accept is None or self.accept(head):
+            self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+            self.file.write(head)
+
+    def rewind(self):
+        """Поток с начала данных или None, если копию не делали"""
+        if self._head is not None:
+            self._decide()
+        if self.stream is not None:
+            self.stream.seek(self.start)
+            return self.stream
+        if self.file is not None:
+            self.file.seek(0)
+        return self.file
+
+    def replay(self, sinks, chunk_size=CHUNK_SIZE):
+        """Второй проход: данные целиком - в каждый из sinks; False - перечитать нечем"""
+        stream = self.rewind()
+        if stream is None:
+            return False
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return True
+            for sink in sinks:
+                sink.write(chunk)
+
+    def close(self):
+        # Чужой поток с seek закрывает его владелец
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def remaining(stream):
+    """Сколько байт осталось прочитать из потока; None - поток без seek/tell"""
+    try:
+        position = stream.tell()
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return size - position
+
+
+def mappable(stream, threshold=None):
+    """Поток, который стоит отобразить в память (настоящий файл не меньше порога), или None"""
+    threshold = MMAP_THRESHOLD if threshold is None else threshold
+    size = remaining(stream)
+    # Маленькие файлы дешевле прочитать; к тому же у SpooledTemporaryFile
+    # fileno() сбрасывает содержимое на диск
+    if size is None or size < threshold:
+        return None
+    try:
+        stream.fileno()
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+    return stream
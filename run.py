@@ -20,4 +20,4 @@ if __name__ == '__main__':
     print("💡 Для остановки: Ctrl+C")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes'))
\ No newline at end of file
@@ -0,0 +1,321 @@
+# samples.py - ХРАНИЛИЩЕ ОБРАЗЦОВ ПО SHA-256: ОДИНАКОВЫЕ ЗАГРУЗКИ ЛЕЖАТ НА ДИСКЕ ОДИН РАЗ
+#
+#   python samples.py --stats
+#   python samples.py --evict --max-size 10G --retention-days 30
+#   python samples.py --cat 275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f > sample.bin
+#   SAMPLE_STORE_DIR=/var/lib/dbt/samples python backend.py   # без переменной образцы не хранятся
+# Образец пишется, когда хеш уже известен, из копии конвейера (pipeline.Spool) и только если
+# такого еще нет: во временный файл рядом с хранилищем, затем os.replace в
+# samples/ab/cd/<sha256>[.zst]. Повторная загрузка только обновляет mtime - без сжатия и записи.
+# Сжатие - zstd, если установлен zstandard (pip install zstandard); без него файлы хранятся как есть.
+# Вытеснение: старше retention_days (system_settings) по последней загрузке, затем самые
+# давние, пока хранилище больше SAMPLE_STORE_MAX_SIZE.
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from settings import DEFAULT_SETTINGS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SAMPLE_STORE_DIR = os.getenv('SAMPLE_STORE_DIR', '')  # пусто - хранилище выключено
+DEFAULT_ROOT = 'samples'  # для CLI и SampleStore() без каталога
+SAMPLE_STORE_MAX_SIZE = int(os.getenv('SAMPLE_STORE_MAX_SIZE', 10 * 1024 * 1024 * 1024))  # 10 ГБ
+SAMPLE_COMPRESSION_LEVEL = int(os.getenv('SAMPLE_COMPRESSION_LEVEL', 3))
+# Вытеснение - в фоне, не чаще раза в SAMPLE_EVICT_INTERVAL секунд
+SAMPLE_EVICT_INTERVAL = int(os.getenv('SAMPLE_EVICT_INTERVAL', 10 * 60))
+EVICT_LOW_WATERMARK = 0.9  # удаляем с запасом, чтобы не вытеснять на каждой загрузке
+TEMP_DIR = 'tmp'
+TEMP_MAX_AGE = 60 * 60  # недописанные файлы упавших процессов
+ZSTD_SUFFIX = '.zst'
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def sample_name(file_hash):
+    """Относительный путь без расширения: ab/cd/<sha256> - не больше 65536 файлов на каталог"""
+    file_hash = file_hash.lower()
+    if not SHA256_RE.match(file_hash):
+        raise ValueError(f'Ожидается SHA-256, получено {file_hash!r}')
+    return os.path.join(file_hash[:2], file_hash[2:4], file_hash)
+
+
+class SampleWriter:
+    """Приемник: копия потока во временный файл (сжатие - по ходу записи); commit() - под именем хеша"""
+
+    def __init__(self, store):
+        self.store = store
+        self.compressed = store.compress
+        fd, self.temp_path = tempfile.mkstemp(dir=store.temp_dir, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        self._writer = self.file
+        if self.compressed:
+            compressor = zstandard.ZstdCompressor(level=store.compression_level)
+            self._writer = compressor.stream_writer(self.file, closefd=False)
+
+    def write(self, chunk):
+        self._writer.write(chunk)
+
+    def commit(self, file_hash):
+        """Переносим в хранилище; тот же образец уже есть - только продлеваем ему жизнь"""
+        self._close()
+        try:
+            return self.store.add(self.temp_path, file_hash, self.compressed)
+        finally:
+            self.discard()
+
+    def discard(self):
+        self._close()
+        try:
+            os.unlink(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def _close(self):
+        if self.file.closed:
+            return
+        if self._writer is not self.file:
+            self._writer.close()  # дописывает кадр zstd, сам файл не закрывает
+        self.file.close()
+
+
+class SampleStore:
+    """Образцы по SHA-256 в шардированных каталогах; запись атомарна, чтение - потоком"""
+
+    def __init__(self, root=DEFAULT_ROOT, max_size=SAMPLE_STORE_MAX_SIZE, settings=None,
+                 compress=None, compression_level=SAMPLE_COMPRESSION_LEVEL,
+                 evict_interval=SAMPLE_EVICT_INTERVAL):
+        self.root = root
+        self.max_size = max_size
+        self.settings = settings  # SettingsCache: retention_days меняется без перезапуска
+        self.compress = zstandard is not None if compress is None else compress
+        if self.compress and zstandard is None:
+            raise RuntimeError('Сжатие образцов требует zstandard: pip install zstandard')
+        self.compression_level = compression_level
+        self.evict_interval = evict_interval
+        # Временные файлы - в том же разделе, иначе os.replace не атомарен
+        self.temp_dir = os.path.join(root, TEMP_DIR)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._evicting = False
+        self._evicted_at = time.monotonic()
+        self._stats = {'stored': 0, 'deduplicated': 0, 'bytes_written': 0, 'evicted': 0,
+                       'evicted_bytes': 0, 'errors': 0}
+
+    def retention_days(self):
+        if self.settings is None:
+            return DEFAULT_SETTINGS['retention_days']
+        return self.settings.get('retention_days', DEFAULT_SETTINGS['retention_days'])
+
+    def writer(self):
+        """Новый приемник для конвейера; None - писать некуда (ошибка не должна ломать скан)"""
+        try:
+            return SampleWriter(self)
+        except OSError as e:
+            self._count('errors')
+            print(f"⚠️ Образец не будет сохранен: {e}")
+            return None
+
+    def path(self, file_hash):
+        """Путь к образцу на диске или None"""
+        base = os.path.join(self.root, sample_name(file_hash))
+        for path in (base + ZSTD_SUFFIX, base):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def __contains__(self, file_hash):
+        try:
+            return self.path(file_hash) is not None
+        except ValueError:
+            return False
+
+    def touch(self, file_hash):
+        """Образец уже есть - продлеваем ему жизнь и возвращаем True; писать его заново не нужно"""
+        try:
+            existing = self.path(file_hash)
+        except ValueError:
+            return False
+        if existing is None:
+            return False
+        # Файл не трогаем, mtime - время последней загрузки для retention_days
+        try:
+            os.utime(existing)
+        except FileNotFoundError:
+            return False  # вытеснили между проверкой и utime - сохраняем заново
+        self._count('deduplicated')
+        return True
+
+    def add(self, temp_path, file_hash, compressed):
+        """Кладем готовый временный файл под именем хеша; True - образец новый"""
+        if self.touch(file_hash):
+            return False
+
+        path = os.path.join(self.root, sample_name(file_hash)) + (ZSTD_SUFFIX if compressed else '')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(temp_path)
+        # Одновременная загрузка того же файла заменит образец таким же - это безопасно
+        os.replace(temp_path, path)
+        self._count('stored')
+        self._count('bytes_written', size)
+        self.maybe_evict()
+        return True
+
+    def open(self, file_hash):
+        """Двоичный поток с исходным содержимым образца (распаковка zstd на лету)"""
+        path = self.path(file_hash)
+        if path is None:
+            raise FileNotFoundError(f'Образца {file_hash} нет в хранилище')
+        f = open(path, 'rb')
+        if not path.endswith(ZSTD_SUFFIX):
+            return f
+        if zstandard is None:
+            f.close()
+            raise RuntimeError('Образец сжат zstd, а zstandard не установлен: pip install zstandard')
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+
+    def entries(self):
+        """(sha256, путь, размер на диске, mtime) всех образцов"""
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == TEMP_DIR:
+                continue
+            for subshard in os.scandir(shard.path):
+                if not subshard.is_dir():
+                    continue
+                for entry in os.scandir(subshard.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.name[:64], entry.path, stat.st_size, stat.st_mtime
+
+    def maybe_evict(self):
+        """Запускаем вытеснение в фоне, если с прошлого раза прошло evict_interval"""
+        with self._lock:
+            if self._evicting or time.monotonic() - self._evicted_at < self.evict_interval:
+                return False
+            self._evicting = True
+        threading.Thread(target=self._evict_background, name='sample-evict', daemon=True).start()
+        return True
+
+    def _evict_background(self):
+        try:
+            self.evict()
+        except Exception as e:
+            self._count('errors')
+            print(f"⚠️ Вытеснение образцов: {e}")
+        finally:
+            with self._lock:
+                self._evicting = False
+                self._evicted_at = time.monotonic()
+
+    def evict(self, now=None):
+        """Удаляем образцы старше retention_days, затем самые давние сверх max_size"""
+        now = time.time() if now is None else now
+        retention_days = self.retention_days()
+        expire_before = now - retention_days * 24 * 60 * 60 if retention_days and retention_days > 0 else None
+
+        removed, removed_bytes, kept = 0, 0, []
+        for _, path, size, mtime in self.entries():
+            if expire_before is not None and mtime < expire_before:
+                if self._remove(path):
+                    removed += 1
+                    removed_bytes += size
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        if self.max_size and total > self.max_size:
+            kept.sort()
+            target = self.max_size * EVICT_LOW_WATERMARK
+            for mtime, size, path in kept:
+                if total <= target:
+                    break
+                if self._remove(path):
+                    removed += 1
+                    removed_bytes += size
+                total -= size
+
+        self._clean_temp(now)
+        self._count('evicted', removed)
+        self._count('evicted_bytes', removed_bytes)
+        if removed:
+            print(f"🧹 Образцы: удалено {removed} ({removed_bytes / 1024 / 1024:.1f} МБ), "
+                  f"осталось {total / 1024 / 1024:.1f} МБ")
+        return {'removed': removed, 'removed_bytes': removed_bytes, 'total_bytes': total}
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False  # другой воркер успел раньше
+
+    def _clean_temp(self, now):
+        for entry in os.scandir(self.temp_dir):
+            try:
+                if now - entry.stat().st_mtime > TEMP_MAX_AGE:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'root': self.root, 'compression': 'zstd' if self.compress else None,
+                      'max_size': self.max_size, 'retention_days': self.retention_days()})
+        return stats
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Хранилище образцов по SHA-256')
+    parser.add_argument('--root', default=SAMPLE_STORE_DIR or DEFAULT_ROOT)
+    parser.add_argument('--stats', action='store_true', help='число образцов и занятое место')
+    parser.add_argument('--evict', action='store_true', help='вытеснить по сроку и размеру')
+    parser.add_argument('--max-size', type=parse_size, default=SAMPLE_STORE_MAX_SIZE)
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_SETTINGS['retention_days'])
+    parser.add_argument('--cat', metavar='SHA256', help='исходное содержимое образца в stdout')
+    args = parser.parse_args()
+
+    store = SampleStore(args.root, max_size=args.max_size, compress=False,
+                        settings={'retention_days': args.retention_days})
+    if args.cat:
+        try:
+            with store.open(args.cat) as sample:
+                shutil.copyfileobj(sample, sys.stdout.buffer)
+        except (FileNotFoundError, ValueError, RuntimeError) as e:
+            sys.exit(f'❌ {e}')
+        return
+    if args.evict:
+        result = store.evict()
+        print(f"✅ Удалено {result['removed']} образцов, осталось {result['total_bytes'] / 1024 / 1024:.1f} МБ")
+    if args.stats or not args.evict:
+        count, total = 0, 0
+        for _, _, size, _ in store.entries():
+            count += 1
+            total += size
+        print(f"📦 {store.root}: {count} образцов, {total / 1024 / 1024:.1f} МБ на диске "
+              f"(лимит {store.max_size / 1024 / 1024:.0f} МБ)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+# scanner.py - АНТИВИРУСНЫЙ СКАНЕР (ОБЩИЙ ДЛЯ API И CLI)
+import random
+from datetime import datetime
+
+from pipeline import ScanPipeline, Spool, remaining
+from digests import DIGESTS, Digests
+from filetype import EXECUTABLE_TYPES, SUSPICIOUS_TYPES, TypeSniffer, sniff
+from virustotal import VirusTotalError
+from engines import (BuiltinSignaturesEngine, ClamAVEngine, EngineRegistry, EngineRunner,
+                     ScanContext, VirusTotalEngine, ENGINE_ERROR, ENGINE_OK, ENGINE_TIMEOUT)
+from settings import DEFAULT_SETTINGS
+from clamd import ClamdError, ClamdStream
+
+class AntivirusScanner:
+    def __init__(self, api_key, cache=None, signatures=None, virustotal=None,
+                 runner=None, settings=None, clamd=None, digests=None, known_hashes=None,
+                 archives=None, samples=None):
+        self.api_key = api_key
+        self.cache = cache
+        self.signatures = signatures
+        # VirusTotalClient; без него - демо-режим
+        self.virustotal = virustotal
+        # Движки работают параллельно, таймаут - scan_timeout из system_settings
+        self.runner = runner or EngineRunner(workers=4)
+        self.settings = settings
+        # ClamdPool; без него - встроенные сигнатуры (демо-режим ClamAV)
+        self.clamd = clamd
+        # Дополнительные дайджесты (MD5, SHA-1, ssdeep) за тот же проход, что и SHA-256
+        self.digests = DIGESTS if digests is None else digests
+        # KnownHashes: фильтры Блума известных хешей перед запросом в БД
+        self.known_hashes = known_hashes
+        # ArchiveExpander: члены архивов сканируются по отдельности; без него архив - один файл
+        self.archives = archives
+        # SampleStore: копия каждой загрузки по SHA-256 для пересканирования; без него не храним
+        self.samples = samples
+        # Движки и их включение (clamav_enabled, virustotal_enabled в system_settings)
+        self.registry = EngineRegistry(settings)
+        self.registry.register(BuiltinSignaturesEngine())
+        self.registry.register(ClamAVEngine(self))
+        self.registry.register(VirusTotalEngine(self))
+        print(f"🔑 VirusTotal: {'API КЛЮЧ АКТИВЕН' if virustotal else 'ДЕМО-РЕЖИМ'}")
+    
+    def calculate_hash(self, file_path):
+        """Вычисляем SHA-256 хеш (большие файлы - через mmap)"""
+        return ScanPipeline().consume_file(file_path).hexdigest
+    
+    def check_virustotal(self, file_hash, filename, file_type=None):
+        """Поиск отчета по хешу в VirusTotal (или демо без ключа)"""
+        if self.virustotal is not None:
+            print(f"🌐 Проверка в VirusTotal...")
+            try:
+                return self.virustotal.lookup(file_hash)
+            except VirusTotalError as e:
+                # Недоступность VirusTotal не должна ронять сканирование
+                print(f"⚠️ VirusTotal: {e}")
+                return {'detected': False, 'detections': 0, 'total': 0, 'engines': {}, 'error': str(e)}
+        
+        return self.check_virustotal_demo(file_hash, filename, file_type)
+    
+    def check_virustotal_demo(self, file_hash, filename, file_type=None):
+        """Демо-режим VirusTotal для школы"""
+        print(f"🌐 Проверка в VirusTotal (DEMO)...")
+        
+        # EICAR тестовый файл
+        if file_hash == "131f95c51cc819465a5e32bc2a4afce6980975a1c2b6c06e88c6b0b6da3c6c6a":
+            return {
+                'detected': True,
+                'detections': 10,
+                'total': 70,
+                'engines': {
+                    'Kaspersky': 'EICAR-Test-File',
+                    'Avast': 'EICAR-Test-File',
+                    'Bitdefender': 'EICAR-Test-File'
+                }
+            }
+        
+        # Для исполняемых файлов (по содержимому, а не по .exe) - 40% шанс угрозы
+        if file_type in EXECUTABLE_TYPES:
+            if random.random() < 0.4:
+                return {
+                    'detected': True,
+                    'detections': random.randint(2, 8),
+                    'total': 70,
+                    'engines': {
+                        'DemoAV': 'Trojan.Generic',
+                        'AnotherAV': 'RiskWare'
+                    }
+                }
+        
+        # Для остальных - 90% чистые
+        return {
+            'detected': False,
+            'detections': 0,
+            'total': 70,
+            'engines': {}
+        }
+    
+    def check_clamav(self, filename, matches, clamd_stream=None, file_type=None):
+        """Вердикт clamd по INSTREAM; без clamd - встроенный сигнатурный движок"""
+        if clamd_stream is not None:
+            print(f"🦠 Проверка в ClamAV (clamd)...")
+            try:
+                virus = clamd_stream.result()
+                return {
+                    'detected': virus is not None,
+                    'result': virus or 'OK',
+                    'source': 'clamd',
+                    'matches': matches
+                }
+            except ClamdError as e:
+                print(f"⚠️ {e} - используем встроенные сигнатуры")
+                return {
+                    'detected': bool(matches),
+                    'result': matches[0]['name'] if matches else 'OK',
+                    'source': 'signatures',
+                    'matches': matches,
+                    'error': str(e)
+                }
+        
+        print(f"🦠 Проверка в ClamAV (DEMO)...")
+        
+        # Сигнатуры уже найдены конвейером за тот же проход, что и хеш
+        if matches:
+            return {
+                'detected': True,
+                'result': matches[0]['name'],
+                'matches': matches
+            }
+        
+        # Подозрительные типы: программы, сценарии, документы с макросами
+        if file_type in SUSPICIOUS_TYPES:
+            if random.random() < 0.3:
+                return {
+                    'detected': True,
+                    'result': 'Trojan.Generic.123456'
+                }
+        
+        return {
+            'detected': False,
+            'result': 'OK'
+        }
+    
+    def scan_timeout(self):
+        if self.settings is None:
+            return DEFAULT_SETTINGS['scan_timeout']
+        return self.settings.get('scan_timeout', DEFAULT_SETTINGS['scan_timeout'])
+    
+    def scan_file(self, file_path, filename, use_cache=True):
+        """Сканирование файла на диске"""
+        with open(file_path, 'rb') as f:
+            return self.scan_stream(f, filename, use_cache=use_cache, path=file_path)
+    
+    def scan_stream(self, stream, filename, use_cache=True, max_size=None, path=None):
+        """Основная функция сканирования: поток читается один раз, clamd и члены архива - из копии"""
+        print(f"\n🔍 Начинаю сканирование: {filename}")
+        pipeline = self.read_stream(stream, max_size=max_size)
+        return self.evaluate(pipeline, filename, use_cache=use_cache, path=path)
+    
+    def read_stream(self, stream, max_size=None, sinks=None, store=True):
+        """Один проход: SHA-256, остальные дайджесты, тип файла, сигнатуры и размер
+
+        В clamd и в хранилище образцов данные идут из копии уже в evaluate, после проверки
+        хеша, поэтому прочитанный, но еще не оцененный файл сессию clamd не держит.
+        store=False - образец не понадобится (члены архива: сохранен сам архив)
+        """
+        sinks = [TypeSniffer()] + list(sinks or [])
+        if (self.clamd is not None and self.registry.is_enabled('clamav')) or (store and self.samples is not None):
+            sinks.append(Spool(stream))
+        elif self.archives is not None:
+            # Архив распакуем после вердикта: поток без seek копируем за этот же проход
+            sinks.append(Spool(stream, accept=lambda head: self.archives.expandable(sniff(head)[0])))
+        if self.digests:
+            sinks.append(Digests(self.digests, size_hint=remaining(stream)))
+        
+        pipeline = ScanPipeline(signatures=self.signatures, max_size=max_size, sinks=sinks)
+        try:
+            pipeline.consume_auto(stream)
+        except Exception:
+            self.release(pipeline)
+            raise
+        return pipeline
+    
+    def store_sample(self, pipeline):
+        """Копия в хранилище образцов - только для нового хеша; сбой хранилища скан не ломает"""
+        file_hash = pipeline.hexdigest
+        if self.samples.touch(file_hash):
+            return  # уже есть: ни сжатия, ни записи на диск
+        spool = self.spool(pipeline)
+        sample = self.samples.writer() if spool is not None else None
+        if sample is None:
+            return
+        try:
+            spool.replay([sample])
+            sample.commit(file_hash)
+        except OSError as e:
+            sample.discard()
+            print(f"⚠️ Образец {file_hash[:16]} не сохранен: {e}")
+    
+    def release(self, pipeline):
+        """Прочитанный поток больше не нужен (evaluate закончил, дубликат в пакете): удаляем копию"""
+        spool = self.spool(pipeline)
+        if spool is not None:
+            spool.close()
+    
+    @staticmethod
+    def spool(pipeline):
+        return next((s for s in pipeline.sinks if isinstance(s, Spool)), None)
+    
+    def feed_clamd(self, pipeline, file_type):
+        """INSTREAM из копии: сессия из пула занята только на время отправки и вердикта"""
+        if self.clamd is None or not self.registry.is_enabled('clamav'):
+            return None
+        if not self.registry.applies_to(self.registry.get('clamav'), file_type):
+            return None
+        spool = self.spool(pipeline)
+        if spool is None:
+            return None  # clamd включили уже после чтения - проверят встроенные сигнатуры
+        clamd_stream = self.open_clamd_stream()
+        spool.replay([clamd_stream])
+        return clamd_stream
+    
+    def open_clamd_stream(self):
+        """INSTREAM-сессия из пула; None - clamd не настроен или ClamAV выключен"""
+        if self.clamd is None or not self.registry.is_enabled('clamav'):
+            return None
+        try:
+            return self.clamd.instream()
+        except ClamdError as e:
+            print(f"⚠️ {e}")
+            # Пустой поток: движок ClamAV сразу уйдет на встроенные сигнатуры
+            stream = ClamdStream(self.clamd, None)
+            stream.error = str(e)
+            return stream
+    
+    def evaluate(self, pipeline, filename, use_cache=True, path=None, expand=None, store=True):
+        """Вердикт по уже прочитанным данным: кэш, затем движки, затем члены архива
+
+        Один и тот же для всех путей (синхронный скан, задача ?async=1, пакет, член архива).
+        expand(stream, result) распаковывает архив; по умолчанию - self.archives.expand,
+        вложенные архивы распаковывает ArchiveScan с общим бюджетом.
+        store=False - не сохранять образец (как у read_stream)
+        """
+        try:
+            return self._evaluate(pipeline, filename, use_cache, path, expand, store)
+        finally:
+            self.release(pipeline)
+    
+    def _evaluate(self, pipeline, filename, use_cache, path, expand, store):
+        file_hash = pipeline.hexdigest
+        print(f"📊 SHA-256: {file_hash[:16]}...")
+        if store and self.samples is not None:
+            self.store_sample(pipeline)
+        file_type, mime_type = self.file_type(pipeline)
+        
+        # Уже сканировали этот хеш - движки не запускаем (архивы попадают в кэш только с членами)
+        if use_cache and self.cache is not None:
+            verdict = self.cache.get(file_hash)
+            if verdict is not None:
+                print(f"⚡ Вердикт из кэша: {verdict['status']}")
+                return self.known_result(pipeline, filename, verdict, 'cache', file_type, mime_type)
+        
+        # Нет в кэше - фильтр известных хешей; в БД идем только при положительном ответе
+        if use_cache and self.known_hashes is not None:
+            verdict = self.known_hashes.lookup(file_hash)
+            if verdict is not None:
+                print(f"🧮 Известный хеш: {verdict['status']}")
+                if self.cache is not None:
+                    self.cache.put(file_hash, verdict)
+                return self.known_result(pipeline, filename, verdict, verdict.get('source', 'known'),
+                                         file_type, mime_type)
+        
+        # 2. Дешевые движки сразу, дорогие (ClamAV, VirusTotal) - одновременно и только если нужно
+        # Тип файла убирает из плана движки, которым он не интересен
+        clamd_stream = self.feed_clamd(pipeline, file_type)
+        context = ScanContext(file_hash, filename, pipeline.size, pipeline.matches, clamd_stream, path,
+                              file_type=file_type)
+        results, statuses = self.registry.scan(context, self.runner, self.scan_timeout())
+        if clamd_stream is not None:
+            # ClamAV пропущен - недописанный INSTREAM не возвращаем в пул
+            clamd_stream.close()
+        # Кто-то не ответил (или clamd не дал вердикта) - вердикт неполный, в кэш его не кладем
+        partial = (any(status in (ENGINE_TIMEOUT, ENGINE_ERROR) for status in statuses.values())
+                   or bool((results.get('clamav') or {}).get('error')))
+        
+        vt_result = results.get('virustotal') or {
+            'detected': False, 'detections': 0, 'total': 0, 'engines': {}, 'skipped': True
+        }
+        clamav_result = results.get('clamav') or {'detected': False, 'result': 'OK', 'skipped': True}
+        signatures_result = results.get('signatures')
+        # Без ClamAV находку встроенных сигнатур показываем в его поле, как раньше
+        if signatures_result and signatures_result['detected'] and not clamav_result['detected']:
+            clamav_result = signatures_result
+        
+        # 3. Определяем общий статус
+        if any(verdict.get('detected') for verdict in results.values()):
+            status = 'THREAT_DETECTED'
+            print(f"⚠️  ОБНАРУЖЕНА УГРОЗА!")
+        else:
+            status = 'CLEAN'
+            print(f"✅ Файл чистый")
+        
+        # 4. Формируем результат
+        result = {
+            'filename': filename,
+            'hash': file_hash,
+            'size': pipeline.size,
+            'digests': pipeline.digests,
+            'file_type': file_type,
+            'mime_type': mime_type,
+            'timestamp': datetime.now().isoformat(),
+            'status': status,
+            'virustotal': vt_result,
+            'clamav': clamav_result,
+            'cached': False,
+            'source': 'scan',
+            'partial': partial,
+            'engines': statuses,
+            'postgresql': 'ready'
+        }
+        
+        # 5. Архив: вердикт контейнера без членов неокончательный - в кэш его кладет
+        # ArchiveScan.finish, когда вердикты членов уже учтены
+        if self.archives is not None and self.archives.expandable(file_type):
+            self.expand(pipeline, result, use_cache, expand)
+        # Все движки выключены - вердикта по сути нет, его тоже не кэшируем
+        elif self.cache is not None and not partial and ENGINE_OK in statuses.values():
+            self.cache.put(file_hash, {
+                'status': status,
+                'virustotal': vt_result,
+                'clamav': clamav_result
+            })
+        
+        return result
+    
+    def expand(self, pipeline, result, use_cache=True, expand=None):
+        """Второй проход по архиву: члены сканируются, статус и result['archive'] - с их учетом"""
+        spool = self.spool(pipeline)
+        stream = spool.rewind() if spool is not None else None
+        if stream is None:
+            # Перечитать нечем - проверен только сам контейнер
+            result['partial'] = True
+            return
+        if expand is None:
+            self.archives.expand(self, stream, result, use_cache=use_cache)
+        else:
+            expand(stream, result)
+    
+    def known_result(self, pipeline, filename, verdict, source, file_type=None, mime_type=None):
+        """Ответ без запуска движков: вердикт из кэша или из базы известных хешей"""
+        return {
+            'filename': filename,
+            'hash': pipeline.hexdigest,
+            'size': pipeline.size,
+            'digests': pipeline.digests,
+            'file_type': file_type,
+            'mime_type': mime_type,
+            'timestamp': datetime.now().isoformat(),
+            'status': verdict['status'],
+            'virustotal': verdict['virustotal'],
+            'clamav': verdict['clamav'],
+            'cached': True,
+            'source': source,
+            'postgresql': 'ready'
+        }
+    
+    @staticmethod
+    def file_type(pipeline):
+        """(тип, MIME) по magic bytes; конвейер без TypeSniffer - (None, None)"""
+        sniffer = next((s for s in pipeline.sinks if isinstance(s, TypeSniffer)), None)
+        if sniffer is None:
+            return None, None
+        return sniffer.result()
+
+
+def to_db_result(result, scan_duration=0):
+    """Результат AntivirusScanner -> формат scans/detections расширенной БД"""
+    vt = result.get('virustotal') or {}
+    clamav = result.get('clamav') or {}
+    
+    detections = []
+    for engine, name in (vt.get('engines') or {}).items():
+        detections.append({
+            'engine_name': engine,
+            'threat_name': name,
+            'detection_name': name,
+            'type': 'virus',
+            'severity': 7,
+            'confidence': 0.9
+        })
+    if clamav.get('detected'):
+        detections.append({
+            'engine_name': 'ClamAV',
+            'threat_name': clamav.get('result'),
+            'detection_name': clamav.get('result'),
+            'type': 'virus',
+            'severity': 7,
+            'confidence': 1.0 if clamav.get('matches') else 0.7,
+            'details': {'matches': clamav.get('matches', [])[:10]}
+        })
+    
+    malicious_engines = sorted({d['engine_name'] for d in detections})
+    engine_count = (vt.get('total') or 0) + 1
+    detection_count = (vt.get('detections') or 0) + (1 if clamav.get('detected') else 0)
+    
+    # Уровень 0-10: доля сработавших движков, любая находка - минимум 5
+    threat_level = 0
+    if result.get('status') == 'THREAT_DETECTED':
+        threat_level = max(5, min(10, round(detection_count / engine_count * 10)))
+    
+    return {
+        'status': result.get('status'),
+        'virustotal': vt,
+        'clamav': clamav,
+        'threat_level': threat_level,
+        'detection_count': detection_count,
+        'engine_count': engine_count,
+        'malicious_engines': malicious_engines,
+        'scan_duration': scan_duration,
+        'digests': result.get('digests', {}),
+        'file_type': result.get('file_type'),
+        'mime_type': result.get('mime_type'),
+        'archive': result.get('archive'),
+        'partial': bool(result.get('partial')),
+        'detections': detections
+    }
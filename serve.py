@@ -0,0 +1,165 @@
+# serve.py - ПРОДАКШЕН-ЗАПУСК: НЕСКОЛЬКО ПРОЦЕССОВ И ПОТОКОВ ВМЕСТО app.run(debug=True)
+#
+#   python serve.py backend --workers 4 --threads 8 --bind 0.0.0.0:5000
+#   python serve.py advanced --bind 0.0.0.0:5001
+# gunicorn (Linux/macOS): приложение грузится один раз в мастере (preload) - сигнатуры,
+# фильтры Блума и кэш вердиктов достаются воркерам через fork (copy-on-write).
+# waitress (Windows, pip install waitress): один процесс, пул потоков.
+# Квота VirusTotal (VIRUSTOTAL_RATE) - на ключ: каждый из --workers процессов получает свою долю.
+# Без PostgreSQL процесс один: статус задач ?async=1 хранится только в его памяти (max_workers()).
+# SIGTERM / Ctrl+C: новые запросы не принимаются, текущие сканы и очередь доделываются.
+import argparse
+import importlib
+import os
+import signal
+import sys
+import threading
+
+APPS = {'backend': ('backend', 5000), 'advanced': ('backend_advanced', 5001)}
+
+SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', os.cpu_count() or 2))
+SERVE_THREADS = int(os.getenv('SERVE_THREADS', 8))
+# Сколько ждать текущие запросы при остановке: скан с VirusTotal идет до scan_timeout
+SERVE_GRACEFUL_TIMEOUT = int(os.getenv('SERVE_GRACEFUL_TIMEOUT', 60))
+SERVE_TIMEOUT = int(os.getenv('SERVE_TIMEOUT', 120))  # воркер молчит дольше - перезапуск
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+
+def load(module_name):
+    """Модуль бэкенда: на импорте создаются приложение, БД, движки и кэши"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    return importlib.import_module(module_name)
+
+
+def call_hook(module, name):
+    hook = getattr(module, name, None)
+    if hook is not None:
+        try:
+            hook()
+        except Exception as e:
+            print(f"⚠️ {module.__name__}.{name}: {e}")
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn без отдельного конфига: модуль загружен заранее, хуки - из него же"""
+
+        def __init__(self, module, options):
+            self.module = module
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            self.cfg.set('pre_fork', lambda server, worker: call_hook(self.module, 'prepare_fork'))
+            self.cfg.set('worker_exit', lambda server, worker: call_hook(self.module, 'shutdown'))
+
+        def load(self):
+            return self.module.app
+
+
+def serve_gunicorn(module, args):
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'accesslog': '-' if args.access_log else None,
+        'errorlog': '-'
+    }
+    print(f"🏭 gunicorn: {args.workers} процессов x {args.threads} потоков, {args.bind}")
+    GunicornServer(module, options).run()
+
+
+def serve_waitress(module, args):
+    host, port = args.bind.rsplit(':', 1)
+    server = waitress.create_server(module.app, host=host, port=int(port), threads=args.threads,
+                                    channel_timeout=args.timeout)
+
+    def stop(signum, frame):
+        # Закрываем слушающий сокет: открытые соединения доработают, затем run() вернется
+        print("\n🛑 Остановка: дожидаемся текущих запросов...")
+        server.close()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"🏭 waitress: 1 процесс x {args.threads} потоков, {args.bind}")
+    try:
+        server.run()
+    finally:
+        call_hook(module, 'shutdown')
+
+
+def serve_werkzeug(module, args):
+    """Запасной вариант без gunicorn и waitress: многопоточный сервер werkzeug без отладчика"""
+    from werkzeug.serving import make_server
+
+    host, port = args.bind.rsplit(':', 1)
+    server = make_server(host, int(port), module.app, threaded=True)
+
+    def stop(signum, frame):
+        print("\n🛑 Остановка: дожидаемся текущих запросов...")
+        # shutdown() ждет выхода из serve_forever - вызываем не из обработчика сигнала
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"⚠️ gunicorn и waitress не установлены - werkzeug, 1 процесс, {args.bind}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        call_hook(module, 'shutdown')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Продакшен-запуск бэкенда DBT Antivirus')
+    parser.add_argument('app', nargs='?', default='backend', choices=sorted(APPS))
+    parser.add_argument('--bind', help='host:port (по умолчанию 0.0.0.0:5000 / 5001)')
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help='процессов (gunicorn)')
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS, help='потоков на процесс')
+    parser.add_argument('--timeout', type=int, default=SERVE_TIMEOUT)
+    parser.add_argument('--graceful-timeout', type=int, default=SERVE_GRACEFUL_TIMEOUT)
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress', 'werkzeug'], default='auto')
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args()
+
+    module_name, port = APPS[args.app]
+    args.bind = args.bind or f'0.0.0.0:{port}'
+    server = args.server
+    if server == 'auto':
+        server = 'gunicorn' if BaseApplication is not None else 'waitress' if waitress is not None else 'werkzeug'
+    if server == 'gunicorn' and BaseApplication is None:
+        sys.exit('❌ gunicorn не установлен: pip install gunicorn')
+    if server == 'waitress' and waitress is None:
+        sys.exit('❌ waitress не установлен: pip install waitress')
+
+    # Отладчик и перезагрузчик в проде не нужны, даже если FLASK_DEBUG остался в окружении
+    os.environ['FLASK_DEBUG'] = '0'
+    # Число процессов - до загрузки модуля: квоты на ключ (VIRUSTOTAL_RATE) бэкенд делит между ними
+    os.environ['SERVE_PROCESSES'] = str(args.workers if server == 'gunicorn' else 1)
+    module = load(module_name)
+    module.app.debug = False
+    limit = getattr(module, 'max_workers', lambda: None)()
+    if server == 'gunicorn' and limit is not None and args.workers > limit:
+        # Например, задачи ?async=1 без БД: статус знает только принявший их процесс
+        print(f"⚠️ {module_name} допускает не больше {limit} процессов gunicorn, а не {args.workers}")
+        args.workers = limit
+    {'gunicorn': serve_gunicorn, 'waitress': serve_waitress, 'werkzeug': serve_werkzeug}[server](module, args)
+
+
+if __name__ == '__main__':
+    main()
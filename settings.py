@@ -0,0 +1,65 @@
+# settings.py - НАСТРОЙКИ ИЗ system_settings С КОРОТКИМ TTL
+import threading
+import time
+
+# Значения по умолчанию совпадают с тем, что сеет AdvancedDatabase.init_advanced_tables
+DEFAULT_SETTINGS = {
+    'max_upload_size': 33554432,
+    'scan_timeout': 300,
+    'retention_days': 30,
+    'signatures_enabled': True,
+    'clamav_enabled': True,
+    'virustotal_enabled': True,
+    'notification_emails': True,
+    'daily_scan_limit': 1000
+}
+
+
+def parse_setting(value, data_type):
+    """Строка из system_settings.value -> значение нужного типа"""
+    if data_type == 'integer':
+        return int(value)
+    if data_type in ('float', 'number'):
+        return float(value)
+    if data_type == 'boolean':
+        return str(value).strip().lower() in ('true', '1', 'yes', 'on')
+    return value
+
+
+class SettingsCache:
+    """Перечитываем настройки раз в ttl секунд: изменения в БД применяются без перезапуска"""
+
+    def __init__(self, loader, ttl=30, defaults=DEFAULT_SETTINGS):
+        self.loader = loader
+        self.ttl = ttl
+        self.defaults = dict(defaults)
+        self._values = dict(defaults)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < self.ttl:
+                return
+            try:
+                values = dict(self.defaults)
+                values.update(self.loader())
+                self._values = values
+            except Exception as e:
+                # БД недоступна - работаем на последних известных значениях
+                print(f"⚠️ Не удалось прочитать system_settings: {e}")
+            self._loaded_at = now
+
+    def get(self, key, default=None):
+        self._refresh()
+        return self._values.get(key, default)
+
+    def all(self):
+        self._refresh()
+        return dict(self._values)
+
+    def invalidate(self):
+        self._loaded_at = None
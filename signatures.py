@@ -0,0 +1,148 @@
+# signatures.py - СИГНАТУРНЫЙ ДВИЖОК (АХО-КОРАСИК ПО БАЙТАМ)
+import os
+import re
+from collections import deque
+
+SIGNATURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signatures.txt')
+CHUNK_SIZE = 64 * 1024
+MAX_MATCHES = 1000  # не копим совпадения бесконечно на "забитых" файлах
+
+
+def load_signatures(path=SIGNATURES_FILE):
+    """Читаем файл сигнатур формата ИМЯ:HEX (как .ndb у ClamAV, без смещений)"""
+    signatures = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                name, hex_pattern = line.rsplit(':', 1)
+                pattern = bytes.fromhex(hex_pattern)
+            except ValueError:
+                print(f"⚠️ Неверная сигнатура в строке {line_no}: {line[:40]}")
+                continue
+            if name and pattern:
+                signatures.append((name.strip(), pattern))
+    return signatures
+
+
+class SignatureEngine:
+    """Автомат Ахо-Корасик, строится один раз при старте"""
+
+    def __init__(self, signatures):
+        self.signatures = list(signatures)
+        # goto[state] - полная таблица переходов ДКА, только в ненулевые состояния
+        self.goto = [{}]
+        self.output = [()]
+        self._build()
+
+    @classmethod
+    def from_file(cls, path=SIGNATURES_FILE):
+        engine = cls(load_signatures(path))
+        print(f"🧬 Загружено сигнатур: {len(engine.signatures)}")
+        return engine
+
+    def _build(self):
+        # 1. Бор из всех шаблонов
+        outputs = [[]]
+        for index, (name, pattern) in enumerate(self.signatures):
+            state = 0
+            for byte in pattern:
+                next_state = self.goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][byte] = next_state
+                    self.goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        # 2. Суффиксные ссылки обходом в ширину, сразу превращаем бор в ДКА
+        fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state].extend(outputs[fail[state]])
+            trie_edges = list(self.goto[state].items())
+            # Наследуем переходы суффиксной ссылки, которых нет в боре
+            for byte, target in self.goto[fail[state]].items():
+                self.goto[state].setdefault(byte, target)
+            for byte, child in trie_edges:
+                fail[child] = self.goto[fail[state]].get(byte, 0)
+                queue.append(child)
+
+        self.output = [tuple(out) for out in outputs]
+        self.max_length = max((len(p) for _, p in self.signatures), default=0)
+
+        # Из корня прыгаем сразу к ближайшему байту, с которого начинается сигнатура
+        first_bytes = bytes(sorted(self.goto[0]))
+        if first_bytes:
+            self._root_skip = re.compile(b'[' + b''.join(re.escape(bytes([b])) for b in first_bytes) + b']')
+        else:
+            self._root_skip = None
+
+    def stream(self):
+        return SignatureStream(self)
+
+    def scan_bytes(self, data):
+        matcher = self.stream()
+        matcher.update(data)
+        return matcher.matches
+
+    def scan_fileobj(self, fileobj, chunk_size=CHUNK_SIZE):
+        matcher = self.stream()
+        for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+            matcher.update(chunk)
+        return matcher.matches
+
+    def scan_file(self, file_path, chunk_size=CHUNK_SIZE):
+        with open(file_path, 'rb') as f:
+            return self.scan_fileobj(f, chunk_size)
+
+
+class SignatureStream:
+    """Потоковый поиск: состояние автомата переживает границы чанков"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.state = 0
+        self.offset = 0
+        self.matches = []
+
+    def update(self, chunk):
+        engine = self.engine
+        goto = engine.goto
+        output = engine.output
+        skip = engine._root_skip
+        state = self.state
+        length = len(chunk)
+        i = 0
+
+        if skip is None:
+            self.offset += length
+            return
+
+        while i < length:
+            if state == 0:
+                found = skip.search(chunk, i)
+                if found is None:
+                    break
+                i = found.start()
+            state = goto[state].get(chunk[i], 0)
+            if output[state] and len(self.matches) < MAX_MATCHES:
+                end = self.offset + i + 1
+                for index in output[state]:
+                    name, pattern = engine.signatures[index]
+                    self.matches.append({
+                        'name': name,
+                        'offset': end - len(pattern)
+                    })
+            i += 1
+
+        self.state = state
+        self.offset += length
+
+    @property
+    def detected(self):
+        return bool(self.matches)
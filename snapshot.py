@@ -0,0 +1,73 @@
+# snapshot.py - ФОНОВЫЙ СНИМОК ДАННЫХ ДЛЯ ДАШБОРДА
+import hashlib
+import json
+import threading
+import traceback
+from datetime import datetime
+
+
+class Snapshot:
+    def __init__(self, body, etag, generated_at):
+        self.body = body
+        self.etag = etag
+        self.generated_at = generated_at
+
+
+class SnapshotService:
+    """Считает payload раз в interval секунд в фоне и отдает готовые байты"""
+
+    def __init__(self, compute, interval=30, serialize=json.dumps):
+        self.compute = compute
+        self.interval = interval
+        self.serialize = serialize
+        self.last_error = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Пересчитываем снимок; при ошибке продолжаем отдавать предыдущий"""
+        try:
+            body = self.serialize(self.compute()).encode('utf-8')
+        except Exception as e:
+            traceback.print_exc()
+            self.last_error = str(e)
+            return self._snapshot
+
+        etag = hashlib.sha1(body).hexdigest()
+        snapshot = Snapshot(body, etag, datetime.now())
+        self._snapshot = snapshot
+        self.last_error = None
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        # Поток запускаем в том процессе, который обслуживает запросы (важно после fork)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='dashboard-snapshot', daemon=True)
+                self._thread.start()
+
+    def get(self):
+        """Текущий снимок; первый вызов считает его синхронно"""
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot or self.refresh()
+        return snapshot
+
+    @property
+    def age(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return (datetime.now() - snapshot.generated_at).total_seconds()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,249 @@
+# test_archives.py - РАСПАКОВКА АРХИВОВ: ВСЕ ПУТИ СКАНИРОВАНИЯ ВИДЯТ ЧЛЕНЫ, КЭШ - ТОЛЬКО С НИМИ
+#
+#   python -m pytest test_archives.py
+import io
+import json
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from archives import ArchiveExpander
+from cache import VerdictCache
+from scanner import AntivirusScanner
+from signatures import SIGNATURES_FILE, SignatureEngine
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+def make_zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+# Сжатый EICAR: в байтах самого архива сигнатуры нет, найти ее можно только в члене
+EICAR_ZIP = make_zip({'readme.txt': b'hello', 'eicar.com': EICAR})
+
+
+class NetworkStream:
+    """Поток без seek, как тело запроса: данные приходят мелкими кусками"""
+
+    def __init__(self, data, piece=1000):
+        self.data = io.BytesIO(data)
+        self.piece = piece
+
+    def read(self, size=-1):
+        return self.data.read(min(size, self.piece) if size and size > 0 else self.piece)
+
+
+@pytest.fixture
+def scanner_with():
+    scanners = []
+
+    def make(**limits):
+        expander = ArchiveExpander(workers=2, **limits)
+        scanner = AntivirusScanner(None, cache=VerdictCache(), signatures=SignatureEngine.from_file(SIGNATURES_FILE),
+                                   digests=[], archives=expander)
+        scanners.append(scanner)
+        return scanner
+
+    yield make
+    for scanner in scanners:
+        scanner.archives.shutdown()
+        scanner.runner.shutdown()
+
+
+@pytest.fixture
+def scanner(scanner_with):
+    return scanner_with()
+
+
+def scan_stream_seekable(scanner, data, tmp_path):
+    return scanner.scan_stream(io.BytesIO(data), 'sample.zip')
+
+
+def scan_stream_upload(scanner, data, tmp_path):
+    return scanner.scan_stream(NetworkStream(data), 'sample.zip')
+
+
+def scan_file(scanner, data, tmp_path):
+    path = tmp_path / 'sample.zip'
+    path.write_bytes(data)
+    return scanner.scan_file(str(path), 'sample.zip')
+
+
+def read_then_evaluate(scanner, data, tmp_path):
+    # Как задача ?async=1: чтение в запросе, движки - потом, в воркере
+    pipeline = scanner.read_stream(NetworkStream(data))
+    return scanner.evaluate(pipeline, 'sample.zip')
+
+
+@pytest.mark.parametrize('entry', [scan_stream_seekable, scan_stream_upload, scan_file, read_then_evaluate])
+def test_eicar_zip_is_expanded_on_every_path(scanner, tmp_path, entry):
+    result = entry(scanner, EICAR_ZIP, tmp_path)
+    assert result['status'] == 'THREAT_DETECTED'
+    assert result['archive']['member_count'] == 2
+    assert result['archive']['threats'] == 1
+    threat = next(member for member in result['archive']['members'] if member['status'] == 'THREAT_DETECTED')
+    assert threat['path'] == 'sample.zip/eicar.com'
+
+
+def test_cached_archive_verdict_includes_members(scanner, tmp_path):
+    first = read_then_evaluate(scanner, EICAR_ZIP, tmp_path)
+    assert first['cached'] is False
+
+    second = scan_stream_upload(scanner, EICAR_ZIP, tmp_path)
+    assert second['cached'] is True
+    assert second['status'] == 'THREAT_DETECTED'
+    assert scanner.cache.get(first['hash'])['status'] == 'THREAT_DETECTED'
+
+
+def test_container_verdict_is_not_cached_before_members(scanner, monkeypatch):
+    seen = []
+
+    def expand(scanner_, stream, result, use_cache=True):
+        # Движки контейнера уже отработали, члены еще нет
+        seen.append(scanner.cache.get(result['hash']))
+
+    monkeypatch.setattr(scanner.archives, 'expand', expand)
+    scanner.scan_stream(io.BytesIO(EICAR_ZIP), 'sample.zip')
+    assert seen == [None]
+
+
+def members_by_path(result):
+    return {member['path']: member for member in result['archive']['members']}
+
+
+def test_infected_member_marks_container(scanner):
+    result = scanner.scan_stream(io.BytesIO(tar_of({'docs/a.txt': b'just text', 'bin/eicar.com': EICAR})), 'sample.tar')
+    assert result['status'] == 'THREAT_DETECTED'
+    members = members_by_path(result)
+    assert members['sample.tar/docs/a.txt']['status'] == 'CLEAN'
+    assert members['sample.tar/bin/eicar.com']['status'] == 'THREAT_DETECTED'
+    assert members['sample.tar/bin/eicar.com']['threat']
+    assert not result['partial']
+    assert scanner.cache.get(result['hash'])['status'] == 'THREAT_DETECTED'
+
+
+def test_nested_zip_is_expanded_to_the_infected_member(scanner):
+    outer = make_zip({'readme.txt': b'hello', 'inner.zip': EICAR_ZIP})
+    result = scanner.scan_stream(io.BytesIO(outer), 'sample.zip')
+    assert result['status'] == 'THREAT_DETECTED'
+    members = members_by_path(result)
+    assert members['sample.zip/inner.zip']['depth'] == 1
+    assert members['sample.zip/inner.zip']['status'] == 'THREAT_DETECTED'
+    assert members['sample.zip/inner.zip/eicar.com']['depth'] == 2
+    assert members['sample.zip/inner.zip/eicar.com']['status'] == 'THREAT_DETECTED'
+
+
+def test_nesting_deeper_than_limit_is_partial_and_not_cached(scanner_with):
+    scanner = scanner_with(max_depth=1)
+    outer = make_zip({'inner.zip': EICAR_ZIP})
+    result = scanner.scan_stream(io.BytesIO(outer), 'sample.zip')
+    # Внутрь inner.zip не заходили - про EICAR ничего не известно
+    assert 'sample.zip/inner.zip/eicar.com' not in members_by_path(result)
+    assert result['partial'] is True
+    assert scanner.cache.get(result['hash']) is None
+
+
+def test_ratio_bomb_is_a_threat(scanner_with):
+    scanner = scanner_with(max_ratio=10)
+    # 4 МБ нулей сжимаются в несколько килобайт - куда больше 10:1
+    bomb = make_zip({'zeros.bin': bytes(4 * 1024 * 1024)})
+    result = scanner.scan_stream(NetworkStream(bomb), 'bomb.zip')
+    assert result['status'] == 'THREAT_DETECTED'
+    assert result['archive']['limit'] == 'ratio'
+    assert result['clamav']['result'] == 'Heuristics.Archive.Bomb'
+    # Бомба - окончательный вердикт, а не неполный
+    assert result['partial'] is False
+    assert scanner.cache.get(result['hash'])['status'] == 'THREAT_DETECTED'
+
+
+def test_member_count_overflow_stops_expansion(scanner_with):
+    scanner = scanner_with(max_members=3)
+    crowded = make_zip({f'file{i}.txt': f'text {i}'.encode() for i in range(10)})
+    result = scanner.scan_stream(io.BytesIO(crowded), 'crowded.zip')
+    assert result['archive']['limit'] == 'members'
+    assert result['archive']['member_count'] <= 3
+    assert result['status'] == 'CLEAN'
+    # Не все члены проверены - вердикт неполный и в кэш не попадает
+    assert result['partial'] is True
+    assert scanner.cache.get(result['hash']) is None
+
+
+@pytest.fixture
+def backend():
+    backend = pytest.importorskip('backend')
+    backend.verdict_cache.invalidate()
+    yield backend
+    backend.verdict_cache.invalidate()
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/scan/{job_id}').get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Задача {job_id} не завершилась за {timeout} с')
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_eicar_zip_through_scan_api(backend, asynchronous):
+    client = backend.app.test_client()
+    url = '/api/scan?async=1' if asynchronous else '/api/scan'
+    response = client.post(url, data={'file': (io.BytesIO(EICAR_ZIP), 'sample.zip')})
+    if asynchronous:
+        assert response.status_code == 202
+        job = wait_for_job(client, response.get_json()['job_id'])
+        assert job['status'] == 'completed'
+        result = job['result']
+    else:
+        assert response.status_code == 200
+        result = response.get_json()
+    assert result['status'] == 'THREAT_DETECTED'
+    assert result['archive']['threats'] == 1
+
+    # Повторная загрузка - из кэша, и вердикт в нем уже с членами
+    again = client.post('/api/scan', data={'file': (io.BytesIO(EICAR_ZIP), 'sample.zip')}).get_json()
+    assert again['cached'] is True
+    assert again['status'] == 'THREAT_DETECTED'
+
+
+def tar_of(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('form', ['multipart', 'tar'])
+def test_eicar_zip_through_batch_api(backend, form):
+    client = backend.app.test_client()
+    if form == 'multipart':
+        response = client.post('/api/scan/batch', data={
+            'a': (io.BytesIO(b'just text'), 'a.txt'),
+            'b': (io.BytesIO(EICAR_ZIP), 'b.zip')
+        })
+    else:
+        response = client.post('/api/scan/batch', data=tar_of({'a.txt': b'just text', 'b.zip': EICAR_ZIP}),
+                               content_type='application/x-tar')
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    records = {line['filename']: line for line in lines if 'summary' not in line}
+    assert records['b.zip']['status'] == 'THREAT_DETECTED'
+    assert records['b.zip']['archive']['threats'] == 1
+    assert records['a.txt']['status'] == 'CLEAN'
+    assert lines[-1]['summary']['threats'] == 1
+
+    # Вердикт пакета попал в кэш вместе с членами
+    again = client.post('/api/scan', data={'file': (io.BytesIO(EICAR_ZIP), 'b.zip')}).get_json()
+    assert again['cached'] is True and again['status'] == 'THREAT_DETECTED'
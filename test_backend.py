@@ -0,0 +1,83 @@
+# test_backend.py - ЭНДПОИНТЫ СКАНИРОВАНИЯ: ОЧЕРЕДЬ ЗАДАЧ, ОШИБКИ, ОСВОБОЖДЕНИЕ РЕСУРСОВ
+#
+#   python -m pytest test_backend.py
+# Без PostgreSQL бэкенд работает в DEMO-режиме - эти тесты базу не требуют
+import io
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def backend():
+    backend = pytest.importorskip('backend')
+    backend.verdict_cache.invalidate()
+    yield backend
+    backend.verdict_cache.invalidate()
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+def upload(data=b'some file', filename='file.bin'):
+    return {'file': (io.BytesIO(data), filename)}
+
+
+def test_full_queue_releases_the_read_upload(backend, client, monkeypatch):
+    released = []
+    release = backend.scanner.release
+    monkeypatch.setattr(backend.scanner, 'release', lambda pipeline: released.append(pipeline) or release(pipeline))
+
+    def submit(*args, **kwargs):
+        # Очередь заполнилась, пока читали тело
+        raise backend.QueueFullError('Очередь сканирования заполнена')
+
+    monkeypatch.setattr(backend.scan_jobs, 'submit', submit)
+
+    response = client.post('/api/scan?async=1', data=upload())
+    assert response.status_code == 503
+    assert len(released) == 1
+
+
+def test_full_queue_is_rejected_before_reading_the_body(backend, client, monkeypatch):
+    opened = []
+    open_upload = backend.open_upload
+    monkeypatch.setattr(backend, 'open_upload', lambda *args: opened.append(args) or open_upload(*args))
+    monkeypatch.setattr(backend.scan_jobs, 'max_pending', 0)
+
+    response = client.post('/api/scan?async=1', data=upload())
+    assert response.status_code == 503
+    assert opened == []
+    # Синхронное сканирование очередь не использует
+    assert client.post('/api/scan', data=upload()).status_code == 200
+
+
+def test_partial_verdict_is_marked_in_scans_row(backend):
+    result = {'filename': 'a.bin', 'hash': '0' * 64, 'size': 1, 'status': 'CLEAN',
+              'virustotal': {}, 'clamav': {'result': 'OK'}, 'partial': True}
+    # Последняя колонка - scans.partial: такие строки не попадают в кэш, фильтр и /by-hash
+    assert backend.scan_values(result)[-1] is True
+    assert backend.scan_values(dict(result, partial=False))[-1] is False
+
+
+def test_job_of_another_worker_is_read_from_scans(backend, client, monkeypatch):
+    created = datetime(2026, 1, 1, 12, 0)
+    row = {'id': 7, 'job_id': 'a' * 32, 'filename': 'a.bin', 'file_hash': '0' * 64, 'file_size': 1,
+           'status': 'CLEAN', 'vt_detections': 0, 'vt_total': 0, 'clamav_result': 'OK', 'partial': False,
+           'created_at': created, 'scan_date': created}
+    # Задачу принял другой процесс gunicorn: в памяти этого ее нет, в scans - есть
+    monkeypatch.setattr(backend.db, 'get_scan_job', lambda job_id: backend.row_to_job(row) if job_id == row['job_id'] else None)
+
+    job = client.get(f"/api/scan/{row['job_id']}").get_json()
+    assert job['status'] == 'completed' and job['scan_id'] == 7
+    assert job['result']['status'] == 'CLEAN'
+    events = client.get(f"/api/scan/{row['job_id']}/events").get_data(as_text=True)
+    assert '"status": "completed"' in events
+    assert client.get(f"/api/scan/{'b' * 32}").status_code == 404
+
+
+def test_without_database_jobs_need_a_single_worker(backend, monkeypatch):
+    monkeypatch.setattr(backend.db, 'pool', None)
+    assert backend.max_workers() == 1
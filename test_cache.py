@@ -0,0 +1,63 @@
+# test_cache.py - КЭШ ВЕРДИКТОВ: ВЫТЕСНЕНИЕ LRU И ИСТЕЧЕНИЕ TTL
+#
+#   python -m pytest test_cache.py
+import pytest
+
+import cache
+from cache import VerdictCache
+
+CLEAN = {'status': 'CLEAN'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_is_evicted():
+    verdicts = VerdictCache(max_size=2)
+    verdicts.put('a', CLEAN)
+    verdicts.put('b', CLEAN)
+    # Чтение освежает запись: вытесняется b, а не a
+    assert verdicts.get('a') == CLEAN
+    verdicts.put('c', CLEAN)
+    assert verdicts.get('b') is None
+    assert verdicts.get('a') == CLEAN and verdicts.get('c') == CLEAN
+    assert verdicts.stats()['size'] == 2
+
+
+def test_put_of_existing_key_refreshes_it():
+    verdicts = VerdictCache(max_size=2)
+    verdicts.put('a', CLEAN)
+    verdicts.put('b', CLEAN)
+    verdicts.put('a', {'status': 'THREAT_DETECTED'})
+    verdicts.put('c', CLEAN)
+    assert verdicts.get('b') is None
+    assert verdicts.get('a') == {'status': 'THREAT_DETECTED'}
+
+
+def test_verdict_expires_after_ttl(clock):
+    verdicts = VerdictCache(ttl=60)
+    verdicts.put('a', CLEAN)
+    verdicts.put('b', CLEAN, ttl=600)
+    clock[0] += 59
+    assert verdicts.get('a') == CLEAN
+    clock[0] += 2
+    # Устаревшая запись - промах, и из кэша она удаляется
+    assert verdicts.get('a') is None
+    assert verdicts.get('b') == CLEAN
+    assert verdicts.stats()['size'] == 1
+
+
+def test_hit_rate_counts_expired_as_miss(clock):
+    verdicts = VerdictCache(ttl=10)
+    verdicts.put('a', CLEAN)
+    verdicts.get('a')
+    clock[0] += 11
+    verdicts.get('a')
+    verdicts.get('missing')
+    stats = verdicts.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    assert stats['hit_rate'] == pytest.approx(1 / 3, abs=1e-4)
@@ -0,0 +1,132 @@
+# test_clamd.py - ПУЛ СЕССИЙ CLAMD ПРОТИВ ЛОКАЛЬНОЙ ЗАМЕНЫ (tools/fake_clamd.py)
+#
+#   python -m pytest test_clamd.py
+import io
+import time
+
+import pytest
+
+from cache import VerdictCache
+from clamd import ClamdError, ClamdPool
+from scanner import AntivirusScanner
+from tools.fake_clamd import start_fake_clamd
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+@pytest.fixture
+def fake_clamd(tmp_path):
+    servers = []
+
+    def start(**kwargs):
+        server, address = start_fake_clamd(socket_path=str(tmp_path / f'clamd{len(servers)}.sock'), **kwargs)
+        servers.append(server)
+        return server, address
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_sessions_are_reused(fake_clamd):
+    server, address = fake_clamd()
+    pool = ClamdPool(address, max_size=2, timeout=5)
+    try:
+        for _ in range(3):
+            assert pool.scan_bytes(b'clean data') is None
+        stats = pool.stats()
+        assert stats['sessions_opened'] == 1 and stats['scans'] == 3
+        assert server.counters['IDSESSION'] == 1
+        assert server.counters['INSTREAM'] == 3
+    finally:
+        pool.closeall()
+
+
+def test_instream_detects_threat_in_chunks(fake_clamd):
+    _, address = fake_clamd()
+    pool = ClamdPool(address, timeout=5)
+    try:
+        stream = pool.instream()
+        # Сигнатура на границе чанков: clamd видит поток целиком
+        stream.write(b'\0' * 100 + EICAR[:20])
+        stream.write(EICAR[20:])
+        assert stream.result() is not None
+        assert pool.scan_bytes(b'nothing to see here') is None
+    finally:
+        pool.closeall()
+
+
+def test_reconnects_after_server_drops_idle_session(fake_clamd):
+    server, address = fake_clamd(idle_timeout=0.2)
+    pool = ClamdPool(address, timeout=5, ping_after=0.1)
+    try:
+        assert pool.scan_bytes(b'first') is None
+        time.sleep(0.5)  # сервер закрыл сессию по IdleTimeout
+        assert pool.scan_bytes(EICAR) is not None
+        assert pool.stats()['sessions_opened'] == 2
+        assert server.counters['IDSESSION'] == 2
+    finally:
+        pool.closeall()
+
+
+def test_stream_max_length_is_an_error_not_a_verdict(fake_clamd):
+    _, address = fake_clamd(stream_max_length=64 * 1024)
+    pool = ClamdPool(address, max_size=1, timeout=5)
+    try:
+        with pytest.raises(ClamdError, match='size limit'):
+            pool.scan_bytes(b'x' * (256 * 1024))
+        stats = pool.stats()
+        # Сессию, закрытую сервером, в пул не вернули
+        assert stats['errors'] == 1 and stats['size'] == 0 and stats['idle'] == 0
+        assert pool.scan_bytes(b'small') is None
+    finally:
+        pool.closeall()
+
+
+@pytest.fixture
+def clamd_scanner(fake_clamd):
+    scanners = []
+
+    def make(**kwargs):
+        server, address = fake_clamd()
+        pool = ClamdPool(address, max_size=2, timeout=5)
+        scanner = AntivirusScanner(None, cache=VerdictCache(), clamd=pool, digests=[], **kwargs)
+        scanners.append(scanner)
+        return scanner, server
+
+    yield make
+    for scanner in scanners:
+        scanner.runner.shutdown()
+        scanner.clamd.closeall()
+
+
+def test_session_is_taken_only_after_cache_miss(clamd_scanner):
+    scanner, server = clamd_scanner()
+    # Прочитанный файл ждет воркера без сессии
+    pipeline = scanner.read_stream(io.BytesIO(b'\0' * 100 + EICAR))
+    assert scanner.clamd.stats()['size'] == 0 and server.counters.get('INSTREAM', 0) == 0
+
+    result = scanner.evaluate(pipeline, 'eicar.bin')
+    assert result['status'] == 'THREAT_DETECTED' and result['clamav']['source'] == 'clamd'
+    stats = scanner.clamd.stats()
+    assert stats['scans'] == 1 and stats['idle'] == 1  # сессия вернулась в пул
+
+    # Повтор из кэша в clamd не идет вовсе
+    again = scanner.scan_stream(io.BytesIO(b'\0' * 100 + EICAR), 'eicar.bin')
+    assert again['cached'] is True
+    assert server.counters['INSTREAM'] == 1
+
+
+def test_busy_pool_verdict_is_partial_and_not_cached(clamd_scanner):
+    scanner, _ = clamd_scanner()
+    scanner.clamd.timeout = 0.1
+    held = [scanner.clamd.getconn(), scanner.clamd.getconn()]
+    try:
+        result = scanner.scan_stream(io.BytesIO(b'clean data'), 'clean.bin')
+    finally:
+        for session in held:
+            scanner.clamd.putconn(session)
+    # Встроенные сигнатуры ответили, но без clamd вердикт неполный
+    assert result['partial'] is True and result['clamav']['error']
+    assert scanner.cache.get(result['hash']) is None
@@ -0,0 +1,109 @@
+# test_digests.py - ДАЙДЖЕСТЫ ЗА ОДИН ПРОХОД: СВОЙ CTPH ПРОТИВ ЭТАЛОННЫХ ХЕШЕЙ ssdeep
+#
+#   python -m pytest test_digests.py
+import hashlib
+import random
+
+import pytest
+
+from digests import B64, MIN_BLOCKSIZE, ROLLING_WINDOW, SPAMSUM_LENGTH, Digests, FuzzyHash, compare
+
+# Опубликованные дайджесты утилиты ssdeep (README python-ssdeep и ppdeep)
+REFERENCE = [
+    (b'', '3::'),
+    (b'Also called fuzzy hashes, Ctph can match inputs that have homologies.',
+     '3:AXGBicFlgVNhBGcL6wCrFQEv:AXGHsNhxLsr2C'),
+    (b'Also called fuzzy hashes, CTPH can match inputs that have homologies.',
+     '3:AXGBicFlIHBGcL6wCrFQEv:AXGH6xLsr2C'),
+    ('The equivalence of mass and energy translates into the well-known E = mc²'.encode(),
+     '3:RC0qYX4LBFA0dxEq4z2LRK+oCKI9VnXn:RvqpLB60dx8ilK+owX'),
+]
+
+
+def fuzzy(data, pieces=None):
+    fuzzy = FuzzyHash()
+    if pieces is None:
+        fuzzy.update(data)
+    else:
+        for start in range(0, len(data), pieces):
+            fuzzy.update(data[start:start + pieces])
+    return fuzzy.digest()
+
+
+def spamsum(data):
+    """Исходный spamsum Эндрю Триджелла: размер блока - по размеру файла, при коротком
+    дайджесте пересчет с половинным блоком. Медленно, но совсем другим путем, чем FuzzyHash"""
+    blocksize = MIN_BLOCKSIZE
+    while blocksize * SPAMSUM_LENGTH < len(data):
+        blocksize *= 2
+    while True:
+        window = [0] * ROLLING_WINDOW
+        h1 = h2 = h3 = 0
+        block = double = 0x28021967
+        first, second = '', ''
+        rolling = 0
+        for n, c in enumerate(data):
+            block = ((block * 0x01000193) ^ c) & 0xFFFFFFFF
+            double = ((double * 0x01000193) ^ c) & 0xFFFFFFFF
+            h2 = h2 - h1 + ROLLING_WINDOW * c
+            h1 = h1 + c - window[n % ROLLING_WINDOW]
+            window[n % ROLLING_WINDOW] = c
+            h3 = ((h3 << 5) ^ c) & 0xFFFFFFFF
+            rolling = (h1 + h2 + h3) & 0xFFFFFFFF
+            if rolling % blocksize == blocksize - 1 and len(first) < SPAMSUM_LENGTH - 1:
+                first += B64[block % 64]
+                block = 0x28021967
+            if rolling % (blocksize * 2) == blocksize * 2 - 1 and len(second) < SPAMSUM_LENGTH // 2 - 1:
+                second += B64[double % 64]
+                double = 0x28021967
+        if rolling != 0:
+            first += B64[block % 64]
+            second += B64[double % 64]
+        if blocksize > MIN_BLOCKSIZE and len(first) < SPAMSUM_LENGTH // 2:
+            blocksize //= 2
+            continue
+        return f'{blocksize}:{first}:{second}'
+
+
+def sample(seed, size):
+    rng = random.Random(seed)
+    if seed % 2:
+        return rng.randbytes(size)
+    # Текстоподобные данные: мало различных байт, длинные повторы
+    words = [rng.randbytes(rng.randint(2, 8)).hex().encode() for _ in range(50)]
+    return b' '.join(rng.choice(words) for _ in range(size // 8))[:size]
+
+
+@pytest.mark.parametrize('data, expected', REFERENCE)
+def test_matches_published_ssdeep_digests(data, expected):
+    assert fuzzy(data) == expected
+    assert fuzzy(data, pieces=5) == expected
+
+
+@pytest.mark.parametrize('seed, size', [(1, 1000), (2, 5000), (3, 20000), (4, 60000), (5, 150000)])
+def test_streaming_ctph_equals_classic_spamsum(seed, size):
+    data = sample(seed, size)
+    expected = spamsum(data)
+    assert fuzzy(data) == expected
+    # Границы чанков не влияют на дайджест
+    assert fuzzy(data, pieces=4093) == expected
+
+
+def test_similar_inputs_score_high():
+    a, b = REFERENCE[1][1], REFERENCE[2][1]
+    assert compare(a, b) == 22  # как ssdeep.compare в README python-ssdeep
+    data = sample(2, 40000)
+    edited = data[:20000] + b'PATCHED' + data[20007:]
+    assert compare(fuzzy(data), fuzzy(edited)) > 50
+    assert compare(fuzzy(data), fuzzy(sample(4, 40000))) == 0
+
+
+def test_digests_sink_matches_hashlib():
+    data = sample(3, 10000)
+    sink = Digests(['md5', 'sha1', 'ssdeep'])
+    for start in range(0, len(data), 777):
+        sink.write(data[start:start + 777])
+    digests = sink.hexdigests()
+    assert digests['md5'] == hashlib.md5(data).hexdigest()
+    assert digests['sha1'] == hashlib.sha1(data).hexdigest()
+    assert digests['ssdeep'] == spamsum(data)
@@ -0,0 +1,82 @@
+# test_hashfilter.py - ФИЛЬТР БЛУМА ИЗВЕСТНЫХ ХЕШЕЙ: БЕЗ ЛОЖНООТРИЦАТЕЛЬНЫХ, ПОСЛЕ save/load ТОЖЕ
+#
+#   python -m pytest test_hashfilter.py
+import hashlib
+
+import pytest
+
+from hashfilter import BloomFilter, KnownHashes
+
+
+def sha256s(prefix, count):
+    return [hashlib.sha256(f'{prefix}{i}'.encode()).hexdigest() for i in range(count)]
+
+
+@pytest.fixture(scope='module')
+def known():
+    return sha256s('known', 20000)
+
+
+@pytest.fixture(scope='module')
+def bloom(known):
+    bloom = BloomFilter.create(len(known), fp_rate=1e-3)
+    for file_hash in known:
+        bloom.add(file_hash)
+    return bloom
+
+
+def test_no_false_negatives(bloom, known):
+    assert all(file_hash in bloom for file_hash in known)
+    # Регистр hex в хеше не важен
+    assert all(file_hash.upper() in bloom for file_hash in known[:100])
+    assert bloom.count == len(known)
+
+
+def test_false_positive_rate_is_near_target(bloom):
+    others = sha256s('other', 20000)
+    false_positives = sum(file_hash in bloom for file_hash in others)
+    assert false_positives / len(others) < 3e-3
+
+
+def test_saved_filter_answers_the_same(bloom, known, tmp_path):
+    path = tmp_path / 'known_bad.bloom'
+    bloom.save(str(path))
+    loaded = BloomFilter.load(str(path))
+    try:
+        assert (loaded.bits, loaded.num_hashes, loaded.count) == (bloom.bits, bloom.num_hashes, bloom.count)
+        assert all(file_hash in loaded for file_hash in known)
+        others = sha256s('other', 2000)
+        assert [h in loaded for h in others] == [h in bloom for h in others]
+    finally:
+        loaded.close()
+
+
+def test_damaged_file_is_rejected(tmp_path):
+    path = tmp_path / 'broken.bloom'
+    path.write_bytes(b'not a filter' * 10)
+    with pytest.raises(ValueError):
+        BloomFilter.load(str(path))
+
+
+def test_not_a_hash_is_not_contained(bloom):
+    assert 'not-a-hash' not in bloom
+    assert '' not in bloom
+
+
+def test_lookup_goes_to_database_only_on_positive(bloom, known):
+    asked = []
+    verdicts = {known[0]: {'status': 'THREAT_DETECTED'}}
+
+    def confirm(file_hash):
+        asked.append(file_hash)
+        return verdicts.get(file_hash)
+
+    hashes = KnownHashes({'bad': bloom}, confirm)
+    unknown = next(h for h in sha256s('unknown', 1000) if h not in bloom)
+    assert hashes.lookup(unknown) is None
+    assert asked == []
+    assert hashes.lookup(known[0]) == {'status': 'THREAT_DETECTED'}
+    # В фильтре есть, в БД нет (удален или ложное срабатывание) - сканируем
+    assert hashes.lookup(known[1]) is None
+    stats = hashes.stats()
+    assert (stats['negative'], stats['confirmed'], stats['false_positive']) == (1, 1, 1)
@@ -0,0 +1,82 @@
+# test_pipeline.py - ОДНОПРОХОДНЫЙ КОНВЕЙЕР: mmap И ПОТОКОВОЕ ЧТЕНИЕ ДАЮТ ОДНО И ТО ЖЕ
+#
+#   python -m pytest test_pipeline.py
+import io
+import random
+
+import pytest
+
+import pipeline as pipeline_module
+from digests import Digests
+from pipeline import CHUNK_SIZE, FileTooLargeError, ScanPipeline
+from signatures import SIGNATURES_FILE, SignatureEngine
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+@pytest.fixture(scope='module')
+def signatures():
+    return SignatureEngine.from_file(SIGNATURES_FILE)
+
+
+@pytest.fixture(scope='module')
+def sample():
+    rng = random.Random(42)
+    data = bytearray(rng.randbytes(3 * CHUNK_SIZE + 12345))
+    # Сигнатура поперек границы чанков - и mmap-срезы, и чтение должны ее найти
+    data[CHUNK_SIZE - 20:CHUNK_SIZE - 20 + len(EICAR)] = EICAR
+    return bytes(data)
+
+
+def summary(scan):
+    return scan.size, scan.digests, scan.matches
+
+
+def test_mmap_and_stream_give_identical_results(signatures, sample, tmp_path, monkeypatch):
+    path = tmp_path / 'sample.bin'
+    path.write_bytes(sample)
+    mapped = []
+    consume_mmap = ScanPipeline.consume_mmap
+    monkeypatch.setattr(ScanPipeline, 'consume_mmap',
+                        lambda self, *args: mapped.append(args) or consume_mmap(self, *args))
+
+    from_file = ScanPipeline(signatures, sinks=[Digests(['md5', 'sha1'])]).consume_file(str(path))
+    assert len(mapped) == 1  # файл больше MMAP_THRESHOLD - через mmap
+
+    streamed = ScanPipeline(signatures, sinks=[Digests(['md5', 'sha1'])]).consume(io.BytesIO(sample))
+    small = ScanPipeline(signatures, sinks=[Digests(['md5', 'sha1'])], chunk_size=4096).consume(io.BytesIO(sample))
+    assert summary(from_file) == summary(streamed) == summary(small)
+    assert from_file.size == len(sample)
+    assert [match['offset'] for match in from_file.matches] == [CHUNK_SIZE - 20]
+
+
+def test_mmap_starts_at_current_position(signatures, sample, tmp_path):
+    path = tmp_path / 'sample.bin'
+    path.write_bytes(b'HEADER' + sample)
+    with open(path, 'rb') as f:
+        f.read(6)
+        mapped = ScanPipeline(signatures).consume_auto(f)
+        assert f.tell() == len(sample) + 6
+    streamed = ScanPipeline(signatures).consume(io.BytesIO(sample))
+    assert summary(mapped) == summary(streamed)
+
+
+def test_small_file_is_read_not_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_module, 'MMAP_THRESHOLD', 1024)
+    path = tmp_path / 'small.bin'
+    path.write_bytes(b'x' * 100)
+    with open(path, 'rb') as f:
+        assert pipeline_module.mappable(f) is None
+    path.write_bytes(b'x' * 2048)
+    with open(path, 'rb') as f:
+        assert pipeline_module.mappable(f) is f
+
+
+def test_size_limit_is_the_same_for_both_paths(sample, tmp_path):
+    path = tmp_path / 'sample.bin'
+    path.write_bytes(sample)
+    with pytest.raises(FileTooLargeError):
+        ScanPipeline(max_size=len(sample) - 1).consume_file(str(path))
+    with pytest.raises(FileTooLargeError):
+        ScanPipeline(max_size=len(sample) - 1).consume(io.BytesIO(sample))
+    assert ScanPipeline(max_size=len(sample)).consume_file(str(path)).size == len(sample)
@@ -0,0 +1,77 @@
+# test_samples.py - ХРАНИЛИЩЕ ОБРАЗЦОВ: ПИШЕМ ТОЛЬКО НОВЫЕ ХЕШИ
+#
+#   python -m pytest test_samples.py
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from archives import ArchiveExpander
+from cache import VerdictCache
+from samples import SampleStore
+from scanner import AntivirusScanner
+
+
+class NetworkStream:
+    """Поток без seek, как тело запроса"""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SampleStore(str(tmp_path / 'samples'), compress=False)
+
+
+@pytest.fixture
+def writers(store, monkeypatch):
+    """Сколько раз образец начинали писать (сжимать во временный файл)"""
+    writers = []
+    writer = store.writer
+    monkeypatch.setattr(store, 'writer', lambda: writers.append(1) or writer())
+    return writers
+
+
+@pytest.fixture
+def scanner(store):
+    expander = ArchiveExpander(workers=2)
+    scanner = AntivirusScanner(None, cache=VerdictCache(), digests=[], archives=expander, samples=store)
+    yield scanner
+    expander.shutdown()
+    scanner.runner.shutdown()
+
+
+def test_sample_is_written_once_per_hash(scanner, store, writers):
+    data = b'unique sample content'
+    first = scanner.scan_stream(NetworkStream(data), 'a.bin')
+    second = scanner.scan_stream(NetworkStream(data), 'b.bin')
+
+    assert second['cached'] is True
+    assert writers == [1]  # повтор ничего не сжимает и не пишет
+    assert store.stats()['stored'] == 1 and store.stats()['deduplicated'] == 1
+    with store.open(first['hash']) as sample:
+        assert sample.read() == data
+
+
+def test_rejected_upload_is_not_stored(scanner, store, writers):
+    pipeline = scanner.read_stream(NetworkStream(b'queued, then dropped'))
+    scanner.release(pipeline)
+    assert pipeline.hexdigest not in store
+    assert writers == []
+
+
+def test_archive_is_stored_without_members(scanner, store):
+    member = b'member of the archive'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('inner.txt', member)
+
+    result = scanner.scan_stream(NetworkStream(buffer.getvalue()), 'a.zip')
+    assert result['archive']['member_count'] == 1
+    assert result['hash'] in store
+    assert hashlib.sha256(member).hexdigest() not in store
@@ -0,0 +1,66 @@
+# test_signatures.py - АХО-КОРАСИК: СОВПАДЕНИЯ НА ГРАНИЦАХ ЧАНКОВ И ПЕРЕКРЫТИЯ
+#
+#   python -m pytest test_signatures.py
+import random
+
+import pytest
+
+from signatures import MAX_MATCHES, SIGNATURES_FILE, SignatureEngine
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+def naive(signatures, data):
+    """Эталон: каждое вхождение каждого шаблона"""
+    found = []
+    for name, pattern in signatures:
+        start = data.find(pattern)
+        while start != -1:
+            found.append((name, start))
+            start = data.find(pattern, start + 1)
+    return sorted(found)
+
+
+def matches(engine, chunks):
+    stream = engine.stream()
+    for chunk in chunks:
+        stream.update(chunk)
+    return sorted((match['name'], match['offset']) for match in stream.matches)
+
+
+def test_eicar_split_at_every_position():
+    engine = SignatureEngine.from_file(SIGNATURES_FILE)
+    data = b'\0' * 100 + EICAR + b'\n'
+    expected = [('Eicar-Test-Signature', 100)]
+    assert matches(engine, [data]) == expected
+    for cut in range(1, len(data)):
+        assert matches(engine, [data[:cut], data[cut:]]) == expected, cut
+
+
+def test_byte_by_byte_and_memoryview_chunks():
+    engine = SignatureEngine.from_file(SIGNATURES_FILE)
+    data = b'junk' + EICAR + b'junk'
+    assert matches(engine, [data[i:i + 1] for i in range(len(data))]) == [('Eicar-Test-Signature', 4)]
+    with memoryview(data) as view:
+        assert matches(engine, [view[:30], view[30:]]) == [('Eicar-Test-Signature', 4)]
+
+
+def test_overlapping_and_nested_patterns():
+    signatures = [('he', b'he'), ('she', b'she'), ('his', b'his'), ('hers', b'hers')]
+    engine = SignatureEngine(signatures)
+    data = b'ushers ahishers'
+    assert matches(engine, [data[:3], data[3:9], data[9:]]) == naive(signatures, data)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_chunking_matches_naive_search(seed):
+    rng = random.Random(seed)
+    alphabet = b'ab\0'
+    signatures = [(f's{i}', bytes(rng.choice(alphabet) for _ in range(rng.randint(3, 8)))) for i in range(8)]
+    engine = SignatureEngine(signatures)
+    data = bytes(rng.choice(alphabet) for _ in range(2000))
+    cuts = sorted(rng.sample(range(1, len(data)), 40))
+    chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+    expected = naive(signatures, data)
+    assert len(expected) < MAX_MATCHES
+    assert matches(engine, chunks) == expected
@@ -0,0 +1,167 @@
+# test_uploads.py - ПОТОКОВЫЙ РАЗБОР ЗАГРУЗОК: MULTIPART ПО КУСКАМ, ПАКЕТЫ, ЛИМИТЫ РАЗМЕРА
+#
+#   python -m pytest test_uploads.py
+import io
+
+import pytest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from uploads import MULTIPART_OVERHEAD, MultipartUpload, UploadError, check_length, open_batch, open_upload
+
+BOUNDARY = 'test-boundary-7MA4YWxkTrZu0gW'
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+class NetworkStream:
+    """Тело запроса мелкими кусками: граница multipart режется посередине"""
+
+    def __init__(self, data, piece):
+        self.data = io.BytesIO(data)
+        self.piece = piece
+
+    def read(self, size=-1):
+        return self.data.read(self.piece)
+
+
+def multipart(*parts):
+    """parts: (имя поля, имя файла или None для обычного поля, байты)"""
+    body = bytearray()
+    for name, filename, data in parts:
+        body += f'--{BOUNDARY}\r\n'.encode()
+        if filename is None:
+            body += f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+        else:
+            body += (f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n').encode()
+        body += data + b'\r\n'
+    body += f'--{BOUNDARY}--\r\n'.encode()
+    return bytes(body)
+
+
+def read_all(upload, size=4096):
+    data = bytearray()
+    while True:
+        chunk = upload.read(size)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+
+
+def request_for(body, content_type, **headers):
+    environ = EnvironBuilder(method='POST', data=body, content_type=content_type, headers=headers).get_environ()
+    return Request(environ)
+
+
+# Содержимое с "почти границей" внутри: разбор не должен принять его за конец части
+TRICKY = b'head\r\n--' + BOUNDARY.encode()[:-3] + b'\r\n' + bytes(range(256)) * 40 + EICAR
+
+
+@pytest.mark.parametrize('piece', [1, 3, 7, 64, 1000])
+def test_file_split_across_chunks_is_intact(piece):
+    body = multipart(('force', None, b'1'), ('file', 'sample.bin', TRICKY), ('note', None, b'after'))
+    upload = MultipartUpload(NetworkStream(body, piece), BOUNDARY).open()
+    assert upload.filename == 'sample.bin'
+    assert upload.fields == {'force': '1'}
+    assert read_all(upload) == TRICKY
+    # Поля после файла доступны только после finish()
+    assert upload.finish() == {'force': '1', 'note': 'after'}
+
+
+@pytest.mark.parametrize('piece', [5, 1000])
+def test_batch_yields_every_file(piece):
+    files = {'a.txt': b'just text', 'b.bin': TRICKY, 'c.com': EICAR}
+    body = multipart(*((f'f{i}', name, data) for i, (name, data) in enumerate(files.items())))
+    upload = MultipartUpload(NetworkStream(body, piece), BOUNDARY, field=None)
+    seen = {}
+    while upload.next_file():
+        seen[upload.filename] = read_all(upload)
+    assert seen == files
+
+
+def test_unread_file_is_skipped_on_next_file():
+    body = multipart(('a', 'a.bin', TRICKY), ('b', 'b.bin', b'second'))
+    upload = MultipartUpload(NetworkStream(body, 100), BOUNDARY, field=None)
+    assert upload.next_file() and upload.filename == 'a.bin'
+    upload.read(10)
+    assert upload.next_file() and upload.filename == 'b.bin'
+    assert read_all(upload) == b'second'
+    assert not upload.next_file()
+
+
+def test_missing_file_field_is_rejected():
+    body = multipart(('force', None, b'1'), ('other', 'x.bin', b'data'))
+    with pytest.raises(UploadError) as error:
+        MultipartUpload(NetworkStream(body, 1000), BOUNDARY).open()
+    assert error.value.status == 400
+
+
+def test_file_without_filename_has_empty_name():
+    # Браузер шлет поле-файл с filename="", если файл не выбран
+    upload = MultipartUpload(NetworkStream(multipart(('file', '', b'')), 1000), BOUNDARY).open()
+    assert upload.filename == ''
+
+
+def test_truncated_body_is_an_error():
+    body = multipart(('file', 'sample.bin', TRICKY))
+    upload = MultipartUpload(NetworkStream(body[:len(body) // 2], 1000), BOUNDARY).open()
+    with pytest.raises(UploadError):
+        read_all(upload)
+
+
+def test_oversized_form_field_is_413():
+    body = multipart(('comment', None, b'x' * 10000), ('file', 'a.bin', b'data'))
+    with pytest.raises(UploadError) as error:
+        MultipartUpload(NetworkStream(body, 1000), BOUNDARY).open()
+    assert error.value.status == 413
+
+
+def test_content_length_over_limit_is_413_before_reading():
+    body = multipart(('file', 'big.bin', b'\0' * 4096))
+    request = request_for(body, f'multipart/form-data; boundary={BOUNDARY}')
+    with pytest.raises(UploadError) as error:
+        open_upload(request, max_size=len(body) - MULTIPART_OVERHEAD - 1)
+    assert error.value.status == 413
+    # Тело не тронуто
+    assert request.stream.read() == body
+
+    with pytest.raises(UploadError) as error:
+        open_batch(request_for(body, f'multipart/form-data; boundary={BOUNDARY}'), max_size=1024 - MULTIPART_OVERHEAD)
+    assert error.value.status == 413
+
+
+def test_raw_body_over_limit_is_413():
+    request = request_for(b'\0' * 2048, 'application/octet-stream', **{'X-Filename': 'raw.bin'})
+    with pytest.raises(UploadError) as error:
+        open_upload(request, max_size=1024)
+    assert error.value.status == 413
+    upload = open_upload(request_for(b'\0' * 512, 'application/octet-stream', **{'X-Filename': 'raw.bin'}), 1024)
+    assert upload.filename == 'raw.bin'
+    assert read_all(upload) == b'\0' * 512
+
+
+def test_missing_content_length_is_411():
+    request = request_for(b'data', 'application/octet-stream')
+    del request.environ['CONTENT_LENGTH']
+    request = Request(request.environ)
+    with pytest.raises(UploadError) as error:
+        check_length(request, max_size=1024)
+    assert error.value.status == 411
+
+
+@pytest.fixture
+def backend():
+    backend = pytest.importorskip('backend')
+    backend.verdict_cache.invalidate()
+    yield backend
+    backend.verdict_cache.invalidate()
+
+
+def test_backend_rejects_oversized_upload(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'MAX_FILE_SIZE', 1024)
+    client = backend.app.test_client()
+    data = b'\0' * (1024 + MULTIPART_OVERHEAD + 1)
+    response = client.post('/api/scan', data={'file': (io.BytesIO(data), 'big.bin')})
+    assert response.status_code == 413
+    response = client.post('/api/scan', data={'file': (io.BytesIO(b''), '')})
+    assert response.status_code == 400
@@ -0,0 +1,136 @@
+# test_virustotal.py - КЛИЕНТ VIRUSTOTAL ПРОТИВ ЛОКАЛЬНОЙ ЗАМЕНЫ (tools/fake_virustotal.py)
+#
+#   python -m pytest test_virustotal.py
+import hashlib
+import threading
+import time
+
+import pytest
+
+from engines import EngineRegistry, VirusTotalEngine
+from tools.fake_virustotal import EICAR, start_fake_virustotal
+from virustotal import TokenBucket, VirusTotalClient, VirusTotalError
+
+EICAR_HASH = hashlib.sha256(EICAR).hexdigest()
+CLEAN_HASH = 'a' * 64
+UNKNOWN_HASH = '0' * 64  # хеши на '0' фейк "не видел" - отвечает 404
+
+
+@pytest.fixture
+def fake_vt():
+    servers = []
+
+    def start(**kwargs):
+        server = start_fake_virustotal(**kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client_for():
+    clients = []
+
+    def make(server, **kwargs):
+        kwargs.setdefault('requests_per_minute', 1000)
+        client = VirusTotalClient('test-key', base_url=server.url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_bucket_allows_capacity_then_waits_for_window():
+    bucket = TokenBucket(3, period=0.5)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert bucket.acquire(timeout=0.05) is False
+
+    started = time.monotonic()
+    assert bucket.acquire(timeout=2)
+    # Токен вернулся только через окно от первого запроса, а не через period / 3
+    assert time.monotonic() - started >= 0.35
+
+
+def test_bucket_drain_blocks_until_retry_after():
+    bucket = TokenBucket(10, period=60)
+    bucket.drain(0.3)
+    assert bucket.acquire(timeout=0.1) is False
+    started = time.monotonic()
+    assert bucket.acquire(timeout=2)
+    assert time.monotonic() - started >= 0.1
+
+
+def test_client_throttles_to_quota(fake_vt, client_for):
+    server = fake_vt(quota=0)
+    client = client_for(server, queue_timeout=0.2)
+    client.bucket = TokenBucket(2, period=60)
+
+    client.lookup(CLEAN_HASH)
+    client.lookup('b' * 64)
+    # Квота кончилась: в сервер не идем, ждем не дольше queue_timeout
+    with pytest.raises(VirusTotalError):
+        client.lookup('c' * 64)
+    assert server.counters['ok'] == 2
+    assert client.stats()['requests'] == 2
+
+
+def test_server_429_drains_bucket(fake_vt, client_for):
+    server = fake_vt(quota=1)
+    client = client_for(server, queue_timeout=0.2, max_retries=1)
+
+    assert client.lookup(CLEAN_HASH)['found'] is True
+    # 429 с Retry-After ~60 с: повтор не дождется квоты и сдастся по queue_timeout
+    with pytest.raises(VirusTotalError):
+        client.lookup('b' * 64)
+    assert server.counters['throttled'] == 1
+    assert client.stats()['throttled'] == 1
+
+
+def test_concurrent_lookups_of_same_hash_are_coalesced(fake_vt, client_for):
+    server = fake_vt(quota=0, latency=0.3)
+    client = client_for(server)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def lookup():
+        barrier.wait()
+        results.append(client.lookup(EICAR_HASH.upper()))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.counters['ok'] == 1
+    assert client.stats()['coalesced'] == 7
+    assert len(results) == 8
+    assert all(result == results[0] for result in results)
+    assert results[0]['detected'] and results[0]['detections'] == 3
+
+
+def test_404_is_not_found_not_error(fake_vt, client_for):
+    server = fake_vt(quota=0)
+    client = client_for(server)
+
+    result = client.lookup(UNKNOWN_HASH)
+    assert result == {'detected': False, 'detections': 0, 'total': 0, 'engines': {}, 'found': False}
+    stats = client.stats()
+    assert stats['errors'] == 0 and stats['retries'] == 0
+    assert server.counters['not_found'] == 1
+
+
+def test_engine_checks_every_type_unless_configured():
+    engine = VirusTotalEngine(scanner=None)
+    # Тип угадан по заголовку - "картинка" может оказаться полиглотом
+    assert all(EngineRegistry().applies_to(engine, kind) for kind in ('text', 'image', 'empty', 'pe'))
+
+    registry = EngineRegistry({'virustotal_skip_types': 'text, image'})
+    assert not registry.applies_to(engine, 'image')
+    assert registry.applies_to(engine, 'pe')
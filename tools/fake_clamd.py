@@ -0,0 +1,150 @@
+# tools/fake_clamd.py - МАЛЕНЬКИЙ ЛОКАЛЬНЫЙ CLAMD ДЛЯ ПРОВЕРОК (PING, IDSESSION, INSTREAM)
+#
+#   python tools/fake_clamd.py --socket /tmp/clamd.sock
+#   python tools/fake_clamd.py --port 3310
+#   CLAMD_ADDRESS=/tmp/clamd.sock python backend.py
+# Ищет угрозы тем же сигнатурным движком, что и бэкенд (signatures.txt)
+import argparse
+import os
+import socketserver
+import struct
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from signatures import SIGNATURES_FILE, SignatureEngine  # noqa: E402
+
+STREAM_MAX_LENGTH = 25 * 1024 * 1024  # как StreamMaxLength у clamd по умолчанию
+
+
+class FakeClamdHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.buffer = b''
+        self.request.settimeout(self.server.idle_timeout)
+
+    def read_exact(self, size):
+        while len(self.buffer) < size:
+            data = self.request.recv(65536)
+            if not data:
+                raise ConnectionError('клиент закрыл соединение')
+            self.buffer += data
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_command(self):
+        """Команда с префиксом 'z' (до \\0) или 'n' (до \\n)"""
+        prefix = self.read_exact(1)
+        end = b'\0' if prefix == b'z' else b'\n'
+        while end not in self.buffer:
+            data = self.request.recv(65536)
+            if not data:
+                raise ConnectionError('клиент закрыл соединение')
+            self.buffer += data
+        command, self.buffer = self.buffer.split(end, 1)
+        return command.decode('ascii', 'replace'), end
+
+    def handle(self):
+        session = False
+        request_id = 0
+        try:
+            while True:
+                command, end = self.read_command()
+                self.server.count(command)
+                if command == 'IDSESSION':
+                    session = True
+                    continue
+                if command == 'END':
+                    return
+
+                request_id += 1
+                if command == 'PING':
+                    reply, close = 'PONG', False
+                elif command == 'VERSION':
+                    reply, close = 'ClamAV 1.0.0/fake', False
+                elif command == 'INSTREAM':
+                    reply, close = self.instream()
+                else:
+                    reply, close = 'UNKNOWN COMMAND', True
+
+                if session:
+                    reply = f'{request_id}: {reply}'
+                self.request.sendall(reply.encode('utf-8') + end)
+                if close or not session:
+                    return
+        except (ConnectionError, OSError):
+            return
+
+    def instream(self):
+        matcher = self.server.engine.stream()
+        size = 0
+        while True:
+            (length,) = struct.unpack('>I', self.read_exact(4))
+            if length == 0:
+                break
+            size += length
+            if size > self.server.stream_max_length:
+                return 'INSTREAM size limit exceeded. ERROR', True
+            matcher.update(self.read_exact(length))
+        if matcher.matches:
+            return f"stream: {matcher.matches[0]['name']} FOUND", False
+        return 'stream: OK', False
+
+
+class CountingMixin:
+    def init_counters(self, engine, idle_timeout, stream_max_length):
+        self.engine = engine
+        self.idle_timeout = idle_timeout
+        self.stream_max_length = stream_max_length
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, command):
+        with self.lock:
+            self.counters[command] = self.counters.get(command, 0) + 1
+
+
+class FakeClamdUnix(CountingMixin, socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class FakeClamdTCP(CountingMixin, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_fake_clamd(socket_path=None, port=0, idle_timeout=30, stream_max_length=STREAM_MAX_LENGTH,
+                     signatures_path=SIGNATURES_FILE):
+    """clamd в фоновом потоке; возвращает (сервер, адрес для CLAMD_ADDRESS)"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = FakeClamdUnix(socket_path, FakeClamdHandler)
+        address = f'unix:{socket_path}'
+    else:
+        server = FakeClamdTCP(('127.0.0.1', port), FakeClamdHandler)
+        address = f'tcp:127.0.0.1:{server.server_address[1]}'
+    server.init_counters(SignatureEngine.from_file(signatures_path), idle_timeout, stream_max_length)
+    threading.Thread(target=server.serve_forever, name='fake-clamd', daemon=True).start()
+    return server, address
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена clamd')
+    parser.add_argument('--socket', help='путь UNIX-сокета')
+    parser.add_argument('--port', type=int, default=3310)
+    parser.add_argument('--idle-timeout', type=float, default=30, help='как IdleTimeout у clamd, секунд')
+    parser.add_argument('--stream-max-length', type=int, default=STREAM_MAX_LENGTH)
+    args = parser.parse_args()
+
+    server, address = start_fake_clamd(args.socket, args.port, args.idle_timeout, args.stream_max_length)
+    print(f"🧪 Fake clamd: {address}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.counters}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
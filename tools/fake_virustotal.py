@@ -0,0 +1,136 @@
+# tools/fake_virustotal.py - ЛОКАЛЬНАЯ ЗАМЕНА VIRUSTOTAL ДЛЯ ТЕСТОВ И НАГРУЗКИ
+#
+#   python tools/fake_virustotal.py --port 8765 --quota 4 --latency 0.2
+#   VIRUSTOTAL_URL=http://127.0.0.1:8765/api/v3 VIRUSTOTAL_API_KEY=test python backend.py
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+ENGINES = ['Kaspersky', 'Avast', 'Bitdefender', 'ESET-NOD32', 'DrWeb', 'Microsoft', 'Sophos']
+FILE_PATH = re.compile(r'^/api/v3/files/([0-9a-fA-F]{32,64})$')
+
+
+class FakeVirusTotal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, quota=4, latency=0.0, malicious=None):
+        super().__init__(address, FakeVirusTotalHandler)
+        # quota запросов на ключ за скользящую минуту, сверх - 429
+        self.quota = quota
+        self.latency = latency
+        self.malicious = {h.lower(): name for h, name in (malicious or {}).items()}
+        self.malicious.setdefault(hashlib.sha256(EICAR).hexdigest(), 'EICAR-Test-File')
+        self.lock = threading.Lock()
+        self.requests = {}  # ключ -> времена запросов за последнюю минуту
+        self.counters = {'ok': 0, 'not_found': 0, 'throttled': 0, 'unauthorized': 0}
+
+    def allow(self, api_key):
+        now = time.monotonic()
+        with self.lock:
+            window = self.requests.setdefault(api_key, deque())
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if self.quota and len(window) >= self.quota:
+                self.counters['throttled'] += 1
+                return False, 60 - (now - window[0])
+            window.append(now)
+            return True, 0
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/v3'
+
+
+class FakeVirusTotalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего API
+
+    def do_GET(self):
+        server = self.server
+        api_key = self.headers.get('x-apikey')
+        if not api_key:
+            server.count('unauthorized')
+            return self.reply(401, {'error': {'code': 'WrongCredentialsError'}})
+
+        allowed, retry_after = server.allow(api_key)
+        if not allowed:
+            return self.reply(429, {'error': {'code': 'QuotaExceededError'}},
+                              {'Retry-After': str(max(1, int(retry_after + 0.999)))})
+
+        match = FILE_PATH.match(self.path)
+        if not match:
+            return self.reply(404, {'error': {'code': 'NotFoundError'}})
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        file_hash = match.group(1).lower()
+        name = server.malicious.get(file_hash)
+        if name is None and file_hash.startswith('0'):
+            # Хеши на '0' VirusTotal "не видел" - так проще проверить 404
+            server.count('not_found')
+            return self.reply(404, {'error': {'code': 'NotFoundError'}})
+
+        results = {}
+        for index, engine in enumerate(ENGINES):
+            if name and index < 3:
+                results[engine] = {'category': 'malicious', 'result': name}
+            else:
+                results[engine] = {'category': 'undetected', 'result': None}
+        malicious = sum(1 for r in results.values() if r['category'] == 'malicious')
+
+        server.count('ok')
+        self.reply(200, {'data': {'id': file_hash, 'type': 'file', 'attributes': {
+            'sha256': file_hash,
+            'last_analysis_stats': {'malicious': malicious, 'undetected': len(ENGINES) - malicious},
+            'last_analysis_results': results
+        }}})
+
+    def reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_virustotal(port=0, quota=4, latency=0.0, malicious=None):
+    """Сервер в фоновом потоке (для бенчмарков): server.url, server.shutdown()"""
+    server = FakeVirusTotal(('127.0.0.1', port), quota=quota, latency=latency, malicious=malicious)
+    threading.Thread(target=server.serve_forever, name='fake-virustotal', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена VirusTotal API v3')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--quota', type=int, default=4, help='запросов в минуту на ключ (0 - без лимита)')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, секунд')
+    args = parser.parse_args()
+
+    server = FakeVirusTotal(('127.0.0.1', args.port), quota=args.quota, latency=args.latency)
+    print(f"🧪 Fake VirusTotal: {server.url} (квота {args.quota}/мин, задержка {args.latency} с)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.counters}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+# uploads.py - ПОТОКОВЫЙ ПРИЕМ ЗАГРУЗОК: ТЕЛО ЗАПРОСА ИДЕТ ПРЯМО В КОНВЕЙЕР СКАНЕРА
+#
+# request.files заставляет werkzeug разобрать весь multipart во временный файл еще до наших
+# проверок. Здесь размер проверяется по Content-Length до чтения, а байты поля 'file'
+# (или тело application/octet-stream) отдаются конвейеру по мере прихода из сокета.
+#   curl -F file=@sample.exe http://localhost:5000/api/scan
+#   curl --data-binary @sample.exe -H 'Content-Type: application/octet-stream' \
+#        -H 'X-Filename: sample.exe' http://localhost:5000/api/scan
+#   curl -F f1=@a.exe -F f2=@b.dll http://localhost:5000/api/scan/batch
+#   tar -c dir | curl --data-binary @- -H 'Content-Type: application/x-tar' http://localhost:5000/api/scan/batch
+import tarfile
+
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, Field, File, MultipartDecoder
+
+from pipeline import CHUNK_SIZE
+
+# Заголовки частей и обычные поля формы сверх самого файла
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_FIELD_SIZE = 4 * 1024  # force=1 и подобные - не больше нескольких байт
+# Только несжатый tar: распаковка gzip в потоке не ограничена ничем, кроме CPU
+TAR_TYPES = ('application/x-tar', 'application/tar')
+
+
+class UploadError(Exception):
+    """Загрузку не принимаем; status - HTTP-код ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class MultipartUpload:
+    """Поле-файл из multipart/form-data: read() разбирает тело по мере чтения
+
+    Поля формы, пришедшие до файла (браузер шлет их в порядке FormData.append),
+    доступны в fields сразу после open(). Несколько файлов подряд - next_file().
+    """
+
+    def __init__(self, stream, boundary, field='file'):
+        self.stream = stream
+        self.field = field  # None - любое поле-файл
+        self.decoder = MultipartDecoder(boundary.encode('latin-1'))
+        # Самая длинная строка-граница: '\r\n--' + boundary + '--'
+        self._line_limit = len(boundary) + 6
+        self._tail = bytearray()  # конец последнего куска после '\n' - возможно, начало границы
+        self.fields = {}
+        self.filename = None
+        self._buffer = bytearray()
+        self._part = None   # Field или File, данные которого сейчас идут
+        self._value = bytearray()
+        self._in_file = False
+        self._done = False  # данные файла закончились
+        self._eof = False   # тело запроса прочитано до конца
+        self._complete = False  # был эпилог: дальше событий нет
+
+    def open(self):
+        """Доходим до начала файла; дальше read() отдает только его байты"""
+        if not self.next_file():
+            raise UploadError(f"Файл не предоставлен (нет поля '{self.field}')")
+        return self
+
+    def next_file(self):
+        """Переходим к следующему файлу (недочитанный остаток текущего пропускаем); False - файлов больше нет"""
+        self.skip()
+        self.filename = None
+        self._done = False
+        while self.filename is None:
+            event = self._next_event()
+            if event is None:
+                self._done = True
+                return False
+            self._handle(event)
+        return True
+
+    def skip(self):
+        """Пропускаем остаток текущего файла, не копя его в памяти"""
+        while self.filename is not None and not self._done:
+            self._buffer.clear()
+            event = self._next_event()
+            if event is None:
+                break
+            self._handle(event)
+        self._buffer.clear()
+
+    def read(self, size=CHUNK_SIZE):
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        # Копим до size: конвейер получает полные чанки, а не куски по границам сетевых пакетов
+        while len(self._buffer) < size and not self._done:
+            event = self._next_event()
+            if event is None:
+                raise UploadError('Загрузка оборвалась до конца файла')
+            self._handle(event)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def finish(self):
+        """Дочитываем остаток тела: поля после файла и эпилог (без этого keep-alive собьется)"""
+        self._in_file = False  # недочитанный остаток файла не копим
+        event = self._next_event()
+        while event is not None:
+            self._handle(event)
+            event = self._next_event()
+        return self.fields
+
+    def _next_event(self):
+        while not self._complete:
+            try:
+                event = self.decoder.next_event()
+            except ValueError as e:
+                raise UploadError(f'Некорректный multipart: {e}')
+            if event is not NEED_DATA:
+                if isinstance(event, Epilogue):
+                    self._done = self._complete = True
+                    return None
+                return event
+            if self._eof:
+                return None
+            chunk = self.stream.read(CHUNK_SIZE)
+            if not chunk:
+                self._eof = True
+            self._receive(chunk)
+        return None
+
+    def _receive(self, chunk):
+        """Кусок тела - декодеру; незаконченную короткую строку придерживаем до перевода строки
+
+        MultipartDecoder, получив '--boundary' без следующего за ним '\r\n', отдает '\r'
+        перед границей как данные части - файл или поле получили бы лишний байт.
+        """
+        if not chunk:
+            if self._tail:
+                self.decoder.receive_data(bytes(self._tail))
+                self._tail.clear()
+            self.decoder.receive_data(None)
+            return
+        newline = chunk.rfind(b'\n')
+        if newline == -1:
+            self._tail += chunk
+            if len(self._tail) > self._line_limit:
+                self.decoder.receive_data(bytes(self._tail))
+                self._tail.clear()
+            return
+        if self._tail:
+            self.decoder.receive_data(bytes(self._tail))
+            self._tail.clear()
+        end = newline + 1
+        if len(chunk) - end > self._line_limit:
+            end = len(chunk)
+        with memoryview(chunk) as view:
+            # Срез без копии: декодер сам дописывает его в свой буфер
+            self.decoder.receive_data(view[:end])
+        self._tail += chunk[end:]
+
+    def _handle(self, event):
+        if isinstance(event, File):
+            self._part = event
+            self._in_file = self.filename is None and self.field in (None, event.name)
+            if self._in_file:
+                self.filename = event.filename  # '' - файл в форме не выбран
+        elif isinstance(event, Field):
+            self._part = event
+            self._in_file = False
+            self._value = bytearray()
+        elif isinstance(event, Data):
+            if self._in_file:
+                self._buffer += event.data
+                if not event.more_data:
+                    self._done = True
+                    self._in_file = False
+            elif isinstance(self._part, Field):
+                self._value += event.data
+                if len(self._value) > MAX_FIELD_SIZE:
+                    raise UploadError(f"Поле '{self._part.name}' слишком большое", 413)
+                if not event.more_data:
+                    self.fields[self._part.name] = self._value.decode('utf-8', 'replace')
+
+
+class RawUpload:
+    """Тело application/octet-stream целиком - это файл; имя - из X-Filename или ?filename="""
+
+    def __init__(self, stream, filename):
+        self.stream = stream
+        self.filename = filename or 'upload.bin'
+        self.fields = {}
+
+    def open(self):
+        return self
+
+    def read(self, size=CHUNK_SIZE):
+        return self.stream.read(size)
+
+    def finish(self):
+        return self.fields
+
+
+class TarUpload:
+    """Пакет файлов одним несжатым tar-потоком, без seek"""
+
+    def __init__(self, stream):
+        try:
+            self.archive = tarfile.open(fileobj=stream, mode='r|')
+        except tarfile.TarError as e:
+            raise UploadError(f'Некорректный tar: {e}')
+        self.fields = {}
+        self.filename = None
+        self.size = None  # из заголовка tar: больше лимита - не читаем вовсе
+        self._member = None
+
+    def next_file(self):
+        try:
+            # next(), а не for: итератор TarFile начинает заново с уже прочитанных членов
+            info = self.archive.next()
+            while info is not None:
+                if info.isreg():
+                    self.filename = info.name
+                    self.size = info.size
+                    self._member = self.archive.extractfile(info)
+                    return True
+                info = self.archive.next()
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise UploadError(f'Некорректный tar: {e}')
+        self._member = None
+        return False
+
+    def read(self, size=CHUNK_SIZE):
+        return self._member.read(size)
+
+    def skip(self):
+        # Потоковый tarfile сам пропускает недочитанный член при переходе к следующему
+        pass
+
+    def finish(self):
+        self.archive.close()
+        return self.fields
+
+
+def check_length(request, max_size, overhead=0):
+    """Content-Length до чтения тела: нет - 411 (если тело не chunked), больше лимита - 413"""
+    length = request.content_length
+    chunked = request.environ.get('wsgi.input_terminated', False)
+    if length is None and not chunked:
+        raise UploadError('Нужен заголовок Content-Length', 411)
+    if length is not None and length > max_size + overhead:
+        raise UploadError(f'Файл слишком большой (макс {max_size // 1024 // 1024} МБ)', 413)
+
+
+def open_batch(request, max_size):
+    """Пакет файлов: multipart с любым числом частей-файлов или tar-поток; next_file() по очереди"""
+    mimetype = request.mimetype
+    if mimetype == 'multipart/form-data':
+        check_length(request, max_size, MULTIPART_OVERHEAD)
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            raise UploadError('В Content-Type нет boundary')
+        return MultipartUpload(request.stream, boundary, field=None)
+    if mimetype in TAR_TYPES:
+        check_length(request, max_size)
+        return TarUpload(request.stream)
+    raise UploadError('Ожидается multipart/form-data или tar', 415)
+
+
+def open_upload(request, max_size, field='file'):
+    """Загрузка из запроса без request.files: размер проверяется до чтения тела"""
+    mimetype = request.mimetype
+    if mimetype == 'multipart/form-data':
+        check_length(request, max_size, MULTIPART_OVERHEAD)
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            raise UploadError('В Content-Type нет boundary')
+        return MultipartUpload(request.stream, boundary, field).open()
+
+    if mimetype == 'application/octet-stream':
+        check_length(request, max_size)
+        filename = request.headers.get('X-Filename') or request.args.get('filename')
+        return RawUpload(request.stream, filename).open()
+
+    raise UploadError('Ожидается multipart/form-data или application/octet-stream', 415)
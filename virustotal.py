@@ -0,0 +1,212 @@
+# virustotal.py - КЛИЕНТ VIRUSTOTAL API v3 (ПОИСК ПО ХЕШУ)
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+VIRUSTOTAL_URL = 'https://www.virustotal.com/api/v3'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class VirusTotalError(Exception):
+    """Поиск не удался (сеть, ответ API или не дождались квоты)"""
+
+
+class TokenBucket:
+    """Квота "N запросов в минуту": каждый потраченный токен возвращается ровно через минуту
+
+    Обычное пополнение rate/60 в секунду пропускает до 2N запросов за первую минуту,
+    и сервер отвечает 429; здесь в любом окне длины period не больше capacity запросов.
+    """
+
+    def __init__(self, per_minute, period=61.0):
+        # Секунда запаса: сервер отсчитывает окно от прихода запроса, а не от отправки
+        # Квота меньше 1 в минуту (делим ключ между процессами) - 1 запрос за удлиненное окно
+        self.capacity = max(1, int(per_minute))
+        self.period = period * self.capacity / per_minute
+        self._spent = deque()  # время выдачи каждого токена за последнее окно
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return self.capacity - len(self._spent)
+
+    def _expire(self, now):
+        while self._spent and now - self._spent[0] >= self.period:
+            self._spent.popleft()
+
+    def acquire(self, timeout=None):
+        """Ждем токен; False - не дождались за timeout секунд"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if now >= self._blocked_until and len(self._spent) < self.capacity:
+                    self._spent.append(now)
+                    return True
+                wait = self._blocked_until - now
+                if len(self._spent) >= self.capacity:
+                    wait = max(wait, self._spent[0] + self.period - now)
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(max(wait, 0.001))
+
+    def drain(self, seconds=0):
+        """Сервер ответил 429: квота кончилась раньше, чем мы думали"""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+
+
+class VirusTotalClient:
+    """Поиск по SHA-256: общий пул HTTP-соединений, квота, склейка одинаковых запросов"""
+
+    def __init__(self, api_key, base_url=VIRUSTOTAL_URL, requests_per_minute=4,
+                 pool_size=10, timeout=15, max_retries=4, backoff_base=1.0,
+                 backoff_max=60.0, queue_timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Сколько ждем свободную квоту, прежде чем сдаться
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(requests_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'x-apikey': api_key, 'Accept': 'application/json'})
+
+        self._in_flight = {}  # хеш -> Future с результатом
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'coalesced': 0,
+            'requests': 0,
+            'retries': 0,
+            'throttled': 0,
+            'errors': 0,
+            'quota_wait_total': 0.0
+        }
+
+    def lookup(self, file_hash):
+        """Отчет по хешу; одинаковые хеши в полете ждут один и тот же запрос"""
+        file_hash = file_hash.lower()
+        with self._lock:
+            self._stats['lookups'] += 1
+            future = self._in_flight.get(file_hash)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[file_hash] = future
+            else:
+                self._stats['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            future.set_result(self._fetch(file_hash))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[file_hash]
+        return future.result()
+
+    def _fetch(self, file_hash):
+        url = f'{self.base_url}/files/{file_hash}'
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            if not self.bucket.acquire(self.queue_timeout):
+                self._count('errors')
+                raise VirusTotalError(f'Квота VirusTotal: нет свободного запроса за {self.queue_timeout} с')
+            self._count('quota_wait_total', time.monotonic() - started)
+            self._count('requests')
+
+            retry_after = None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = f'Сеть: {e}'
+            else:
+                if response.status_code == 200:
+                    return self.parse_report(response.json())
+                if response.status_code == 404:
+                    # Хеш VirusTotal не встречал - это ответ, а не ошибка
+                    return {'detected': False, 'detections': 0, 'total': 0, 'engines': {}, 'found': False}
+                if response.status_code not in RETRY_STATUSES:
+                    self._count('errors')
+                    raise VirusTotalError(f'VirusTotal ответил {response.status_code}')
+                error = f'VirusTotal ответил {response.status_code}'
+                if response.status_code == 429:
+                    self._count('throttled')
+                    retry_after = self._retry_after(response)
+                    self.bucket.drain(retry_after or 0)
+
+            if attempt == self.max_retries:
+                break
+            self._count('retries')
+            if retry_after is None:
+                time.sleep(self._backoff(attempt))
+
+        self._count('errors')
+        raise VirusTotalError(error)
+
+    def _backoff(self, attempt):
+        # Полный джиттер: клиенты после общего сбоя не приходят обратно строем
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_report(payload):
+        """Ответ /files/{hash} -> формат вердикта AntivirusScanner"""
+        attributes = payload.get('data', {}).get('attributes', {})
+        stats = attributes.get('last_analysis_stats', {})
+        engines = {
+            engine: verdict.get('result') or verdict.get('category')
+            for engine, verdict in attributes.get('last_analysis_results', {}).items()
+            if verdict.get('category') == 'malicious'
+        }
+        detections = stats.get('malicious', len(engines))
+        return {
+            'detected': detections > 0,
+            'detections': detections,
+            'total': sum(stats.values()) or len(attributes.get('last_analysis_results', {})),
+            'engines': engines,
+            'found': True
+        }
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._in_flight)
+        stats['quota_wait_total'] = round(stats['quota_wait_total'], 3)
+        stats['tokens'] = self.bucket.tokens
+        return stats
+
+    def close(self):
+        self.session.close()